@@ -0,0 +1,32 @@
+'''
+Slot boundaries of 10 years of half-hourly readings, and of 100 years of
+monthly ones: 'start + k*step' for each slot vs. datedelta.range
+
+    python -m benchmarks.datedelta
+'''
+import datetime
+import timeit
+
+from mylinky.datedelta import datedelta
+from mylinky.enedis import Series
+
+def run(name, start, step, count):
+    legacy = min(timeit.repeat(lambda: [int((start + k*step).timestamp()) for k in range(count)], number=1, repeat=3))
+    single = min(timeit.repeat(lambda: step.range(start, count=count), number=1, repeat=3))
+    print("%-10s %8d points" % (name, count))
+    print("  start + k*step:   %8.1f ms" % (legacy*1000))
+    print("  range:            %8.1f ms (x%.1f)" % (single*1000, legacy/single))
+    try:
+        import numpy
+    except ImportError:
+        return
+    vector = min(timeit.repeat(lambda: step.range(start, count=count, numpy=True), number=1, repeat=3))
+    print("  range (numpy):    %8.1f ms (x%.1f)" % (vector*1000, legacy/vector))
+
+def main():
+    start = Series.TZ.localize(datetime.datetime(2010, 1, 1))
+    run("hourly", start, datedelta(minutes=30), 10*365*48)
+    run("monthly", start, datedelta(months=1), 100*12)
+
+if __name__ == "__main__":
+    main()
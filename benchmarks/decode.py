@@ -0,0 +1,47 @@
+'''
+Decoding of a year-long hourly graphe response (17520 half-hours), then its
+transformation in a series: json vs. orjson (if installed) vs. incremental
+decoding of the data array from 64 KB chunks (with the peak of memory allocated
+by the decoding)
+
+    python -m benchmarks.decode
+'''
+import json
+import random
+import timeit
+import tracemalloc
+
+from mylinky.enedis import Data
+from mylinky.enedis.decode import GrapheDecoder, orjson
+
+POINTS = 365*48
+
+def payload():
+    random.seed(0)
+    return json.dumps({"etat": {"valeur": "termine"}, "graphe": {"decalage": 0, "puissanceSouscrite": 9,
+        "periode": {"dateDebut": "01/01/2019", "dateFin": "01/01/2020"},
+        "data": [{"valeur": round(random.uniform(0, 9), 3), "ordre": i+1} for i in range(POINTS)]}}).encode()
+
+def main():
+    raw = payload()
+    chunks = [raw[i:i+Data.CHUNK_SIZE] for i in range(0, len(raw), Data.CHUNK_SIZE)]
+    data = Data(cookies=None)
+    decoders = [("json", lambda: json.loads(raw))]
+    if orjson is not None:
+        decoders.append(("orjson", lambda: orjson.loads(raw)))
+    decoders.append(("incremental", lambda: GrapheDecoder.decode(chunks)))
+
+    print("%d points, %d bytes" % (POINTS, len(raw)))
+    reference = None
+    for (name, decode) in decoders:
+        decoding = min(timeit.repeat(decode, number=1, repeat=5))
+        total = min(timeit.repeat(lambda: data._transform(Data.RESOURCE_HOURLY, decode()["graphe"]), number=1, repeat=5))
+        reference = reference or total
+        tracemalloc.start()
+        decode()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print("%-12s decode: %7.1f ms (%5.1f MB), with transform: %7.1f ms (x%.1f)" % (name, decoding*1000, peak/1e6, total*1000, reference/total))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+'''
+Cold import time of the CLI and of the Lambda handler (python -X importtime),
+with the slowest imported modules
+
+    python -m benchmarks.importtime
+'''
+import sys
+import subprocess
+
+MODULES = ["mylinky.main", "mylinky.entrypoint"]
+RUNS = 5
+
+def importtime(module):
+    """Cumulative import time (us) of each module imported by 'import module', in a fresh interpreter"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import %s" % module],
+        stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        (_, cumulative, name) = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        times[name.strip()] = int(cumulative)
+    return times
+
+def main():
+    for module in MODULES:
+        runs = [importtime(module) for i in range(RUNS)]
+        best = min(runs, key=lambda times: times[module])
+        print("%-24s %8.1f ms (best of %d)" % (module, best[module]/1000, RUNS))
+        top = sorted(((t, name) for (name, t) in best.items() if not name.startswith("mylinky")), reverse=True)
+        for (t, name) in top[:8]:
+            print("    %-36s %8.1f ms" % (name, t/1000))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+'''
+InfluxDB export throughput against a local stub HTTP endpoint:
+per-point JSON dicts + strftime + single write_points vs. line protocol batches
+
+    python -m benchmarks.influxdb
+'''
+import datetime
+import threading
+import time
+import pytz
+
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from mylinky.enedis import Series
+from mylinky.exporter import InfluxdbExporter
+
+POINTS = 365*48
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+def legacy_save(exporter, serie, data, batchid=0):
+    # InfluxdbExporter.save_data before the line protocol writer
+    d = []
+    for item in data:
+        tags = {"batchid": batchid}
+        if "type" in item:
+            tags["type"] = item["type"]
+        d.append({
+            "measurement": "%s%s" % (exporter.prefix, serie),
+            "tags": tags,
+            "time": item['date'].strftime('%Y-%m-%dT%H:%M:%SZ'),
+            "fields": {"value": (item['value']*1000), "duration": item['duration']}
+        })
+    exporter.client.write_points(d)
+    return len(d)
+
+def measure(name, f):
+    start = time.perf_counter()
+    count = f()
+    elapsed = time.perf_counter() - start
+    print("%-28s %8.1f ms  %10.0f points/s" % (name, elapsed*1000, count/elapsed))
+
+def main():
+    server = HTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    tz = pytz.timezone("Europe/Paris")
+    start = int(tz.localize(datetime.datetime(2019, 1, 1)).timestamp())
+    series = Series(typed=True)
+    for i in range(POINTS):
+        series.append(start + i*1800, 1800.0, 0.5, "pleine" if i % 3 else "creuse")
+    records = [dict(r) for r in series]
+
+    def exporter(**kwargs):
+        return InfluxdbExporter(host="127.0.0.1", port=port, database="linky", username=None, password=None, prefix="linky_", **kwargs)
+
+    print("%d points" % POINTS)
+    measure("legacy (json, single write)", lambda: legacy_save(exporter(), "hourly", records))
+    measure("line protocol", lambda: exporter().save_data("hourly", series))
+    measure("line protocol, gzip", lambda: exporter(gzip=True).save_data("hourly", series))
+    measure("line protocol, 1000/batch", lambda: exporter(batch_size=1000).save_data("hourly", series))
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+'''
+Cost of 10 years of half-hourly readings, with 3 tariff histories:
+per-record tariff lookup vs. indexed pricing (pure python, and numpy if installed)
+
+    python -m benchmarks.pricing
+'''
+import datetime
+import timeit
+
+from mylinky.enedis import Series, Timesheet
+from mylinky.pricing import Tariff, TariffHistory, Pricing
+
+YEARS = 10
+
+def histories():
+    hphc = TariffHistory([Tariff(datetime.date(2010 + y, 8, 1) if y else datetime.date(2010, 1, 1),
+        {"creuse": 0.10 + y/100, "pleine": 0.15 + y/100}) for y in range(YEARS)])
+    base = TariffHistory([Tariff(datetime.date(2010, 1, 1), 0.14), Tariff(datetime.date(2015, 2, 1), 0.16)])
+    tempo = TariffHistory([Tariff(datetime.date(2010, 1, 1), {
+        "bleu": {"creuse": 0.09, "pleine": 0.11},
+        "blanc": {"creuse": 0.11, "pleine": 0.13},
+        "rouge": {"creuse": 0.12, "pleine": 0.55}})])
+    return {"hphc": hphc, "base": base, "tempo": tempo}
+
+def legacy_cost(series, history, colours):
+    # tariff and colour found for each record
+    total = 0.0
+    for r in series:
+        date = r["date"]
+        tariff = history.at(date.date())
+        colour = colours.get((date - datetime.timedelta(hours=6)).date(), "bleu")
+        total += r["value"] * r["duration"] / 3600 * tariff.price(r["type"], colour)
+    return total
+
+def main():
+    start = Series.TZ.localize(datetime.datetime(2010, 1, 1))
+    begin = int(start.timestamp())
+    count = YEARS*365*48
+    series = Series(dates=range(begin, begin + count*1800, 1800), durations=[1800.0]*count, values=[1.0]*count)
+    Timesheet([(datetime.time(22, 0), datetime.time(6, 0))]).classify(series)
+    colours = {datetime.date(2010 + y, 1, 2) + datetime.timedelta(days=d): "rouge" for y in range(YEARS) for d in range(22)}
+    tariffs = histories()
+
+    legacy = min(timeit.repeat(lambda: [legacy_cost(series, h, colours) for h in tariffs.values()], number=1, repeat=1))
+    python = min(timeit.repeat(lambda: Pricing(series, colours=colours, numpy=False).compare(tariffs), number=1, repeat=3))
+
+    print("%d points, %d tariffs" % (count, len(tariffs)))
+    print("per record:       %8.1f ms" % (legacy*1000))
+    print("indexed:          %8.1f ms (x%.1f)" % (python*1000, legacy/python))
+    try:
+        import numpy
+    except ImportError:
+        return
+    vector = min(timeit.repeat(lambda: Pricing(series, colours=colours, numpy=True).compare(tariffs), number=1, repeat=3))
+    print("indexed (numpy):  %8.1f ms (x%.1f)" % (vector*1000, legacy/vector))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+'''
+HP/HC classification of 10 years of half-hourly readings:
+per-record loop over the timesheets vs. precomputed slot table
+
+    python -m benchmarks.timesheet
+'''
+import datetime
+import timeit
+
+from mylinky.enedis import Enedis, Timesheet
+
+POINTS = 10*365*48
+
+TIMESHEETS = [Enedis.parsetimesheet("01:30", "07:30"), Enedis.parsetimesheet("12:30", "14:30")]
+
+def legacy_type(timesheets, startdate):
+    # Data._get_type before the lookup table
+    daytime = startdate.time()
+    for (stime, etime) in timesheets:
+        if stime<etime:
+            if daytime >= stime and daytime < etime:
+                return "creuse"
+        else:
+            if daytime >= stime or daytime < etime:
+                return "creuse"
+    return "pleine"
+
+def main():
+    start = datetime.datetime(2010, 1, 1)
+    step = datetime.timedelta(minutes=30)
+    dates = [start + i*step for i in range(POINTS)]
+    slots = bytes(i % Timesheet.SLOTS for i in range(POINTS))
+    timesheet = Timesheet(TIMESHEETS)
+
+    legacy = min(timeit.repeat(lambda: [legacy_type(TIMESHEETS, d) for d in dates], number=1, repeat=3))
+    single = min(timeit.repeat(lambda: [timesheet.code(d) for d in dates], number=1, repeat=3))
+    vector = min(timeit.repeat(lambda: timesheet.classify_slots(slots), number=1, repeat=3))
+
+    print("%d points" % POINTS)
+    print("legacy loop:      %8.1f ms" % (legacy*1000))
+    print("table lookup:     %8.1f ms (x%.1f)" % (single*1000, legacy/single))
+    print("vectorized slots: %8.1f ms (x%.1f)" % (vector*1000, legacy/vector))
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,3 @@
-import yaml
 import logging
 
 from mylinky.enedis import Enedis
@@ -12,7 +11,15 @@ class MyLinkyConfig():
             "enedis": {
                 "username": None,
                 "password": None,
-                "timesheets": None
+                "timesheets": None,
+                "session-cache": None,
+                "session-max-age": 1800
+            },
+            "http": {
+                "pool-size": 10,
+                "keepalive": True,
+                "timeout": 30,
+                "stream": False
             },
             "influxdb" : {
                 "host": "localhost",
@@ -20,7 +27,46 @@ class MyLinkyConfig():
                 "database": "linky",
                 "username": None,
                 "password": None,
-                "measurement-prefix": "linky_"
+                "measurement-prefix": "linky_",
+                "batch-size": 5000,
+                "precision": "s",
+                "gzip": False,
+                "udp-port": None
+            },
+            "retry": {
+                "retries": 3,
+                "backoff": 0.5,
+                "max-backoff": 30,
+                "failure-threshold": 5,
+                "reset-timeout": 30,
+                "concurrency": 8,
+                "max-concurrency": 16,
+                "latency-target": 10
+            },
+            "archive": {
+                "format": "json",
+                "compression": "zstd"
+            },
+            "backfill": {
+                "workers": 2,
+                "margin": 30,
+                "retention-days": 365
+            },
+            "cache": {
+                "path": None,
+                "max-size": 64*1024*1024,
+                "ttl": 3600
+            },
+            "pricing": {
+                "tariffs": [],
+                "colours": None
+            },
+            "accounts": [],
+            "fleet": {
+                "workers": 8,
+                "rate": 2.0,
+                "burst": 5,
+                "state": "mylinky-state.json"
             }
         }
 
@@ -29,14 +75,28 @@ class MyLinkyConfig():
             d = self.data
         for (k,v) in d.items():
             if type(d[k])==dict:
-                self._merge(d2[k] if k in d2 else {}, d[k])
+                # e.g. the {"backfill": false} of the lambda events is not the backfill section
+                self._merge(d2[k] if isinstance(d2.get(k), dict) else {}, d[k])
             elif k in d2:
                 if k=="timesheets":
                     d[k] = [ Enedis.parsetimesheet(l[0],l[1]) for l in d2[k] ]
+                elif k=="accounts":
+                    d[k] = [ self._account(a) for a in d2[k] ]
                 else:
                     d[k] = d2[k]
         return d
 
+    def _account(self, a):
+        account = {
+            "name": a.get("name", a["username"]),
+            "username": a["username"],
+            "password": a.get("password"),
+            "timesheets": self.data["enedis"]["timesheets"]
+        }
+        if a.get("timesheets") is not None:
+            account["timesheets"] = [ Enedis.parsetimesheet(l[0],l[1]) for l in a["timesheets"] ]
+        return account
+
     def load_from_dict(self, d):
         self._merge(d)
         log.debug("config: %s" % self.data)
@@ -47,7 +107,8 @@ class MyLinkyConfig():
             return self.load_from_fileobj(f)
 
     def load_from_fileobj(self, f):
-        data = yaml.load(f)
+        import yaml
+        data = yaml.safe_load(f)
         log.debug("using configuration: %s" % data)
         return self.load_from_dict(data)
 
@@ -63,6 +124,39 @@ class MyLinkyConfig():
         if "timesheet" in kwargs and kwargs["timesheet"] is not None:
             self.data["enedis"]["timesheets"] = kwargs["timesheet"]
 
+        if "session_cache" in kwargs and kwargs["session_cache"] is not None:
+            self.data["enedis"]["session-cache"] = kwargs["session_cache"]
+
+        ## HTTP
+        if "pool_size" in kwargs and kwargs["pool_size"] is not None:
+            self.data["http"]["pool-size"] = kwargs["pool_size"]
+        if "timeout" in kwargs and kwargs["timeout"] is not None:
+            self.data["http"]["timeout"] = kwargs["timeout"]
+        if "no_keepalive" in kwargs and kwargs["no_keepalive"]:
+            self.data["http"]["keepalive"] = False
+        if "stream" in kwargs and kwargs["stream"]:
+            self.data["http"]["stream"] = True
+
+        ## RETRY
+        if "retries" in kwargs and kwargs["retries"] is not None:
+            self.data["retry"]["retries"] = kwargs["retries"]
+
+        ## ARCHIVE
+        if "compression" in kwargs and kwargs["compression"] is not None:
+            self.data["archive"]["compression"] = kwargs["compression"]
+
+        ## CACHE
+        if "cache" in kwargs and kwargs["cache"] is not None:
+            self.data["cache"]["path"] = kwargs["cache"]
+
+        ## FLEET
+        if "fleet_workers" in kwargs and kwargs["fleet_workers"] is not None:
+            self.data["fleet"]["workers"] = kwargs["fleet_workers"]
+        if "rate" in kwargs and kwargs["rate"] is not None:
+            self.data["fleet"]["rate"] = kwargs["rate"]
+        if "state" in kwargs and kwargs["state"] is not None:
+            self.data["fleet"]["state"] = kwargs["state"]
+
         ## INFLUXDB
         if "host" in kwargs and kwargs["host"] is not None:
             (host,port) = kwargs["host"].split(":")
@@ -74,4 +168,12 @@ class MyLinkyConfig():
             self.data["influxdb"]["password"] = kwargs["dbpassword"]
         if "db" in kwargs and kwargs["db"] is not None:
             self.data["influxdb"]["database"] = kwargs["db"]
+        if "batch_size" in kwargs and kwargs["batch_size"] is not None:
+            self.data["influxdb"]["batch-size"] = kwargs["batch_size"]
+        if "precision" in kwargs and kwargs["precision"] is not None:
+            self.data["influxdb"]["precision"] = kwargs["precision"]
+        if "gzip" in kwargs and kwargs["gzip"]:
+            self.data["influxdb"]["gzip"] = True
+        if "udp_port" in kwargs and kwargs["udp_port"] is not None:
+            self.data["influxdb"]["udp-port"] = kwargs["udp_port"]
 
@@ -1,6 +1,26 @@
+import bisect
 import datetime
+import calendar
 import re
 
+from array import array
+
+# (year, month) -> (ordinal of its first day, number of days)
+_MONTHS = {}
+
+def _month(year, month):
+    m = _MONTHS.get((year, month))
+    if m is None:
+        m = _MONTHS[(year, month)] = (datetime.date(year, month, 1).toordinal(), calendar.monthrange(year, month)[1])
+    return m
+
+def _shift(ordinal, months):
+    """Ordinal of a date shifted by 'months' (the day is clamped to the length of the month)"""
+    day = datetime.date.fromordinal(ordinal)
+    (year, month) = divmod(day.year*12 + day.month - 1 + months, 12)
+    (first, length) = _month(year, month + 1)
+    return first + min(day.day, length) - 1
+
 
 class datedelta:
     __slots__ = '_months', '_timedelta'
@@ -17,7 +37,7 @@ class datedelta:
 
     @classmethod
     def from_timedelta(cls, td):
-        return datedelta(0, 0, td.days, td.seconds, td.microseconds)
+        return datedelta(days=td.days, seconds=td.seconds, microseconds=td.microseconds)
 
     @classmethod
     def from_natural_str(cls, s):
@@ -73,44 +93,46 @@ class datedelta:
         """days"""
         return self._timedelta.days
 
+    def __eq__(self, other):
+        if isinstance(other, datedelta):
+            return self._months == other._months and self._timedelta == other._timedelta
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((self._months, self._timedelta))
+
     def __add__(self, other):
         if isinstance(other, datetime.timedelta):
             other = datedelta.from_timedelta(other)
         if isinstance(other, datedelta):
-            # for CPython compatibility, we cannot use
-            # our __class__ here, but need a real timedelta
-            return datedelta(self._months + other._months,
-                             self._days + other._days,
-                             self._seconds + other._seconds,
-                             self._microseconds + other._microseconds)
+            r = datedelta(months=self._months + other._months)
+            r._timedelta = self._timedelta + other._timedelta
+            return r
         if isinstance(other, datetime.datetime):
+            tzinfo = other.tzinfo
+            if hasattr(tzinfo, "localize"):
+                # pytz timezones: compute on the wall clock, and localize
+                # the result again (the UTC offset may have changed)
+                other = other.replace(tzinfo=None)
             other += self._timedelta
-            if self._months > 0:
-                year = self._months//12 + other.year
-                if self._months%12 + other.month > 12:
-                    year += 1 
-                    month = self._months%12 - (12-other.month)
-                else:
-                    month = self._months%12 + other.month
-                return other.replace(year=year, month=month)
-            elif self._months < 0:
-                year = other.year - abs(self._months)//12
-                if other.month - abs(self._months)%12 < 1:
-                    year -= 1 
-                    month = 12 - (abs(self._months)%12 - other.month)
-                else:
-                    month = other.month - abs(self._months)%12
-                return other.replace(year=year, month=month)
+            if self._months:
+                # the day is clamped to the length of the month (31/01 + 1 month = 28/02)
+                day = datetime.date.fromordinal(_shift(other.toordinal(), self._months))
+                other = other.replace(year=day.year, month=day.month, day=day.day)
+            if hasattr(tzinfo, "localize"):
+                other = tzinfo.localize(other)
             return other
         return NotImplemented
 
     __radd__ = __add__
 
     def __sub__(self, other):
-        return -self + other
+        if isinstance(other, (datedelta, datetime.timedelta)):
+            return self + -other
+        return NotImplemented
 
     def __rsub__(self, other):
-        if isinstance(other, datetime.datetime):
+        if isinstance(other, (datetime.datetime, datetime.timedelta)):
             return -self + other
         return NotImplemented
 
@@ -123,7 +145,8 @@ class datedelta:
         return self
 
     def __abs__(self):
-        if self._months < 0 and self._timedelta<0:
+        # the sign is the one of the months, or of the timedelta without months
+        if self._months < 0 or (self._months == 0 and self._timedelta < datetime.timedelta(0)):
             return -self
         else:
             return self
@@ -136,4 +159,98 @@ class datedelta:
                              self._timedelta.microseconds * other)
         return NotImplemented
 
-    __rmul__ = __mul__
\ No newline at end of file
+    __rmul__ = __mul__
+
+    def range(self, start, stop=None, count=None, numpy=False):
+        """Boundaries start + k*self (k = 0, 1...), before 'stop' or 'count' of them, as UTC timestamps
+
+        Same dates as 'start + k*self' (on the wall clock, localized again
+        with pytz), to the second, but computed in one pass on integer
+        seconds: the lengths of the months are cached, and short steps give
+        one arithmetic progression per day without UTC offset change.
+        Returns an array('q'), or a numpy datetime64[s] array with 'numpy'
+        (True, or the numpy module).
+        """
+        if stop is None and count is None:
+            raise ValueError("either 'stop' or 'count' is required")
+        seconds = self._timedelta.days*86400 + self._timedelta.seconds
+        if stop is not None and (self._months < 0 or seconds < 0 or (self._months == 0 and seconds == 0)):
+            raise ValueError("%r is not a positive step" % self)
+
+        tzinfo = start.tzinfo
+        if hasattr(tzinfo, "localize"):
+            localize = tzinfo.localize
+        else:
+            localize = lambda d: d.replace(tzinfo=tzinfo)
+        if tzinfo is not None:
+            utcoffset = lambda ts: int(datetime.datetime.fromtimestamp(ts, tz=tzinfo).utcoffset().total_seconds())
+        else:
+            utcoffset = lambda ts: int(datetime.datetime.fromtimestamp(ts).astimezone().utcoffset().total_seconds())
+        naive = start.replace(tzinfo=None)
+        # wall clock seconds since 01/01/0001 (ordinal 1)
+        wall = naive.toordinal()*86400 + naive.hour*3600 + naive.minute*60 + naive.second
+        epoch = datetime.datetime(1970, 1, 1).toordinal()*86400
+
+        def offset_of(w):
+            """UTC offset of a wall clock time"""
+            local = localize(datetime.datetime.fromordinal(w // 86400) + datetime.timedelta(seconds=w % 86400))
+            return w - epoch - int(local.timestamp())
+
+        # wall clock day -> its UTC offset, None if it changes around the day
+        days = {}
+        def day_offset(day):
+            offset = days.get(day, False)
+            if offset is False:
+                # cheaper than localize: the offset of the previous day holds if it is the one of
+                # the UTC instants around the day (so that no wall time of the day is ambiguous)
+                offset = days.get(day - 1)
+                if offset is None:
+                    offset = offset_of(day*86400)
+                ts = day*86400 - epoch - offset
+                if any(utcoffset(t) != offset for t in (ts - 14400, ts + 86400 + 14400)):
+                    (first, last) = (offset_of(day*86400), offset_of(day*86400 + 86399))
+                    offset = first if first == last else None
+                days[day] = offset
+            return offset
+
+        limit = stop.timestamp() if stop is not None else None
+        result = array('q')
+        if not self._months and 0 < seconds < 86400:
+            # one arithmetic progression per wall clock day (without UTC offset change)
+            k = 0
+            while (count is None or k < count) and (limit is None or not result or result[-1] < limit):
+                w = wall + k*seconds
+                day = w // 86400
+                n = -(-((day + 1)*86400 - w) // seconds)
+                if count is not None:
+                    n = min(n, count - k)
+                offset = day_offset(day)
+                if offset is None:
+                    result.extend(v - epoch - offset_of(v) for v in range(w, w + n*seconds, seconds))
+                else:
+                    first = w - epoch - offset
+                    result.extend(range(first, first + n*seconds, seconds))
+                k += n
+            if limit is not None:
+                # the timestamps never decrease
+                del result[bisect.bisect_left(result, limit):]
+        else:
+            k = 0
+            while count is None or k < count:
+                w = wall + k*seconds
+                if self._months:
+                    (day, time) = divmod(w, 86400)
+                    w = _shift(day, k*self._months)*86400 + time
+                ts = w - epoch - offset_of(w)
+                if limit is not None and ts >= limit:
+                    break
+                result.append(ts)
+                k += 1
+
+        if numpy:
+            if numpy is True:
+                import numpy
+            if not result:
+                return numpy.empty(0, dtype="datetime64[s]")
+            return numpy.frombuffer(result, dtype=numpy.int64).astype("datetime64[s]")
+        return result
\ No newline at end of file
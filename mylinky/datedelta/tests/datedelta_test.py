@@ -1,6 +1,12 @@
 import unittest
 import logging
 import datetime
+import pytz
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 from mylinky.datedelta import datedelta
 
@@ -95,6 +101,18 @@ class TestDateDelta(unittest.TestCase):
         log.debug(dd)
         self.assertEqual(dd.months, 3*12*5)
 
+    def testDateDeltaAddPytz(self):
+        tz = pytz.timezone("Europe/Paris")
+        d = tz.localize(datetime.datetime(year=2019, month=3, day=30))
+        r = d + datedelta(days=2)
+        log.debug(r)
+        self.assertEqual(r, tz.localize(datetime.datetime(year=2019, month=4, day=1)))
+        self.assertEqual(r.utcoffset(), datetime.timedelta(hours=2))
+
+        r = d + datedelta(months=1)
+        self.assertEqual(r, tz.localize(datetime.datetime(year=2019, month=4, day=30)))
+        self.assertEqual(r - datedelta(months=1), d)
+
     def testFromNatural(self):
         dd = datedelta.from_natural_str("2 days")
         log.debug(dd)
@@ -117,6 +135,52 @@ class TestDateDelta(unittest.TestCase):
         log.debug(dd)
         self.assertEqual(dd.months, 12)
 
+    def testArithmetic(self):
+        dd = datedelta(months=1, days=2) + datedelta(years=1, hours=3)
+        self.assertEqual((dd.months, dd.days), (13, 2))
+        self.assertEqual(dd, datedelta(months=13, days=2, hours=3))
+        self.assertEqual(datedelta(days=1) + datetime.timedelta(hours=2), datedelta(days=1, hours=2))
+        self.assertEqual(datedelta(months=2) - datedelta(months=1, days=1), datedelta(months=1, days=-1))
+        self.assertEqual(datedelta.from_timedelta(datetime.timedelta(days=3, seconds=10)), datedelta(days=3, seconds=10))
+
+        # the day is clamped to the end of the month
+        self.assertEqual(datetime.datetime(2019, 1, 31) + datedelta(months=1), datetime.datetime(2019, 2, 28))
+        self.assertEqual(datetime.datetime(2020, 3, 31) - datedelta(months=1), datetime.datetime(2020, 2, 29))
+
+    def testAbs(self):
+        self.assertEqual(abs(datedelta(months=-1)), datedelta(months=1))
+        self.assertEqual(abs(datedelta(days=-1)), datedelta(days=1))
+        self.assertEqual(abs(datedelta(months=-1, days=-1)), datedelta(months=1, days=1))
+        self.assertEqual(abs(datedelta(months=-1, days=2)), datedelta(months=1, days=-2))
+        self.assertEqual(abs(datedelta(months=1, days=-2)), datedelta(months=1, days=-2))
+        self.assertEqual(abs(datedelta(days=2)), datedelta(days=2))
+
+    def testTimedeltaSub(self):
+        self.assertEqual(datetime.timedelta(days=3) - datedelta(days=1), datedelta(days=2))
+        self.assertEqual(datetime.timedelta(hours=1) - datedelta(months=1), datedelta(months=-1, hours=1))
+
+    def testRange(self):
+        tz = pytz.timezone("Europe/Paris")
+        for (start, step) in [
+                (tz.localize(datetime.datetime(2019, 3, 30)), datedelta(minutes=30)),
+                (tz.localize(datetime.datetime(2019, 10, 26, 12)), datedelta(hours=1)),
+                (tz.localize(datetime.datetime(2019, 1, 31)), datedelta(months=1)),
+                (tz.localize(datetime.datetime(2016, 2, 29)), datedelta(years=1))]:
+            expected = [int((start + k*step).timestamp()) for k in range(200)]
+            self.assertEqual(list(step.range(start, count=200)), expected)
+            self.assertEqual(list(step.range(start, stop=start + 50*step)), expected[:50])
+
+        with self.assertRaises(ValueError):
+            datedelta(months=-1).range(start, stop=start)
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def testRangeNumpy(self):
+        start = pytz.timezone("Europe/Paris").localize(datetime.datetime(2019, 10, 27))
+        r = datedelta(hours=1).range(start, count=25, numpy=True)
+        self.assertEqual(r.dtype, numpy.dtype("datetime64[s]"))
+        self.assertEqual(str(r[0]), "2019-10-26T22:00:00")
+        self.assertEqual(str(r[-1]), "2019-10-27T23:00:00")
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
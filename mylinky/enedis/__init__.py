@@ -1,3 +1,17 @@
 from .login import Login, LoginException
-from .data import Data
-from .enedis import Enedis
\ No newline at end of file
+from .data import Data, DataException, SessionExpired
+from .cache import ResponseCache
+from .session import SessionCache
+from .series import Series, Record
+from .timesheet import Timesheet
+from .ratelimit import TokenBucket
+from .transport import Transport
+from .retry import RetryPolicy, Backoff, CircuitBreaker, AdaptiveLimiter, CircuitOpen
+from .enedis import Enedis, PartialData
+
+def __getattr__(name):
+    # aiohttp is slow to import, and only needed by the asyncio client
+    if name == "AsyncEnedis":
+        from . import async_enedis
+        return getattr(async_enedis, name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+
+from urllib.parse import urlparse
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+from .login import Login
+from .data import Data, DataException, SessionExpired
+from .decode import loads
+from .retry import RetryPolicy
+from .enedis import Enedis
+
+log = logging.getLogger("enedis-async")
+
+class AsyncEnedis:
+    """asyncio counterpart of Enedis (requires aiohttp, 'mylinky[async]')
+
+    The request payloads, the response checks, the retries (RetryPolicy) and the
+    transformation of the data are shared with the synchronous Login/Data classes.
+    """
+
+    # transient failures, retried by the RetryPolicy
+    RETRYABLE = Data.RETRYABLE + ((aiohttp.ClientError, asyncio.TimeoutError) if aiohttp is not None else ())
+
+    def __init__(self, url=None, url2=None, timesheets=None, connector=None, limit_per_host=10, retry=None):
+        if aiohttp is None:
+            raise ImportError("AsyncEnedis requires aiohttp (pip install mylinky[async])")
+
+        self._url = url if url is not None else Login.URL
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.metrics = self.retry.metrics
+        # only used to transform the data
+        self._data = Data(None, url=url2, timesheets=timesheets, retry=self.retry)
+        self._connector = connector
+        self._limit_per_host = limit_per_host
+        self._session = None
+
+    async def __aenter__(self):
+        # a shared connector (limiting the connections per host) is not owned by the session
+        connector = self._connector if self._connector is not None else aiohttp.TCPConnector(limit_per_host=self._limit_per_host)
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            connector_owner=self._connector is None,
+            cookie_jar=aiohttp.CookieJar(unsafe=True),
+            headers={'User-agent': "mylinky"})
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+        self._session = None
+
+    async def login(self, username, password):
+        log.info("Sending login request for user %s" % username)
+        async with self._session.post(self._url, data=Login._payload(username, password), allow_redirects=False) as resp:
+            Login._check(resp.cookies)
+
+    async def _post(self, payload, params):
+        async with self._session.post(self._data.url, data=payload, params=params, allow_redirects=False) as resp:
+            body = await resp.read() if resp.status == 200 else None
+            return (resp.status, resp.headers.get("Location", "n/a"), body)
+
+    async def _attempt(self, payload, params):
+        with self.metrics.timer("query"):
+            (status, location, body) = await self._post(payload, params)
+            if 300 <= status < 400:
+                # It appears that it is frequent to get first a 302, even if the request is correct
+                self.metrics.incr("redirects")
+                (status, location, body) = await self._post(payload, params)
+
+        if 300 <= status < 400 or status in (401, 403):
+            # still redirected: the session is not valid anymore (redirected to the login page)
+            raise SessionExpired("Redirected to %s, session expired" % location)
+        if status != 200:
+            raise DataException("HTTP error %d" % status)
+
+        self.metrics.incr("bytes", len(body))
+        with self.metrics.timer("decode"):
+            return Data._check(loads(body))
+
+    async def _query_data(self, resource, startDate, endDate):
+        (payload, params) = Data._request(resource, startDate, endDate)
+        params = {k: str(v) for (k, v) in params.items()}
+
+        log.info("Sending data request for resource %s (%s - %s)" % (resource, startDate, endDate))
+        return await self.retry.acall(urlparse(self._data.url).netloc, lambda: self._attempt(payload, params),
+            retryable=AsyncEnedis.RETRYABLE, giveup=(SessionExpired,))
+
+    async def get_data(self, resource, startDate, endDate):
+        raw = await self._query_data(resource, startDate, endDate)
+        return self._data._transform_data(resource, raw, (startDate, endDate))
+
+    async def getdata(self, kind, startDate, endDate):
+        resource = Enedis.RESOURCE[kind]
+        (startDate, endDate) = Enedis.normalize(kind, startDate, endDate)
+        chunks = Enedis.chunks(resource, startDate, endDate)
+
+        results = await asyncio.gather(*[self.get_data(resource, s, e) for (s, e) in chunks])
+        return Enedis._merge(results, typed=(resource == Data.RESOURCE_HOURLY))
+
+async def collect(accounts, kind, startDate, endDate, concurrency=100, limit_per_host=10, url=None, url2=None, retry=None):
+    """Collect the data of several accounts concurrently, in one event loop
+
+    'accounts' is a list of dicts with 'username', 'password' and optional
+    'timesheets'. All the accounts share the RetryPolicy 'retry'. Returns a list with, for each account, either its Series or
+    the exception raised while collecting it.
+    """
+    if aiohttp is None:
+        raise ImportError("collect requires aiohttp (pip install mylinky[async])")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    retry = retry if retry is not None else RetryPolicy()
+    connector = aiohttp.TCPConnector(limit_per_host=limit_per_host)
+
+    async def one(account):
+        async with semaphore:
+            async with AsyncEnedis(url=url, url2=url2, timesheets=account.get("timesheets"), connector=connector, retry=retry) as enedis:
+                await enedis.login(account["username"], account["password"])
+                return await enedis.getdata(kind, startDate, endDate)
+
+    try:
+        return await asyncio.gather(*[one(account) for account in accounts], return_exceptions=True)
+    finally:
+        await connector.close()
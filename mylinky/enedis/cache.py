@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+
+log = logging.getLogger("enedis-cache")
+
+class ResponseCache:
+    """On-disk cache of raw 'graphe' payloads, keyed by account, resource and day.
+
+    The entries of an account (its username) are kept under a directory named
+    after a hash of it, so that the accounts sharing the cache never get each
+    other's readings.
+
+    Entries for fully elapsed (and complete) days never expire, the others
+    are kept for 'ttl' seconds. The total size is capped to 'max_size' bytes,
+    the least recently used entries being evicted first.
+    """
+
+    def __init__(self, path, max_size=64*1024*1024, ttl=3600):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+        self._size = sum(size for (_, _, size) in self._entries())
+        log.debug("Creating cache (%s) with %d bytes" % (self.path, self._size))
+
+    @classmethod
+    def _scope(cls, account):
+        return hashlib.sha256(account.encode("utf-8")).hexdigest()[:16]
+
+    def _fname(self, resource, key, account=None):
+        if account is None:
+            return os.path.join(self.path, resource, "%s.json" % key)
+        return os.path.join(self.path, ResponseCache._scope(account), resource, "%s.json" % key)
+
+    def _entries(self):
+        for (dirpath, _, fnames) in os.walk(self.path):
+            for fname in fnames:
+                if not fname.endswith(".json"):
+                    continue
+                fname = os.path.join(dirpath, fname)
+                try:
+                    st = os.stat(fname)
+                except FileNotFoundError:
+                    continue
+                yield (fname, st.st_mtime, st.st_size)
+
+    def _remove(self, fname):
+        try:
+            size = os.path.getsize(fname)
+            os.remove(fname)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._size -= size
+
+    def get(self, resource, key, account=None):
+        fname = self._fname(resource, key, account)
+        try:
+            with open(fname) as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            log.warning("dropping corrupted cache entry %s" % fname)
+            self._remove(fname)
+            return None
+
+        if entry["expires"] is not None and entry["expires"] < time.time():
+            log.debug("cache entry %s expired" % fname)
+            self._remove(fname)
+            return None
+
+        # the mtime records the last access, for the LRU eviction
+        os.utime(fname)
+        return entry["graphe"]
+
+    def put(self, resource, key, graphe, immutable=False, account=None):
+        fname = self._fname(resource, key, account)
+        entry = {
+            "expires": None if immutable else time.time() + self.ttl,
+            "graphe": graphe
+        }
+
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+        (fd, tmpname) = tempfile.mkstemp(dir=os.path.dirname(fname), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        size = os.path.getsize(tmpname)
+        previous = os.path.getsize(fname) if os.path.exists(fname) else 0
+        os.replace(tmpname, fname)
+
+        with self._lock:
+            self._size += size - previous
+            oversized = self._size > self.max_size
+        if oversized:
+            self.evict()
+
+    def evict(self):
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda e: e[1])
+            size = sum(e[2] for e in entries)
+            for (fname, _, fsize) in entries:
+                if size <= self.max_size:
+                    break
+                log.debug("evicting cache entry %s" % fname)
+                try:
+                    os.remove(fname)
+                except FileNotFoundError:
+                    pass
+                size -= fsize
+            self._size = size
+
+    def clear(self):
+        for (fname, _, _) in list(self._entries()):
+            self._remove(fname)
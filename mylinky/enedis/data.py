@@ -1,17 +1,25 @@
 import logging
 import requests
 import datetime
-from requests_toolbelt.utils import dump
-import base64
-import pytz
+
+from urllib.parse import urlparse
 
 from mylinky.datedelta import datedelta
 
+from .series import Series
+from .timesheet import Timesheet
+from .slots import SlotIndex, SLOT
+from .decode import GrapheDecoder, Points, loads, pairs
+from .retry import RetryPolicy
+
 log = logging.getLogger("enedis-data")
 
 class DataException(Exception):
     pass
 
+class SessionExpired(DataException):
+    pass
+
 class Data:
     URL = 'https://espace-client-particuliers.enedis.fr/group/espace-particuliers/suivi-de-consommation'
 
@@ -25,60 +33,163 @@ class Data:
         RESOURCE_YEARLY: datedelta(years=1),
     }
 
-    def __init__(self, cookies, timesheets=None, url=None):
+    # transient failures, retried by the RetryPolicy
+    RETRYABLE = (DataException, requests.RequestException, ValueError)
+
+    # chunks of the streamed responses
+    CHUNK_SIZE = 64*1024
+
+    def __init__(self, cookies, timesheets=None, url=None, cache=None, limiter=None, session=None, retry=None, stream_decode=False, account=None):
         self.url = url if url is not None else Data.URL
-        self.session = requests.Session()
-        self.timesheets = timesheets
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.metrics = self.retry.metrics
+        self.session = session if session is not None else requests.Session()
+        # compiled once, in a lookup table
+        self.timesheet = Timesheet(timesheets)
+        self.timesheets = self.timesheet.timesheets
+        # half-hour ranks of the hourly graphes -> UTC timestamps, built once per day
+        self.slots = SlotIndex(Series.TZ)
+        self.cache = cache
+        # the cache entries are scoped to the account (username)
+        self.account = account
+        self.limiter = limiter
+        # decode the graphe data incrementally, from the response stream
+        self.stream_decode = stream_decode
+
+        self.set_cookies(cookies)
+
+        log.debug("Creating data (%s) with session %s" % (self.url, self.session))
 
+    def set_cookies(self, cookies, clear=False):
+        if clear:
+            self.session.cookies.clear()
         if cookies is not None:
             if type(cookies) != list:
                 cookies = [cookies]
             for cookie in cookies:
                 self.session.cookies.set_cookie(cookie)
 
-        log.debug("Creating data (%s) with session %s" % (self.url, self.session))
-
     def get_data(self, resource, startDate=datetime.datetime(year=1970, month=1, day=1), endDate=datetime.datetime.today()):
-        raw = self._query_data(resource, startDate, endDate)
+        if self.cache is not None:
+            data = self._get_cached_data(resource, startDate, endDate)
+        else:
+            raw = self._query_data(resource, startDate, endDate)
+            data = self._transform_data(resource, raw, (startDate, endDate))
 
-        data = self._transform_data(resource, raw, (startDate, endDate))
+        self.metrics.incr("points", len(data))
         return data
 
-    def _get_type(self, startdate):
-        daytime = startdate.time()
-        if self.timesheets is None:
-            return "normale"
-        
-        for (stime, etime) in self.timesheets:
-            if stime<etime:
-                # not crossing a day, this is
-                # the normal case
-                # e.g.: 00:00 --> 06:00
-                if daytime >= stime and daytime < etime:
-                    return "creuse"
-            else:
-                # we are crossing a day
-                # e.g.: 22:00 --> 06:30
-                if daytime >= stime or daytime < etime:
-                    return "creuse"
+    @classmethod
+    def _is_complete(cls, graphe, slots=None):
+        values = [v for (_, v) in pairs(graphe["data"])]
+        if slots is not None and len(values) < slots:
+            return False
+        return all(v >= 0 for v in values)
+
+    @classmethod
+    def _plain(cls, graphe):
+        """The graphe with its items as JSON (for the cache)"""
+        if isinstance(graphe["data"], Points):
+            return dict(graphe, data=list(graphe["data"]))
+        return graphe
+
+    def _split_days(self, raw):
+        start = datetime.datetime.strptime(raw["periode"]["dateDebut"], "%d/%m/%Y")
+        offset = raw["decalage"] if raw["decalage"]>0 else 0
 
-        return "pleine"
+        days = {}
+        for (ordre, valeur) in pairs(raw["data"]):
+            rank = ordre-1
+            if rank < offset:
+                continue
+            rank = rank - offset
+            (day, slot) = self.slots.locate(start.date(), rank)
+            days.setdefault(day.date, []).append({"valeur": valeur, "ordre": slot+1})
+
+        graphes = {}
+        for (day, items) in days.items():
+            begin = datetime.datetime.combine(day, datetime.time())
+            graphes[day] = {
+                "decalage": 0,
+                "periode": {
+                    "dateDebut": begin.strftime("%d/%m/%Y"),
+                    "dateFin": (begin + datetime.timedelta(days=1)).strftime("%d/%m/%Y")
+                },
+                "data": items
+            }
+        return graphes
+
+    def _get_cached_data(self, resource, startDate, endDate):
+        today = datetime.datetime.now(tz=startDate.tzinfo).replace(hour=0, minute=0, second=0, microsecond=0) + datedelta()
+        bounds = (startDate, endDate)
+
+        if resource != Data.RESOURCE_HOURLY:
+            # monthly and yearly graphes are cached for the whole window
+            key = "%s_%s" % (startDate.strftime("%Y-%m-%d"), endDate.strftime("%Y-%m-%d"))
+            raw = self.cache.get(resource, key, account=self.account)
+            if raw is None:
+                raw = self._query_data(resource, startDate, endDate)
+                self.cache.put(resource, key, Data._plain(raw), immutable=(endDate <= today and Data._is_complete(raw)), account=self.account)
+            return self._transform_data(resource, raw, bounds)
+
+        days = []
+        day = startDate.replace(hour=0, minute=0, second=0, microsecond=0) + datedelta()
+        while day < endDate:
+            days.append(day)
+            day = day + datedelta(days=1)
+
+        graphes = {}
+        for day in days:
+            graphes[day] = self.cache.get(resource, day.strftime("%Y-%m-%d"), account=self.account)
+
+        # query the network only for the runs of consecutive missing days
+        runs = []
+        for day in days:
+            if graphes[day] is not None:
+                continue
+            if runs and runs[-1][-1] + datedelta(days=1) == day:
+                runs[-1].append(day)
+            else:
+                runs.append([day])
+        log.debug("cache: %d/%d days hit, %d requests" % (len(days) - sum(len(r) for r in runs), len(days), len(runs)))
+
+        for run in runs:
+            raw = self._query_data(resource, run[0], run[-1] + datedelta(days=1))
+            split = self._split_days(raw)
+            for day in run:
+                graphe = split.get(day.date())
+                if graphe is None:
+                    continue
+                elapsed = day + datedelta(days=1) <= today
+                self.cache.put(resource, day.strftime("%Y-%m-%d"), graphe,
+                    immutable=(elapsed and Data._is_complete(graphe, self.slots.day(day.date()).count)), account=self.account)
+                graphes[day] = graphe
+
+        return Series.concat([self._transform_data(resource, graphes[day], bounds) for day in days if graphes[day] is not None],
+            typed=(resource == Data.RESOURCE_HOURLY))
 
-        
+    def _get_type(self, startdate):
+        return self.timesheet.type(startdate)
 
     def _transform_data(self, resource, raw, bounds=None):
-        start = datetime.datetime.strptime(raw["periode"]["dateDebut"], "%d/%m/%Y").replace(tzinfo=pytz.timezone("Europe/Paris"))
-        end = datetime.datetime.strptime(raw["periode"]["dateFin"], "%d/%m/%Y").replace(tzinfo=pytz.timezone("Europe/Paris"))
+        with self.metrics.timer("transform"):
+            return self._transform(resource, raw, bounds)
+
+    def _transform(self, resource, raw, bounds=None):
+        start = Series.TZ.localize(datetime.datetime.strptime(raw["periode"]["dateDebut"], "%d/%m/%Y"))
+        end = Series.TZ.localize(datetime.datetime.strptime(raw["periode"]["dateFin"], "%d/%m/%Y"))
         step = Data.STEPS[resource]
 
         if resource == Data.RESOURCE_YEARLY:
             start = start.replace(day=1, month=1)
             end = end.replace(day=1, month=1)
 
-        data = []
+        data = Series(typed=(resource == Data.RESOURCE_HOURLY))
+        slots = bytearray()
         offset = raw["decalage"] if raw["decalage"]>0 else 0
-        for item in raw["data"]:
-            rank = int(item["ordre"])-1
+        points = []
+        for (ordre, valeur) in pairs(raw["data"]):
+            rank = ordre-1
 
             # apparently, the yearly data is a bit different and start its 'ordre' to 0, instead of 1...
             if resource in [Data.RESOURCE_YEARLY, Data.RESOURCE_MONTHLY]:
@@ -87,32 +198,46 @@ class Data:
             # correct the start with the 'decalage' field for incomplete graphe
             if rank < offset:
                 continue
-            rank = rank - offset
-            value = float(item["valeur"])
-
-            begin = start + (rank*step)
-            end = start + ((rank+1)*step)
-            duration = end - begin
-
-            if bounds and (begin < bounds[0] or begin >= bounds[1]):
+            points.append((rank - offset, valeur))
+        if not points:
+            return data
+
+        count = max(rank for (rank, _) in points) + 1
+        if data.typed:
+            # hourly graphes: one slot per real half-hour from the local midnight (46 or 50 on the DST days)
+            midnight = self.slots.day(start.date()).midnight
+            walls = self.slots.walls(start.date(), count)
+        else:
+            # all the slot boundaries of the graphe, in one pass
+            boundaries = step.range(start, count=count + 1)
+        (first, last) = (bounds[0].timestamp(), bounds[1].timestamp()) if bounds else (None, None)
+        for (rank, value) in points:
+            if data.typed:
+                (begin, duration) = (midnight + rank*SLOT, float(SLOT))
+            else:
+                (begin, duration) = (boundaries[rank], float(boundaries[rank+1] - boundaries[rank]))
+            if bounds and (begin < first or begin >= last):
                 continue
 
             # Value is given in kW
             #  - if value is '-2', there is no value --> drop
             #  - if value is '-1', TODO
-            if item["valeur"] < 0:
+            if value < 0:
                 continue
-            d = {'date': begin, 'duration': duration.total_seconds(), 'value': value}
-            if resource == Data.RESOURCE_HOURLY:
-                d.update({'type': self._get_type(start + (rank*step))})
-            data.append(d)
-
-        return data
+            data.dates.append(begin)
+            data.durations.append(duration)
+            data.values.append(float(value))
+            if data.typed:
+                # local half-hour of the day, for the timesheets
+                slots.append(walls[rank])
 
-    def _query_data(self, resource, startDate, endDate):
+        if data.typed:
+            data.types = self.timesheet.classify_slots(slots)
 
-        self.session.headers.update({'User-agent': "mylinky"})
+        return data
 
+    @classmethod
+    def _request(cls, resource, startDate, endDate):
         # note: payload is useless for yearly resource
         payload = {
             '_lincspartdisplaycdc_WAR_lincspartcdcportlet_dateDebut': startDate.strftime("%d/%m/%Y"),
@@ -130,18 +255,10 @@ class Data:
             'p_p_col_pos': 1,
             'p_p_col_count': 3
         }
+        return (payload, params)
 
-        log.info("Sending data request for resource %s (%s - %s)" % (resource, startDate, endDate))
-        resp = self.session.post(self.url, data=payload, params=params, allow_redirects=False)
-
-        if 300 <= resp.status_code < 400:
-            # It appears that it is frequent to get first a 302, even if the request is correct
-            # #nocomment
-            resp = self.session.post(self.url, data=payload, params=params, allow_redirects=False)
-
-        log.debug("resp: %s" % dump.dump_response(resp).decode('utf-8'))
-        body = resp.json()
-
+    @classmethod
+    def _check(cls, body):
         if body["etat"]["valeur"] == "erreur":
             raise DataException("Error on server when retrieving data: %s" % body["etat"]["erreurText"] if "erreurText" in body["etat"] else "n/a")
 
@@ -150,3 +267,55 @@ class Data:
 
         return body["graphe"]
 
+    def _post(self, payload, params):
+        if self.limiter is not None:
+            self.limiter.acquire()
+        return self.session.post(self.url, data=payload, params=params, allow_redirects=False, stream=self.stream_decode)
+
+    def _attempt(self, payload, params):
+        with self.metrics.timer("query"):
+            resp = self._post(payload, params)
+
+            if 300 <= resp.status_code < 400:
+                # It appears that it is frequent to get first a 302, even if the request is correct
+                # #nocomment
+                self.metrics.incr("redirects")
+                # the streamed responses hold their connection until closed
+                resp.close()
+                resp = self._post(payload, params)
+
+        with resp:
+            if 300 <= resp.status_code < 400 or resp.status_code in (401, 403):
+                # still redirected: the session is not valid anymore (redirected to the login page)
+                raise SessionExpired("Redirected to %s, session expired" % resp.headers.get("Location", "n/a"))
+            if resp.status_code >= 400:
+                raise DataException("HTTP error %d" % resp.status_code)
+
+            if self.stream_decode:
+                # the graphe data goes from the socket straight into arrays
+                with self.metrics.timer("decode"):
+                    decoder = GrapheDecoder()
+                    for chunk in resp.iter_content(Data.CHUNK_SIZE):
+                        decoder.feed(chunk)
+                    body = decoder.close()
+                self.metrics.incr("bytes", decoder.size)
+                return Data._check(body)
+
+            self.metrics.incr("bytes", len(resp.content))
+            if log.isEnabledFor(logging.DEBUG):
+                from requests_toolbelt.utils import dump
+                log.debug("resp: %s" % dump.dump_response(resp).decode('utf-8'))
+            with self.metrics.timer("decode"):
+                body = loads(resp.content)
+
+        return Data._check(body)
+
+    def _query_data(self, resource, startDate, endDate):
+
+        self.session.headers.update({'User-agent': "mylinky"})
+
+        (payload, params) = Data._request(resource, startDate, endDate)
+
+        log.info("Sending data request for resource %s (%s - %s)" % (resource, startDate, endDate))
+        return self.retry.call(urlparse(self.url).netloc, lambda: self._attempt(payload, params),
+            retryable=Data.RETRYABLE, giveup=(SessionExpired,))
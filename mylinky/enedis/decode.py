@@ -0,0 +1,145 @@
+import re
+import json
+
+from array import array
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def loads(body):
+    """JSON decoding, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+class Points:
+    """Compact 'data' of a graphe: the ranks ('ordre') and values ('valeur') in arrays
+
+    Iterating gives the items of the JSON graphe back.
+    """
+    __slots__ = ("ordres", "valeurs")
+
+    def __init__(self, ordres=None, valeurs=None):
+        self.ordres = array('l', ordres if ordres is not None else [])
+        self.valeurs = array('d', valeurs if valeurs is not None else [])
+
+    def append(self, ordre, valeur):
+        self.ordres.append(ordre)
+        self.valeurs.append(valeur)
+
+    def __len__(self):
+        return len(self.ordres)
+
+    def __iter__(self):
+        return ({"valeur": v, "ordre": o} for (o, v) in zip(self.ordres, self.valeurs))
+
+    def items(self):
+        """(ordre, valeur) pairs"""
+        return zip(self.ordres, self.valeurs)
+
+def pairs(data):
+    """(ordre, valeur) pairs of the 'data' of a graphe, compact or not"""
+    if isinstance(data, Points):
+        return data.items()
+    return ((int(item["ordre"]), item["valeur"]) for item in data)
+
+_DATA = re.compile(rb'"data"\s*:\s*\[')
+_NUMBER = rb'(-?[0-9][0-9.eE+-]*)'
+_ITEM = re.compile(rb'[\s,]*\{\s*"(valeur|ordre)"\s*:\s*' + _NUMBER + rb'\s*,\s*"(valeur|ordre)"\s*:\s*' + _NUMBER + rb'\s*\}')
+_END = re.compile(rb'[\s,]*\]')
+# the items as sent by ENEDIS
+_REGULAR = re.compile(rb'\{\s*"valeur"\s*:\s*' + _NUMBER + rb'\s*,\s*"ordre"\s*:\s*' + _NUMBER + rb'\s*\}')
+
+class GrapheDecoder:
+    """Incremental decoding of a data response, fed with the chunks of its body
+
+    The items of the "data" array are scanned as they come, straight into a
+    Points object, without building the list of dicts: the other fields of
+    the response are decoded at the end, with the array left empty.
+    """
+
+    HEAD, ITEMS, TAIL = range(3)
+
+    def __init__(self):
+        self.state = GrapheDecoder.HEAD
+        self.points = Points()
+        self.size = 0
+        self._head = b""
+        self._buf = b""
+        self._searched = 0
+
+    def feed(self, chunk):
+        self.size += len(chunk)
+        self._buf += chunk
+        if self.state == GrapheDecoder.HEAD:
+            m = _DATA.search(self._buf, max(0, self._searched - 16))
+            if m is None:
+                self._searched = len(self._buf)
+                return
+            self._head = self._buf[:m.end()]
+            self._buf = self._buf[m.end():]
+            self.state = GrapheDecoder.ITEMS
+        if self.state == GrapheDecoder.ITEMS:
+            self._scan()
+
+    def _scan(self):
+        buf = self._buf
+        # fast path: all the complete items of the buffer at once, when they are all regular
+        end = buf.find(b"]")
+        last = buf.rfind(b"}", 0, end if end >= 0 else len(buf)) + 1
+        found = _REGULAR.findall(buf, 0, last)
+        if found and len(found) == buf.count(b"{", 0, last):
+            (valeurs, ordres) = zip(*found)
+            self.points.valeurs.extend(map(float, valeurs))
+            self.points.ordres.extend(map(int, ordres))
+            buf = buf[last:]
+        pos = 0
+        append = self.points.append
+        while True:
+            m = _ITEM.match(buf, pos)
+            if m is not None:
+                (k1, v1, k2, v2) = m.groups()
+                if k1 == b"ordre":
+                    append(int(v1), float(v2))
+                else:
+                    append(int(v2), float(v1))
+                pos = m.end()
+                continue
+            m = _END.match(buf, pos)
+            if m is not None:
+                self._head += b"]"
+                pos = m.end()
+                self.state = GrapheDecoder.TAIL
+                break
+            # any other item (other fields, null or string values) is decoded as such
+            start = buf.find(b"{", pos)
+            end = buf.find(b"}", pos)
+            if start < 0 or end < 0:
+                break
+            item = loads(buf[start:end+1])
+            valeur = item["valeur"]
+            # no value, as the '-2' of ENEDIS
+            append(int(item["ordre"]), float(valeur) if valeur is not None else -2.0)
+            pos = end + 1
+        self._buf = buf[pos:]
+
+    def close(self):
+        """The decoded response, whose graphe's 'data' is a Points"""
+        if self.state == GrapheDecoder.HEAD:
+            return loads(self._buf)
+        if self.state == GrapheDecoder.ITEMS:
+            raise ValueError("truncated graphe data (%d points, %d bytes)" % (len(self.points), self.size))
+        body = loads(self._head + self._buf)
+        graphe = body.get("graphe")
+        if isinstance(graphe, dict) and graphe.get("data") == []:
+            graphe["data"] = self.points
+        return body
+
+    @classmethod
+    def decode(cls, chunks):
+        decoder = cls()
+        for chunk in chunks:
+            decoder.feed(chunk)
+        return decoder.close()
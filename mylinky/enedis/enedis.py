@@ -1,11 +1,35 @@
 import logging
 import datetime
+import bisect
+import itertools
+import collections
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from mylinky.datedelta import datedelta
 
 from .login import Login
-from .data import Data
+from .data import Data, DataException, SessionExpired
+from .series import Series
+from .timesheet import Timesheet
+from .transport import Transport
+from .retry import RetryPolicy
 
 log = logging.getLogger("enedis")
 
+class PartialData(DataException):
+    """Some windows failed after their retries
+
+    'failures' are their (start, end), and 'data' the Series of the other
+    windows (None when the data was streamed: it was already yielded).
+    """
+
+    def __init__(self, failures, data=None):
+        super().__init__("%d windows failed: %s" % (len(failures), ", ".join("%s - %s" % w for w in failures)))
+        self.failures = failures
+        self.data = data
+
 class Enedis:
     RESOURCE = {
         "hourly": Data.RESOURCE_HOURLY,
@@ -13,33 +37,180 @@ class Enedis:
         "yearly": Data.RESOURCE_YEARLY
     }
 
-    def __init__(self, url=None, url2=None, timesheets=None):
-        self._login = Login(url)
-        self._url2 = url2
+    # Long ranges are split in windows of this size, and fetched in parallel
+    # (None means the whole range is requested at once)
+    CHUNKS = {
+        Data.RESOURCE_HOURLY: datedelta(days=7),
+        Data.RESOURCE_MONTHLY: datedelta(years=1),
+        Data.RESOURCE_YEARLY: None,
+    }
+
+    def __init__(self, url=None, url2=None, timesheets=None, workers=4, retries=2, cache=None, limiter=None, sessions=None, transport=None, retry=None, metrics=None, stream_decode=False):
+        # one pooled HTTP session for the login and all the data requests
+        self.transport = transport if transport is not None else Transport(pool_size=max(workers, 1))
+        # backoff, circuit breaker and adaptive concurrency of the data requests
+        self.retry = retry if retry is not None else RetryPolicy(retries=retries, metrics=metrics)
+        # timings and counters, shared with the retry policy
+        self.metrics = self.retry.metrics
+        self._login = Login(url, limiter=limiter, session=self.transport, metrics=self.metrics)
+        self._sessions = sessions
+        self._credentials = None
+        self._generation = 0
+        self._lock = threading.Lock()
         self._cookies = None
-        self._timesheets = timesheets
+        self._timesheets = Timesheet(timesheets)
+        self._workers = workers
+        self._retries = retries
+        # kept across the getdata calls
+        self._data = Data(None, url=url2, timesheets=self._timesheets, cache=cache, limiter=limiter, session=self.transport, retry=self.retry, stream_decode=stream_decode)
+
+    def login(self, username, password, reuse=True):
+        self._credentials = (username, password)
+        # the cached responses are the ones of this account
+        self._data.account = username
+        if reuse and self._sessions is not None:
+            cookies = self._sessions.get(username)
+            if cookies is not None:
+                log.info("Reusing the session of user %s" % username)
+                self._cookies = cookies
+                self._data.set_cookies(cookies)
+                return
 
-    def login(self, username, password):
         cookies = self._login.login(username, password)
         self._cookies = cookies
+        self._data.set_cookies(cookies)
+        if self._sessions is not None:
+            self._sessions.put(username, cookies)
+
+    def _relogin(self, h, generation):
+        # several windows may see the expired session at the same time: login once
+        with self._lock:
+            if generation == self._generation:
+                log.info("Session expired, login again")
+                if self._sessions is not None:
+                    self._sessions.invalidate(self._credentials[0])
+                # the login shares the cookie jar of the data requests
+                h.set_cookies(None, clear=True)
+                self.login(*self._credentials, reuse=False)
+                self._generation += 1
+            h.set_cookies(self._cookies, clear=True)
 
     @classmethod
     def parsetimesheet(cls, start, end):
         return (datetime.datetime.strptime(start, "%H:%M").time(), datetime.datetime.strptime(end, "%H:%M").time())
 
-    def getdata(self, kind, **kwargs):
-        h = Data(self._cookies, url=self._url2, timesheets=self._timesheets)
+    @classmethod
+    def chunks(cls, resource, startDate, endDate):
+        step = cls.CHUNKS[resource]
+        if step is None:
+            return [(startDate, endDate)]
+
+        chunks = []
+        begin = startDate
+        while begin < endDate:
+            end = min(begin + step, endDate)
+            chunks.append((begin, end))
+            begin = end
+        return chunks
+
+    def _fetch_chunk(self, h, resource, chunk):
+        (startDate, endDate) = chunk
+        # the transient failures are retried by the RetryPolicy of Data
+        for attempt in range(self._retries + 1):
+            generation = self._generation
+            try:
+                return h.get_data(resource=resource, startDate=startDate, endDate=endDate)
+            except SessionExpired as e:
+                if self._credentials is None:
+                    raise
+                self._relogin(h, generation)
+                error = e
+        raise error
 
-        # normalize date
+    @classmethod
+    def _merge(cls, chunks, typed=None):
+        return Series.concat(chunks, typed=typed)
+
+    @classmethod
+    def normalize(cls, kind, startDate, endDate):
         if kind == "monthly":
-            kwargs["startDate"] = kwargs["startDate"].replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            kwargs["endDate"] = kwargs["endDate"].replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            startDate = startDate.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            endDate = endDate.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
         if kind == "yearly":
-            kwargs["startDate"] = kwargs["startDate"].replace(day=1, month=1, hour=0, minute=0, second=0, microsecond=0)
-            kwargs["endDate"] = kwargs["endDate"].replace(day=1, month=1, hour=0, minute=0, second=0, microsecond=0)
+            startDate = startDate.replace(day=1, month=1, hour=0, minute=0, second=0, microsecond=0)
+            endDate = endDate.replace(day=1, month=1, hour=0, minute=0, second=0, microsecond=0)
+        # adding a (null) datedelta localizes again the dates, whose UTC offset may have changed
+        return (startDate + datedelta(), endDate + datedelta())
 
-        log.debug("requesting data (%s): %s - %s" % (kind, kwargs["startDate"], kwargs["endDate"]))
-        data = h.get_data(resource=Enedis.RESOURCE[kind], **kwargs)
-        log.debug("data (%d): %s%s" % (len(data), data[0:5], "..." if len(data)>6 else ""))
-        return data
+    def iterdata(self, kind, startDate, endDate, failures=None):
+        """Yield the data one window (Series) at a time, in order
+
+        At most 'workers' windows are fetched ahead, so the memory usage does not
+        depend on the length of the range.
+
+        The windows failing after their retries are skipped: they are appended
+        to 'failures' when it is a list, otherwise PartialData is raised once
+        the other windows are yielded (or their error, when all failed).
+        """
+        h = self._data
+        resource = Enedis.RESOURCE[kind]
+
+        (startDate, endDate) = Enedis.normalize(kind, startDate, endDate)
+        log.debug("requesting data (%s): %s - %s" % (kind, startDate, endDate))
+        chunks = Enedis.chunks(resource, startDate, endDate)
 
+        # all the chunks share the same session (and its cookies)
+        failed = failures if failures is not None else []
+        workers = max(1, min(self._workers, len(chunks)))
+        last = None
+        done = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = collections.deque()
+            chunks = iter(chunks)
+            for chunk in itertools.islice(chunks, workers):
+                pending.append((chunk, pool.submit(self._fetch_chunk, h, resource, chunk)))
+
+            while pending:
+                (chunk, future) = pending.popleft()
+                for next_chunk in itertools.islice(chunks, 1):
+                    pending.append((next_chunk, pool.submit(self._fetch_chunk, h, resource, next_chunk)))
+                try:
+                    data = future.result()
+                except Exception as e:
+                    # keep the other windows, the failed one is reported at the end
+                    log.error("giving up on chunk %s - %s: %s" % (chunk[0], chunk[1], e))
+                    failed.append(chunk)
+                    error = e
+                    continue
+                done += 1
+
+                # drop what was already sent with the previous windows
+                if last is not None and len(data) and data.dates[0] <= last:
+                    data = data[bisect.bisect_right(data.dates, last):]
+                if len(data):
+                    last = data.dates[-1]
+                yield data
+
+        if failed and failures is None:
+            if done == 0:
+                raise error
+            raise PartialData(failed)
+
+    def getdata(self, kind, stream=False, failures=None, **kwargs):
+        """The data of [startDate, endDate), merged or as a stream of windows (see iterdata for 'failures')"""
+        data = self.iterdata(kind, kwargs["startDate"], kwargs["endDate"], failures=failures)
+        if stream:
+            return data
+
+        typed = (Enedis.RESOURCE[kind] == Data.RESOURCE_HOURLY)
+        batches = []
+        try:
+            for batch in data:
+                batches.append(batch)
+        except PartialData as e:
+            e.data = Enedis._merge(batches, typed=typed)
+            raise
+        data = Enedis._merge(batches, typed=typed)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("data (%d): %s%s" % (len(data), list(data[0:5]), "..." if len(data)>6 else ""))
+        return data
@@ -1,8 +1,9 @@
 import logging
 import requests
-from requests_toolbelt.utils import dump
 import base64
 
+from mylinky.metrics import Metrics
+
 log = logging.getLogger("enedis-login")
 
 class LoginException(Exception):
@@ -11,27 +12,43 @@ class LoginException(Exception):
 class Login:
     URL = 'https://espace-client-connexion.enedis.fr/auth/UI/Login'
 
-    def __init__(self, url=None):
+    def __init__(self, url=None, limiter=None, session=None, metrics=None):
         self.url = url if url is not None else Login.URL
-        self.session = requests.Session()
+        self.limiter = limiter
+        self.metrics = metrics if metrics is not None else Metrics(enabled=False)
+        # may be shared with Data, to reuse the pooled connections
+        self.session = session if session is not None else requests.Session()
         log.debug("Creating login (%s) with session %s" % (self.url, self.session))
 
-    def login(self, username, password):
-        self.session.headers.update({'User-agent': "mylinky"})
-        payload = {
+    @classmethod
+    def _payload(cls, username, password):
+        return {
             'IDToken1': username,
             'IDToken2': password,
-            'SunQueryParamsString': base64.b64encode(b'realm=particuliers'),
+            'SunQueryParamsString': base64.b64encode(b'realm=particuliers').decode(),
             'encoded': 'true',
             'gx_charset': 'UTF-8'
         }
 
-        log.info("Sending login request for user %s" % username)
-        resp = self.session.post(self.url, data=payload, allow_redirects=False)
-
-        log.debug("resp: %s" % dump.dump_response(resp).decode('utf-8'))
-        log.debug("cookies: %s" % resp.cookies)
-        if not 'iPlanetDirectoryPro' in resp.cookies:
+    @classmethod
+    def _check(cls, cookies):
+        log.debug("cookies: %s" % cookies)
+        if not 'iPlanetDirectoryPro' in cookies:
             raise LoginException("Login unsuccessful. Check your credentials.")
 
+    def login(self, username, password):
+        self.session.headers.update({'User-agent': "mylinky"})
+        payload = Login._payload(username, password)
+
+        log.info("Sending login request for user %s" % username)
+        if self.limiter is not None:
+            self.limiter.acquire()
+        with self.metrics.timer("login"):
+            resp = self.session.post(self.url, data=payload, allow_redirects=False)
+
+        if log.isEnabledFor(logging.DEBUG):
+            from requests_toolbelt.utils import dump
+            log.debug("resp: %s" % dump.dump_response(resp).decode('utf-8'))
+        Login._check(resp.cookies)
+
         return [ c for c in resp.cookies]
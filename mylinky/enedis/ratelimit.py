@@ -0,0 +1,35 @@
+import time
+import logging
+import threading
+
+log = logging.getLogger("enedis-ratelimit")
+
+class TokenBucket:
+    """Thread-safe token bucket: 'rate' requests per second, bursts up to 'burst'"""
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._clock = clock
+        self._sleep = sleep
+        self._last = clock()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens=1):
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+                self.waited += wait
+            log.debug("rate limited, waiting %.3fs" % wait)
+            self._sleep(wait)
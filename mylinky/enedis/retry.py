@@ -0,0 +1,219 @@
+import time
+import random
+import logging
+import threading
+
+from mylinky.metrics import Metrics
+
+log = logging.getLogger("enedis-retry")
+
+class CircuitOpen(Exception):
+    pass
+
+class Backoff:
+    """Exponential backoff with full jitter: uniform in [0, min(cap, base*2^attempt)]"""
+
+    def __init__(self, base=0.5, cap=30.0, rand=random.random):
+        self.base = base
+        self.cap = cap
+        self._rand = rand
+
+    def delay(self, attempt):
+        return self._rand() * min(self.cap, self.base * (2 ** attempt))
+
+class CircuitBreaker:
+    """Per-host circuit breaker
+
+    After 'threshold' consecutive failures on a host, its requests are rejected
+    for 'reset' seconds. Then a single trial request is let through (half-open):
+    its success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, threshold=5, reset=30.0, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset = reset
+        self._clock = clock
+        self._lock = threading.Lock()
+        # host -> [consecutive failures, opened at (or None), trial in progress]
+        self._hosts = {}
+
+    def _state(self, host):
+        return self._hosts.setdefault(host, [0, None, False])
+
+    def remaining(self, host):
+        """Seconds before the circuit of 'host' lets a request through again"""
+        with self._lock:
+            state = self._state(host)
+            if state[1] is None:
+                return 0.0
+            return max(0.0, state[1] + self.reset - self._clock())
+
+    def allow(self, host):
+        with self._lock:
+            state = self._state(host)
+            if state[1] is None:
+                return True
+            if state[2] or self._clock() < state[1] + self.reset:
+                return False
+            state[2] = True
+            return True
+
+    def success(self, host):
+        with self._lock:
+            self._hosts[host] = [0, None, False]
+
+    def failure(self, host):
+        with self._lock:
+            state = self._state(host)
+            state[0] += 1
+            if state[2] or state[0] >= self.threshold:
+                if state[1] is None or state[2]:
+                    log.warning("circuit open for %s (%d failures)" % (host, state[0]))
+                state[1] = self._clock()
+                state[2] = False
+
+    def opened(self):
+        with self._lock:
+            return sorted(host for (host, state) in self._hosts.items() if state[1] is not None)
+
+class AdaptiveLimiter:
+    """Bound the requests in flight, with an AIMD limit
+
+    The limit grows by 1/limit after each fast successful request, and is halved
+    after a failure or a request slower than 'latency' seconds.
+    """
+
+    def __init__(self, limit=8, minimum=1, maximum=16, latency=10.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency = latency
+        self.limit = float(max(minimum, min(limit, maximum)))
+        self._inflight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self._inflight >= int(self.limit):
+                self._cond.wait()
+            self._inflight += 1
+
+    def release(self, latency, failed=False):
+        with self._cond:
+            self._inflight -= 1
+            if failed or latency > self.latency:
+                self.limit = max(float(self.minimum), self.limit / 2)
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+class RetryPolicy:
+    """Retries of the ENEDIS requests, shared by all the Data of a run
+
+    A failed attempt is retried after an exponential backoff (or after the
+    circuit of the host is closed again), and the requests in flight are
+    bounded by an adaptive limiter. The counters are kept in 'metrics'.
+    """
+
+    def __init__(self, retries=3, backoff=None, breaker=None, limiter=None, metrics=None, clock=time.monotonic, sleep=time.sleep):
+        self.retries = retries
+        self.backoff = backoff if backoff is not None else Backoff()
+        self.breaker = breaker if breaker is not None else CircuitBreaker(clock=clock)
+        self.limiter = limiter if limiter is not None else AdaptiveLimiter()
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._clock = clock
+        self._sleep = sleep
+
+    def _delay(self, host, attempt):
+        self.metrics.incr("retries")
+        delay = max(self.backoff.delay(attempt - 1), self.breaker.remaining(host))
+        log.debug("retrying in %.3fs (attempt %d/%d)" % (delay, attempt+1, self.retries+1))
+        return delay
+
+    def _done(self, host, failed):
+        if failed:
+            self.breaker.failure(host)
+        else:
+            self.breaker.success(host)
+        self.metrics.gauge("concurrency_limit", self.limiter.limit)
+        self.metrics.gauge("circuits_open", len(self.breaker.opened()))
+
+    def call(self, host, f, retryable=(Exception,), giveup=()):
+        """Call f() until it succeeds, at most 'retries' more times
+
+        The exceptions of 'giveup' (for instance an expired session) are raised
+        at once, the 'retryable' ones are retried.
+        """
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                self._sleep(self._delay(host, attempt))
+
+            if not self.breaker.allow(host):
+                self.metrics.incr("circuit_rejected")
+                error = CircuitOpen("too many failures on %s, circuit open" % host)
+                continue
+
+            self.limiter.acquire()
+            self.metrics.incr("attempts")
+            begin = self._clock()
+            failed = True
+            try:
+                result = f()
+                failed = False
+            except giveup:
+                # the host did answer
+                failed = False
+                raise
+            except retryable as e:
+                self.metrics.incr("errors")
+                log.warning("request to %s failed (attempt %d/%d): %s" % (host, attempt+1, self.retries+1, e))
+                error = e
+            finally:
+                self.limiter.release(self._clock() - begin, failed=failed)
+                self._done(host, failed)
+
+            if not failed:
+                return result
+
+        self.metrics.incr("failures")
+        raise error
+
+    async def acall(self, host, f, retryable=(Exception,), giveup=()):
+        """call() of a coroutine function f, for asyncio
+
+        The requests in flight are bounded by the connector of the session, not
+        by the limiter (it would block the event loop).
+        """
+        # only loaded by the asyncio client
+        import asyncio
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                await asyncio.sleep(self._delay(host, attempt))
+
+            if not self.breaker.allow(host):
+                self.metrics.incr("circuit_rejected")
+                error = CircuitOpen("too many failures on %s, circuit open" % host)
+                continue
+
+            self.metrics.incr("attempts")
+            failed = True
+            try:
+                result = await f()
+                failed = False
+            except giveup:
+                # the host did answer
+                failed = False
+                raise
+            except retryable as e:
+                self.metrics.incr("errors")
+                log.warning("request to %s failed (attempt %d/%d): %s" % (host, attempt+1, self.retries+1, e))
+                error = e
+            finally:
+                self._done(host, failed)
+
+            if not failed:
+                return result
+
+        self.metrics.incr("failures")
+        raise error
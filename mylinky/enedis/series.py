@@ -0,0 +1,201 @@
+import bisect
+import datetime
+import pytz
+
+from array import array
+
+class Record:
+    """Lazy, read-only view on one reading of a Series"""
+    __slots__ = ('_series', '_index')
+
+    def __init__(self, series, index):
+        self._series = series
+        self._index = index
+
+    def keys(self):
+        return self._series.fields()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def __getitem__(self, key):
+        s = self._series
+        i = self._index
+        if key == "date":
+            return s.date(i)
+        if key == "duration":
+            return s.durations[i]
+        if key == "value":
+            return s.values[i]
+        if key == "type" and s.typed:
+            return Series.TYPES[s.types[i]]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return dict(self) == dict(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(dict(self))
+
+class Series:
+    """Readings stored in contiguous arrays
+
+     - dates: epoch timestamps (seconds) of the beginning of each reading
+     - durations: duration of each reading (seconds)
+     - values: value of each reading
+     - types: tariff code of each reading (index in Series.TYPES), for typed series only
+    """
+    TYPES = ("normale", "creuse", "pleine")
+    TYPE_CODES = {t: i for (i, t) in enumerate(TYPES)}
+
+    TZ = pytz.timezone("Europe/Paris")
+
+    def __init__(self, typed=False, tz=None, dates=(), durations=(), values=(), types=()):
+        self.typed = typed
+        self.tz = tz if tz is not None else Series.TZ
+        self.dates = array('q', dates)
+        self.durations = array('d', durations)
+        self.values = array('d', values)
+        self.types = array('b', types)
+
+    @classmethod
+    def from_records(cls, records, typed=None, tz=None):
+        records = list(records)
+        if typed is None:
+            typed = len(records) > 0 and "type" in records[0]
+        s = cls(typed=typed, tz=tz)
+        for r in records:
+            s.append(r["date"], r["duration"], r["value"], r["type"] if typed else None)
+        return s
+
+    def fields(self):
+        if self.typed:
+            return ("date", "duration", "value", "type")
+        return ("date", "duration", "value")
+
+    def append(self, date, duration, value, type=None):
+        if isinstance(date, datetime.datetime):
+            date = int(date.timestamp())
+        self.dates.append(date)
+        self.durations.append(duration)
+        self.values.append(value)
+        if self.typed:
+            self.types.append(type if isinstance(type, int) else Series.TYPE_CODES[type])
+
+    def date(self, i):
+        return datetime.datetime.fromtimestamp(self.dates[i], tz=self.tz)
+
+    def type(self, i):
+        return Series.TYPES[self.types[i]] if self.typed else None
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self._slice(i)
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError("series index out of range")
+        return Record(self, i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield Record(self, i)
+
+    def __eq__(self, other):
+        if not isinstance(other, Series):
+            return NotImplemented
+        return (self.typed == other.typed and self.dates == other.dates and self.durations == other.durations
+                and self.values == other.values and self.types == other.types)
+
+    def __repr__(self):
+        return "%s(%d readings%s)" % (self.__class__.__name__, len(self),
+            ", %s - %s" % (self.date(0), self.date(-1)) if len(self) else "")
+
+    def _slice(self, sl):
+        return Series(typed=self.typed, tz=self.tz,
+            dates=self.dates[sl], durations=self.durations[sl], values=self.values[sl],
+            types=self.types[sl] if self.typed else ())
+
+    def between(self, start=None, end=None):
+        """Readings starting in [start, end), the series being sorted by date"""
+        lo = 0 if start is None else bisect.bisect_left(self.dates, int(start.timestamp()))
+        hi = len(self) if end is None else bisect.bisect_left(self.dates, int(end.timestamp()))
+        return self._slice(slice(lo, hi))
+
+    def rows(self):
+        """(date, duration, value[, type]) tuples, without building records"""
+        tz = self.tz
+        fromtimestamp = datetime.datetime.fromtimestamp
+        if self.typed:
+            types = Series.TYPES
+            for (d, du, v, t) in zip(self.dates, self.durations, self.values, self.types):
+                yield (fromtimestamp(d, tz=tz), du, v, types[t])
+        else:
+            for (d, du, v) in zip(self.dates, self.durations, self.values):
+                yield (fromtimestamp(d, tz=tz), du, v)
+
+    def extend(self, other):
+        self.dates.extend(other.dates)
+        self.durations.extend(other.durations)
+        self.values.extend(other.values)
+        if self.typed:
+            self.types.extend(other.types)
+        return self
+
+    @classmethod
+    def concat(cls, series, typed=None, tz=None):
+        """Merge several series in one, ordered by date and without duplicated dates"""
+        series = [s for s in series if s is not None]
+        if typed is None:
+            typed = any(s.typed for s in series if len(s))
+        result = cls(typed=typed, tz=tz if tz is not None else (series[0].tz if series else None))
+        for s in series:
+            result.extend(s)
+
+        dates = result.dates
+        if all(dates[i] < dates[i+1] for i in range(len(dates)-1)):
+            return result
+
+        order = sorted(range(len(dates)), key=dates.__getitem__)
+        merged = cls(typed=result.typed, tz=result.tz)
+        last = None
+        for i in order:
+            if dates[i] == last:
+                continue
+            last = dates[i]
+            merged.dates.append(dates[i])
+            merged.durations.append(result.durations[i])
+            merged.values.append(result.values[i])
+            if result.typed:
+                merged.types.append(result.types[i])
+        return merged
+
+    def to_numpy(self):
+        """Zero-copy numpy views of the arrays (requires numpy)"""
+        import numpy
+
+        arrays = {
+            "date": numpy.frombuffer(self.dates, dtype=numpy.int64),
+            "duration": numpy.frombuffer(self.durations, dtype=numpy.float64),
+            "value": numpy.frombuffer(self.values, dtype=numpy.float64),
+        }
+        if self.typed:
+            arrays["type"] = numpy.frombuffer(self.types, dtype=numpy.int8)
+        return arrays
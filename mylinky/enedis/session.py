@@ -0,0 +1,72 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import requests
+
+log = logging.getLogger("enedis-session")
+
+class SessionCache:
+    """Login cookies kept on disk (user only readable), keyed by username
+
+    A session is reused until one of its cookies expires, or for 'max_age'
+    seconds (the ENEDIS session cookies have no expiration date).
+    """
+
+    def __init__(self, path, max_age=1800):
+        self.path = path
+        self.max_age = max_age
+        os.makedirs(self.path, mode=0o700, exist_ok=True)
+        # whatever the umask, and for an existing directory as well
+        os.chmod(self.path, 0o700)
+
+    def _fname(self, username):
+        return os.path.join(self.path, "%s.json" % hashlib.sha256(username.encode("utf-8")).hexdigest())
+
+    def get(self, username):
+        fname = self._fname(username)
+        try:
+            with open(fname) as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        now = time.time()
+        if entry["created"] + self.max_age < now:
+            log.debug("session of %s is too old" % username)
+            self.invalidate(username)
+            return None
+        if any(c["expires"] is not None and c["expires"] < now for c in entry["cookies"]):
+            log.debug("session of %s has expired" % username)
+            self.invalidate(username)
+            return None
+
+        return [requests.cookies.create_cookie(c["name"], c["value"], domain=c["domain"], path=c["path"],
+                    secure=c["secure"], expires=c["expires"]) for c in entry["cookies"]]
+
+    def put(self, username, cookies):
+        entry = {
+            "created": time.time(),
+            "cookies": [{
+                "name": c.name,
+                "value": c.value,
+                "domain": c.domain,
+                "path": c.path,
+                "secure": c.secure,
+                "expires": c.expires
+            } for c in cookies]
+        }
+
+        (fd, tmpname) = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        os.chmod(tmpname, 0o600)
+        os.replace(tmpname, self._fname(username))
+
+    def invalidate(self, username):
+        try:
+            os.remove(self._fname(username))
+        except FileNotFoundError:
+            pass
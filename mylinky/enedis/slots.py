@@ -0,0 +1,73 @@
+import datetime
+import collections
+
+from .series import Series
+from .timesheet import Timesheet
+
+# half-hour slots
+SLOT = Timesheet.SLOT*60
+# local half-hour of each slot of a day without DST change
+REGULAR = bytes(range(Timesheet.SLOTS))
+
+class DaySlots(collections.namedtuple("DaySlots", ["date", "midnight", "count", "walls"])):
+    """Half-hour slots of a local day: UTC timestamp of its midnight, number
+    of slots (46, 48 or 50) and local half-hour of the day (0-47) of each slot"""
+    __slots__ = ()
+
+    def timestamp(self, slot):
+        return self.midnight + slot*SLOT
+
+class SlotIndex:
+    """Maps the half-hour ranks of the hourly graphes to exact UTC timestamps
+
+    A graphe starts at the local midnight of its 'dateDebut' and has one
+    reading per real half-hour: 46 on the day the DST starts, 50 on the day it
+    ends. So the timestamp of a rank is simply midnight + rank*30min in UTC,
+    while the local day and half-hour of the day (for the HP/HC timesheets)
+    come from a table built once per day: the same shared one for all the
+    days without DST change.
+    """
+
+    def __init__(self, tz=None):
+        self.tz = tz if tz is not None else Series.TZ
+        # date -> DaySlots
+        self.days = {}
+
+    def _midnight(self, date):
+        midnight = datetime.datetime.combine(date, datetime.time())
+        if hasattr(self.tz, "localize"):
+            return int(self.tz.localize(midnight).timestamp())
+        return int(midnight.replace(tzinfo=self.tz).timestamp())
+
+    def day(self, date):
+        day = self.days.get(date)
+        if day is None:
+            midnight = self._midnight(date)
+            count = (self._midnight(date + datetime.timedelta(days=1)) - midnight) // SLOT
+            walls = REGULAR
+            if count != Timesheet.SLOTS:
+                walls = bytes(self._wall(midnight + slot*SLOT) for slot in range(count))
+            day = self.days[date] = DaySlots(date, midnight, count, walls)
+        return day
+
+    def _wall(self, ts):
+        local = datetime.datetime.fromtimestamp(ts, tz=self.tz)
+        return (local.hour*60 + local.minute) // Timesheet.SLOT
+
+    def locate(self, date, rank):
+        """(DaySlots, slot in the day) of a rank counted from the midnight of 'date'"""
+        day = self.day(date)
+        while rank >= day.count:
+            rank -= day.count
+            day = self.day(day.date + datetime.timedelta(days=1))
+        return (day, rank)
+
+    def walls(self, date, count):
+        """Local half-hours of the day of the 'count' first ranks from 'date'"""
+        walls = []
+        day = self.day(date)
+        while count > 0:
+            walls.append(day.walls[:count] if count < day.count else day.walls)
+            count -= day.count
+            day = self.day(day.date + datetime.timedelta(days=1))
+        return b"".join(walls)
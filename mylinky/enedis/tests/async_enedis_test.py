@@ -0,0 +1,111 @@
+import unittest
+import asyncio
+import datetime
+import responses
+import logging
+import pytz
+
+from mylinky.enedis import Enedis, RetryPolicy, Backoff, DataException, SessionExpired
+from mylinky.enedis.tests.enedis_test import hourly_callback
+
+try:
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+    from mylinky.enedis import AsyncEnedis
+    from mylinky.enedis.async_enedis import collect
+except ImportError:
+    web = None
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+class FakeRequest:
+    def __init__(self, body):
+        self.body = body
+
+@unittest.skipIf(web is None, "aiohttp is not installed")
+class TestAsyncEnedis(unittest.TestCase):
+
+    def setUp(self):
+        self.tz = pytz.timezone("Europe/Paris")
+        self.start = datetime.datetime(2019, 1, 1, tzinfo=self.tz)
+        self.end = datetime.datetime(2019, 1, 20, tzinfo=self.tz)
+        self.calls = []
+        # statuses of the next data responses, before the normal ones
+        self.statuses = []
+
+    async def login_handler(self, request):
+        form = await request.post()
+        if form["IDToken2"] != "strongpassword":
+            return web.Response(status=302)
+        resp = web.Response(status=302)
+        resp.set_cookie("iPlanetDirectoryPro", "cookie-%s" % form["IDToken1"])
+        return resp
+
+    async def data_handler(self, request):
+        self.calls.append(request.cookies.get("iPlanetDirectoryPro"))
+        if self.statuses:
+            return web.Response(status=self.statuses.pop(0))
+        (status, headers, body) = hourly_callback(FakeRequest(await request.text()))
+        return web.Response(status=status, text=body)
+
+    def run_server(self, coro):
+        async def main():
+            app = web.Application()
+            app.router.add_post("/login", self.login_handler)
+            app.router.add_post("/data", self.data_handler)
+            async with TestServer(app) as server:
+                return await coro(str(server.make_url("/login")), str(server.make_url("/data")))
+        return asyncio.run(main())
+
+    @responses.activate
+    def testSameAsSync(self):
+        async def fetch(url, url2):
+            async with AsyncEnedis(url=url, url2=url2) as e:
+                await e.login("testuser", "strongpassword")
+                return await e.getdata("hourly", self.start, self.end)
+        data = self.run_server(fetch)
+        self.assertEqual(self.calls, ["cookie-testuser"]*3)
+
+        responses.add_callback(responses.POST, "http://testme/data", callback=hourly_callback)
+        expected = Enedis(url2="http://testme/data").getdata("hourly", startDate=self.start, endDate=self.end)
+        self.assertEqual(data, expected)
+
+    def fetch_with(self, statuses, retries):
+        self.statuses = statuses
+        async def fetch(url, url2):
+            async with AsyncEnedis(url=url, url2=url2, retry=RetryPolicy(retries=retries, backoff=Backoff(0.0, 0.0))) as e:
+                await e.login("testuser", "strongpassword")
+                return await e.getdata("hourly", self.start, self.start + datetime.timedelta(days=2))
+        return self.run_server(fetch)
+
+    def testRetries(self):
+        # a redirect first, then a server error: retried
+        self.assertEqual(len(self.fetch_with([302, 500], retries=1)), 2*48)
+        self.assertEqual(len(self.calls), 3)
+
+        with self.assertRaises(DataException):
+            self.fetch_with([500, 500], retries=1)
+        # redirected again: the session expired, not retried
+        with self.assertRaises(SessionExpired):
+            self.fetch_with([302, 302, 500], retries=1)
+        self.assertEqual(self.statuses, [500])
+
+    def testCollect(self):
+        accounts = [{"username": "user%d" % i, "password": "strongpassword"} for i in range(20)]
+        accounts.append({"username": "baduser", "password": "wrong"})
+
+        async def fetch(url, url2):
+            return await collect(accounts, "hourly", self.start, self.end, concurrency=5, limit_per_host=4, url=url, url2=url2)
+        results = self.run_server(fetch)
+
+        self.assertEqual(len(results), 21)
+        for r in results[:20]:
+            self.assertEqual(len(r), 19*48)
+        self.assertTrue(isinstance(results[20], Exception))
+        self.assertEqual(len(self.calls), 20*3)
+        self.assertEqual(set(self.calls), set("cookie-user%d" % i for i in range(20)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+import datetime
+import responses
+import logging
+import tempfile
+import shutil
+import time
+import os
+import pytz
+
+from mylinky.enedis import Data, ResponseCache
+from mylinky.enedis.tests.enedis_test import hourly_callback
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.tz = pytz.timezone("Europe/Paris")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def testPutGet(self):
+        c = ResponseCache(self.path)
+        self.assertIsNone(c.get("res", "2019-01-01"))
+        c.put("res", "2019-01-01", {"data": [1]}, immutable=True)
+        self.assertEqual(c.get("res", "2019-01-01"), {"data": [1]})
+
+        # a new cache instance reads the same entries
+        c = ResponseCache(self.path)
+        self.assertEqual(c.get("res", "2019-01-01"), {"data": [1]})
+
+    def testTtl(self):
+        c = ResponseCache(self.path, ttl=-1)
+        c.put("res", "2019-01-01", {"data": [1]})
+        self.assertIsNone(c.get("res", "2019-01-01"))
+        c.put("res", "2019-01-02", {"data": [1]}, immutable=True)
+        self.assertIsNotNone(c.get("res", "2019-01-02"))
+
+    def testEviction(self):
+        c = ResponseCache(self.path, max_size=1000)
+        payload = {"data": ["x"*100]}
+        for i in range(5):
+            c.put("res", "k%d" % i, payload, immutable=True)
+            # make sure the access times are ordered
+            os.utime(c._fname("res", "k%d" % i), (time.time()-100+i, time.time()-100+i))
+        c.get("res", "k0")
+
+        for i in range(5, 8):
+            c.put("res", "k%d" % i, payload, immutable=True)
+        self.assertLessEqual(c._size, 1000)
+        self.assertIsNotNone(c.get("res", "k0"))
+        self.assertIsNone(c.get("res", "k1"))
+        self.assertIsNotNone(c.get("res", "k7"))
+
+    @responses.activate
+    def testCachedData(self):
+        responses.add_callback(responses.POST, "http://testme/data", callback=hourly_callback)
+        c = ResponseCache(self.path)
+        l = Data(cookies=None, url="http://testme/data", cache=c)
+
+        data = l.get_data(Data.RESOURCE_HOURLY,
+            startDate=self.tz.localize(datetime.datetime(2019, 1, 1)),
+            endDate=self.tz.localize(datetime.datetime(2019, 1, 5)))
+        self.assertEqual(len(responses.calls), 1)
+        self.assertEqual(len(data), 4*48)
+
+        # overlapping window: only the new tail is requested
+        data = l.get_data(Data.RESOURCE_HOURLY,
+            startDate=self.tz.localize(datetime.datetime(2019, 1, 2)),
+            endDate=self.tz.localize(datetime.datetime(2019, 1, 7)))
+        self.assertEqual(len(responses.calls), 2)
+        self.assertTrue("dateDebut=05%2F01%2F2019" in responses.calls[1].request.body)
+        self.assertEqual(len(data), 5*48)
+        self.assertEqual(data[0]["date"], self.tz.localize(datetime.datetime(2019, 1, 2)))
+        self.assertEqual(data[-1]["date"], self.tz.localize(datetime.datetime(2019, 1, 6, 23, 30)))
+
+    def testAccounts(self):
+        c = ResponseCache(self.path)
+        c.put("res", "2019-01-01", {"data": [1]}, immutable=True, account="user1")
+        self.assertEqual(c.get("res", "2019-01-01", account="user1"), {"data": [1]})
+        self.assertIsNone(c.get("res", "2019-01-01", account="user2"))
+        self.assertIsNone(c.get("res", "2019-01-01"))
+        # the usernames are not written on disk
+        self.assertNotIn("user1", c._fname("res", "2019-01-01", account="user1"))
+
+    @responses.activate
+    def testCachedDataAccounts(self):
+        responses.add_callback(responses.POST, "http://testme/data", callback=hourly_callback)
+        c = ResponseCache(self.path)
+        startDate = self.tz.localize(datetime.datetime(2019, 1, 1))
+        endDate = self.tz.localize(datetime.datetime(2019, 1, 3))
+
+        Data(cookies=None, url="http://testme/data", cache=c, account="user1").get_data(Data.RESOURCE_HOURLY, startDate=startDate, endDate=endDate)
+        Data(cookies=None, url="http://testme/data", cache=c, account="user2").get_data(Data.RESOURCE_HOURLY, startDate=startDate, endDate=endDate)
+        self.assertEqual(len(responses.calls), 2)
+        Data(cookies=None, url="http://testme/data", cache=c, account="user1").get_data(Data.RESOURCE_HOURLY, startDate=startDate, endDate=endDate)
+        self.assertEqual(len(responses.calls), 2)
+
+if __name__ == "__main__":
+    unittest.main()
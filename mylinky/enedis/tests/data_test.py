@@ -77,9 +77,9 @@ class TestData(unittest.TestCase):
         data = l._transform_data(Data.RESOURCE_HOURLY, test_data["graphe"])
         log.debug(data)
         self.assertEqual(len(data), 5)
-        self.assertEqual(data[0]["date"], datetime.datetime.strptime("11/11/2019 00:00", "%d/%m/%Y %H:%M").replace(tzinfo=pytz.timezone("Europe/Paris")))
+        self.assertEqual(data[0]["date"], pytz.timezone("Europe/Paris").localize(datetime.datetime.strptime("11/11/2019 00:00", "%d/%m/%Y %H:%M")))
         self.assertEqual(data[0]["value"], 4.154)
-        self.assertEqual(data[4]["date"], datetime.datetime.strptime("11/11/2019 02:00", "%d/%m/%Y %H:%M").replace(tzinfo=pytz.timezone("Europe/Paris")))
+        self.assertEqual(data[4]["date"], pytz.timezone("Europe/Paris").localize(datetime.datetime.strptime("11/11/2019 02:00", "%d/%m/%Y %H:%M")))
         self.assertEqual(data[4]["value"], 4.382)
 
     def testTransformDataIncompeteGraphe(self):
@@ -106,50 +106,77 @@ class TestData(unittest.TestCase):
         data = l._transform_data(Data.RESOURCE_HOURLY, test_data["graphe"])
         log.debug(data)
         self.assertEqual(len(data), 1)
-        self.assertEqual(data[0]["date"], datetime.datetime.strptime("11/11/2019 00:00", "%d/%m/%Y %H:%M").replace(tzinfo=pytz.timezone("Europe/Paris")))
+        self.assertEqual(data[0]["date"], pytz.timezone("Europe/Paris").localize(datetime.datetime.strptime("11/11/2019 00:00", "%d/%m/%Y %H:%M")))
         self.assertEqual(data[0]["value"], 4.210)
 
     def testTransformMonthlyOffset(self):
         test_data = json.loads('{"etat":{"valeur":"termine"},"graphe":{"decalage":4,"puissanceSouscrite":0,"periode":{"dateFin":"01/12/2019","dateDebut":"01/09/2019"},"data":[{"valeur":-1,"ordre":1},{"valeur":-1,"ordre":2},{"valeur":-1,"ordre":3},{"valeur":-1,"ordre":4},{"valeur":386.553,"ordre":4},{"valeur":579.89,"ordre":5},{"valeur":1343.156,"ordre":6},{"valeur":43.476,"ordre":7},{"valeur":-1,"ordre":9},{"valeur":-1,"ordre":10},{"valeur":-1,"ordre":11},{"valeur":-1,"ordre":12}]}}')
         l = Data(cookies=None, url="http://testme/data")
         data = l._transform_data(Data.RESOURCE_MONTHLY, test_data["graphe"], 
-            (datetime.datetime(year=2019, month=9, day=1).replace(tzinfo=pytz.timezone("Europe/Paris")),
-            datetime.datetime(year=2019, month=12, day=1).replace(tzinfo=pytz.timezone("Europe/Paris"))))
+            (pytz.timezone("Europe/Paris").localize(datetime.datetime(year=2019, month=9, day=1)),
+            pytz.timezone("Europe/Paris").localize(datetime.datetime(year=2019, month=12, day=1))))
         log.debug(data)
         self.assertEqual(len(data), 3)
-        self.assertEqual(data[0]["date"], datetime.datetime.strptime("1/09/2019", "%d/%m/%Y").replace(tzinfo=pytz.timezone("Europe/Paris")))
+        self.assertEqual(data[0]["date"], pytz.timezone("Europe/Paris").localize(datetime.datetime.strptime("1/09/2019", "%d/%m/%Y")))
         self.assertEqual(data[0]["value"], 386.553)
-        self.assertEqual(data[1]["date"], datetime.datetime.strptime("1/10/2019", "%d/%m/%Y").replace(tzinfo=pytz.timezone("Europe/Paris")))
+        self.assertEqual(data[1]["date"], pytz.timezone("Europe/Paris").localize(datetime.datetime.strptime("1/10/2019", "%d/%m/%Y")))
         self.assertEqual(data[1]["value"], 579.89)
-        self.assertEqual(data[2]["date"], datetime.datetime.strptime("1/11/2019", "%d/%m/%Y").replace(tzinfo=pytz.timezone("Europe/Paris")))
+        self.assertEqual(data[2]["date"], pytz.timezone("Europe/Paris").localize(datetime.datetime.strptime("1/11/2019", "%d/%m/%Y")))
         self.assertEqual(data[2]["value"], 1343.156)
 
     def testTransformMonthlyFull(self):
         test_data = json.loads('{"etat":{"valeur":"termine"},"graphe":{"decalage":0,"puissanceSouscrite":0,"periode":{"dateFin":"01/12/2019","dateDebut":"01/12/2018"},"data":[{"valeur":1946.421,"ordre":0},{"valeur":2985.301,"ordre":1},{"valeur":2116.03,"ordre":2},{"valeur":713.889,"ordre":3},{"valeur":987.182,"ordre":4},{"valeur":722.873,"ordre":5},{"valeur":510.548,"ordre":6},{"valeur":400.053,"ordre":7},{"valeur":485.04,"ordre":8},{"valeur":386.553,"ordre":9},{"valeur":579.89,"ordre":10},{"valeur":1343.156,"ordre":11},{"valeur":43.476,"ordre":12}]}}')
         l = Data(cookies=None, url="http://testme/data")
         data = l._transform_data(Data.RESOURCE_MONTHLY, test_data["graphe"], 
-            (datetime.datetime(year=2018, month=12, day=1).replace(tzinfo=pytz.timezone("Europe/Paris")),
-             datetime.datetime(year=2019, month=12, day=1).replace(tzinfo=pytz.timezone("Europe/Paris"))))
+            (pytz.timezone("Europe/Paris").localize(datetime.datetime(year=2018, month=12, day=1)),
+             pytz.timezone("Europe/Paris").localize(datetime.datetime(year=2019, month=12, day=1))))
         log.debug(data)
         self.assertEqual(len(data), 12)
-        self.assertEqual(data[0]["date"], datetime.datetime.strptime("1/12/2018", "%d/%m/%Y").replace(tzinfo=pytz.timezone("Europe/Paris")))
+        self.assertEqual(data[0]["date"], pytz.timezone("Europe/Paris").localize(datetime.datetime.strptime("1/12/2018", "%d/%m/%Y")))
         self.assertEqual(data[0]["value"], 1946.421)
-        self.assertEqual(data[1]["date"], datetime.datetime.strptime("1/1/2019", "%d/%m/%Y").replace(tzinfo=pytz.timezone("Europe/Paris")))
+        self.assertEqual(data[1]["date"], pytz.timezone("Europe/Paris").localize(datetime.datetime.strptime("1/1/2019", "%d/%m/%Y")))
         self.assertEqual(data[1]["value"], 2985.301)
-        self.assertEqual(data[2]["date"], datetime.datetime.strptime("1/2/2019", "%d/%m/%Y").replace(tzinfo=pytz.timezone("Europe/Paris")))
+        self.assertEqual(data[2]["date"], pytz.timezone("Europe/Paris").localize(datetime.datetime.strptime("1/2/2019", "%d/%m/%Y")))
         self.assertEqual(data[2]["value"], 2116.03)
 
     def testTransformYearly(self):
         test_data = json.loads('{"etat":{"valeur":"termine"},"graphe":{"decalage":0,"puissanceSouscrite":0,"periode":{"dateFin":"02/12/2019","dateDebut":"02/12/2016"},"data":[{"valeur":-2,"ordre":0},{"valeur":-2,"ordre":1},{"valeur":4148.506,"ordre":2},{"valeur":11327.075,"ordre":3}]}}')
         l = Data(cookies=None, url="http://testme/data")
         data = l._transform_data(Data.RESOURCE_YEARLY, test_data["graphe"], 
-            (datetime.datetime(year=2018, month=1, day=1).replace(tzinfo=pytz.timezone("Europe/Paris")), 
-             datetime.datetime(year=2019, month=1, day=1).replace(tzinfo=pytz.timezone("Europe/Paris"))))
+            (pytz.timezone("Europe/Paris").localize(datetime.datetime(year=2018, month=1, day=1)), 
+             pytz.timezone("Europe/Paris").localize(datetime.datetime(year=2019, month=1, day=1))))
         log.debug(data)
         self.assertEqual(len(data), 1)
-        self.assertEqual(data[0]["date"], datetime.datetime.strptime("1/1/2018", "%d/%m/%Y").replace(tzinfo=pytz.timezone("Europe/Paris")))
+        self.assertEqual(data[0]["date"], pytz.timezone("Europe/Paris").localize(datetime.datetime.strptime("1/1/2018", "%d/%m/%Y")))
         self.assertEqual(data[0]["value"], 4148.506)
 
+    def testTransformDST(self):
+        tz = pytz.timezone("Europe/Paris")
+        timesheets = [Enedis.parsetimesheet("02:00", "03:00")]
+        l = Data(cookies=None, url="http://testme/data", timesheets=timesheets)
+
+        # 50 half-hours on the 27/10/2019: 2:00-3:00 twice, once in CEST then in CET
+        graphe = {"decalage": 0, "periode": {"dateDebut": "27/10/2019", "dateFin": "28/10/2019"},
+            "data": [{"valeur": 1.0, "ordre": i+1} for i in range(50)]}
+        data = l._transform_data(Data.RESOURCE_HOURLY, graphe)
+        self.assertEqual(len(data), 50)
+        self.assertEqual(list(data.dates), list(range(data.dates[0], data.dates[0] + 50*1800, 1800)))
+        self.assertEqual(data[0]["date"], tz.localize(datetime.datetime(2019, 10, 27)))
+        self.assertEqual(data[49]["date"], tz.localize(datetime.datetime(2019, 10, 27, 23, 30)))
+        self.assertEqual([r["type"] for r in data][3:9], ["pleine"] + ["creuse"]*4 + ["pleine"])
+
+        # a week graphe with the 46 half-hours of the 31/03/2019, split per day
+        graphe = {"decalage": 0, "periode": {"dateDebut": "30/03/2019", "dateFin": "01/04/2019"},
+            "data": [{"valeur": 1.0, "ordre": i+1} for i in range(48 + 46 + 48)]}
+        days = l._split_days(graphe)
+        self.assertEqual([(d, len(g["data"])) for (d, g) in days.items()],
+            [(datetime.date(2019, 3, 30), 48), (datetime.date(2019, 3, 31), 46), (datetime.date(2019, 4, 1), 48)])
+        data = l._transform_data(Data.RESOURCE_HOURLY, days[datetime.date(2019, 4, 1)])
+        self.assertEqual(data[0]["date"], tz.localize(datetime.datetime(2019, 4, 1)))
+        data = l._transform_data(Data.RESOURCE_HOURLY, graphe)
+        self.assertEqual(len(set(data.dates)), 48 + 46 + 48)
+        self.assertEqual(data[48+4]["date"], tz.localize(datetime.datetime(2019, 3, 31, 3)))
+
     def testTimesheetEmpty(self):
         l = Data(cookies=None, url="http://testme/data")
         t = l._get_type(datetime.datetime(2019,1,1,1,30))
@@ -0,0 +1,85 @@
+import unittest
+import logging
+import json
+import responses
+
+from unittest import mock
+
+from mylinky.enedis import Data, DataException, SessionExpired
+from mylinky.enedis.decode import GrapheDecoder, Points, loads, pairs
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+def body(values, **kwargs):
+    return {"etat": {"valeur": "termine"}, "graphe": dict({"decalage": 0, "puissanceSouscrite": 9,
+        "periode": {"dateDebut": "11/11/2019", "dateFin": "12/11/2019"},
+        "data": [{"valeur": v, "ordre": i+1} for (i, v) in enumerate(values)]}, **kwargs)}
+
+class TestDecode(unittest.TestCase):
+
+    def testChunks(self):
+        raw = json.dumps(body([4.154, -2, 0.5, 1e-3] * 50)).encode()
+        # whatever the chunks boundaries
+        for size in (1, 7, 64, len(raw)):
+            decoded = GrapheDecoder.decode(raw[i:i+size] for i in range(0, len(raw), size))
+            graphe = decoded["graphe"]
+            self.assertIsInstance(graphe["data"], Points)
+            self.assertEqual(list(graphe["data"]), loads(raw)["graphe"]["data"])
+            self.assertEqual(graphe["periode"]["dateDebut"], "11/11/2019")
+            self.assertEqual(decoded["etat"], {"valeur": "termine"})
+
+    def testIrregular(self):
+        # keys in another order, extra fields, null values and whitespaces
+        raw = b'{"graphe": {"data" : [ {"ordre": 1, "valeur": 2.5}, {"valeur": null, "ordre": "2"},\n {"valeur": 1, "ordre": 3, "x": true} ], "decalage": 0}, "etat": {"valeur": "termine"}}'
+        graphe = GrapheDecoder.decode([raw])["graphe"]
+        self.assertEqual(list(pairs(graphe["data"])), [(1, 2.5), (2, -2.0), (3, 1.0)])
+        self.assertEqual(graphe["decalage"], 0)
+
+        # no graphe data, and truncated responses
+        self.assertEqual(GrapheDecoder.decode([b'{"etat": {"valeur": "erreur"}}']), {"etat": {"valeur": "erreur"}})
+        with self.assertRaises(ValueError):
+            GrapheDecoder.decode([b'{"graphe": {"data": [{"valeur": 1, "ordre": 1}'])
+
+    @responses.activate
+    def testStream(self):
+        responses.add(responses.POST, "http://testme/data", status=200, json=body([1.0, 2.0, -2, 4.0]))
+        data = Data(cookies=None, url="http://testme/data", stream_decode=True)
+        raw = data._attempt({}, {})
+        self.assertIsInstance(raw["data"], Points)
+        series = data._transform_data(Data.RESOURCE_HOURLY, raw)
+        self.assertEqual(list(series.values), [1.0, 2.0, 4.0])
+        self.assertEqual(Data._plain(raw)["data"][2], {"valeur": -2.0, "ordre": 3})
+
+        # same series as the decoding of the whole body
+        data.stream_decode = False
+        self.assertEqual(list(data._transform_data(Data.RESOURCE_HOURLY, data._attempt({}, {})).dates), list(series.dates))
+
+    @responses.activate
+    def testStreamClosed(self):
+        responses.add(responses.POST, "http://testme/data", status=302, headers={"Location": "http://testme/login"})
+        responses.add(responses.POST, "http://testme/data", status=500)
+        responses.add(responses.POST, "http://testme/data", status=302, headers={"Location": "http://testme/login"})
+        responses.add(responses.POST, "http://testme/data", status=302, headers={"Location": "http://testme/login"})
+        responses.add(responses.POST, "http://testme/data", status=200, json=body([1.0]))
+        data = Data(cookies=None, url="http://testme/data", stream_decode=True)
+        received = []
+        post = data._post
+        def recording_post(payload, params):
+            received.append(post(payload, params))
+            return received[-1]
+        data._post = recording_post
+        closed = []
+        # the discarded redirects and the errors release their connection
+        with mock.patch("requests.Response.close", autospec=True, side_effect=closed.append):
+            with self.assertRaises(DataException):
+                data._attempt({}, {})
+            with self.assertRaises(SessionExpired):
+                data._attempt({}, {})
+            data._attempt({}, {})
+        self.assertEqual([r.status_code for r in received], [302, 500, 302, 302, 200])
+        self.assertTrue(all(r in closed for r in received))
+
+if __name__ == "__main__":
+    unittest.main()
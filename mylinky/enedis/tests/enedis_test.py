@@ -0,0 +1,142 @@
+import unittest
+import datetime
+import responses
+import logging
+import json
+import pytz
+
+from urllib.parse import parse_qs
+
+from mylinky.enedis import Enedis, Data, Series, PartialData
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+def hourly_callback(request):
+    form = parse_qs(request.body)
+    start = datetime.datetime.strptime(form["_lincspartdisplaycdc_WAR_lincspartcdcportlet_dateDebut"][0], "%d/%m/%Y")
+    end = datetime.datetime.strptime(form["_lincspartdisplaycdc_WAR_lincspartcdcportlet_dateFin"][0], "%d/%m/%Y")
+    slots = (end-start).days*48
+    body = {
+        "etat": { "valeur": "termine" },
+        "graphe": {
+            "decalage": 0,
+            "puissanceSouscrite": 9,
+            "periode": {
+                "dateFin": end.strftime("%d/%m/%Y"),
+                "dateDebut": start.strftime("%d/%m/%Y")
+            },
+            "data": [ {"valeur": 1.0, "ordre": i+1} for i in range(slots) ]
+        }
+    }
+    return (200, {}, json.dumps(body))
+
+class TestEnedis(unittest.TestCase):
+
+    def setUp(self):
+        self.tz = pytz.timezone("Europe/Paris")
+
+    def testChunks(self):
+        start = self.tz.localize(datetime.datetime(2019, 1, 1))
+        end = self.tz.localize(datetime.datetime(2019, 1, 20))
+        chunks = Enedis.chunks(Data.RESOURCE_HOURLY, start, end)
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(chunks[0], (start, self.tz.localize(datetime.datetime(2019, 1, 8))))
+        self.assertEqual(chunks[-1], (self.tz.localize(datetime.datetime(2019, 1, 15)), end))
+
+        chunks = Enedis.chunks(Data.RESOURCE_YEARLY, start, end)
+        self.assertEqual(chunks, [(start, end)])
+
+    def testMerge(self):
+        d1 = self.tz.localize(datetime.datetime(2019, 1, 1, 0, 0))
+        d2 = self.tz.localize(datetime.datetime(2019, 1, 1, 0, 30))
+        data = Enedis._merge([
+            Series.from_records([{"date": d2, "duration": 1800, "value": 2}]),
+            Series.from_records([{"date": d1, "duration": 1800, "value": 1}, {"date": d2, "duration": 1800, "value": 2}])
+        ])
+        self.assertEqual([d["date"] for d in data], [d1, d2])
+
+    @responses.activate
+    def testGetDataChunked(self):
+        responses.add_callback(responses.POST, "http://testme/data", callback=hourly_callback)
+
+        e = Enedis(url2="http://testme/data", workers=3)
+        data = e.getdata("hourly",
+            startDate=self.tz.localize(datetime.datetime(2019, 1, 1)),
+            endDate=self.tz.localize(datetime.datetime(2019, 1, 20)))
+
+        self.assertEqual(len(responses.calls), 3)
+        self.assertEqual(len(data), 19*48)
+        self.assertEqual(data[0]["date"], self.tz.localize(datetime.datetime(2019, 1, 1)))
+        self.assertEqual(data[-1]["date"], self.tz.localize(datetime.datetime(2019, 1, 19, 23, 30)))
+        dates = [d["date"] for d in data]
+        self.assertEqual(dates, sorted(set(dates)))
+
+    @responses.activate
+    def testGetDataChunkRetry(self):
+        calls = []
+        def flaky_callback(request):
+            calls.append(request)
+            if len(calls) == 1:
+                return (500, {}, "")
+            return hourly_callback(request)
+        responses.add_callback(responses.POST, "http://testme/data", callback=flaky_callback)
+
+        e = Enedis(url2="http://testme/data", workers=1, retries=1)
+        failures = []
+        data = e.getdata("hourly",
+            startDate=self.tz.localize(datetime.datetime(2019, 1, 1)),
+            endDate=self.tz.localize(datetime.datetime(2019, 1, 10)), failures=failures)
+
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(len(data), 9*48)
+        self.assertEqual(failures, [])
+
+    @responses.activate
+    def testGetDataPartial(self):
+        def failing_callback(request):
+            # the second window always fails
+            if parse_qs(request.body)["_lincspartdisplaycdc_WAR_lincspartcdcportlet_dateDebut"] == ["08/01/2020"]:
+                return (500, {}, "")
+            return hourly_callback(request)
+        responses.add_callback(responses.POST, "http://testme/data", callback=failing_callback)
+
+        start = self.tz.localize(datetime.datetime(2020, 1, 1))
+        end = self.tz.localize(datetime.datetime(2020, 1, 22))
+        window = (self.tz.localize(datetime.datetime(2020, 1, 8)), self.tz.localize(datetime.datetime(2020, 1, 15)))
+        e = Enedis(url2="http://testme/data", workers=2, retries=0)
+        with self.assertRaises(PartialData) as ctx:
+            e.getdata("hourly", startDate=start, endDate=end)
+        self.assertEqual(ctx.exception.failures, [window])
+        self.assertEqual(len(ctx.exception.data), 14*48)
+
+        # streamed: the failed windows are collected
+        failures = []
+        batches = list(e.getdata("hourly", startDate=start, endDate=end, stream=True, failures=failures))
+        self.assertEqual(sum(len(b) for b in batches), 14*48)
+        self.assertEqual(failures, [window])
+
+    @responses.activate
+    def testGetDataStream(self):
+        responses.add_callback(responses.POST, "http://testme/data", callback=hourly_callback)
+
+        e = Enedis(url2="http://testme/data", workers=2)
+        stream = e.getdata("hourly", stream=True,
+            startDate=self.tz.localize(datetime.datetime(2019, 1, 1)),
+            endDate=self.tz.localize(datetime.datetime(2019, 2, 1)))
+
+        # nothing is fetched until the stream is consumed
+        self.assertEqual(len(responses.calls), 0)
+        batch = next(stream)
+        self.assertEqual(len(batch), 7*48)
+        self.assertLessEqual(len(responses.calls), 3)
+
+        batches = [batch] + list(stream)
+        self.assertEqual(len(batches), 5)
+        self.assertEqual(sum(len(b) for b in batches), 31*48)
+        dates = [d for b in batches for d in b.dates]
+        self.assertEqual(dates, sorted(set(dates)))
+
+if __name__ == "__main__":
+    unittest.main()
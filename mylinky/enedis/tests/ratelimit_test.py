@@ -0,0 +1,45 @@
+import unittest
+import logging
+import threading
+
+from mylinky.enedis import TokenBucket
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+class TestTokenBucket(unittest.TestCase):
+
+    def testBurstThenRate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, burst=3, clock=clock, sleep=clock.sleep)
+        for i in range(3):
+            bucket.acquire()
+        self.assertEqual(clock.now, 0.0)
+
+        for i in range(4):
+            bucket.acquire()
+        self.assertAlmostEqual(clock.now, 2.0)
+        self.assertAlmostEqual(bucket.waited, 2.0)
+
+    def testThreads(self):
+        bucket = TokenBucket(rate=1000, burst=10)
+        threads = [threading.Thread(target=lambda: [bucket.acquire() for i in range(20)]) for t in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertLessEqual(bucket._tokens, 10)
+
+if __name__ == "__main__":
+    unittest.main()
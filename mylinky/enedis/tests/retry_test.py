@@ -0,0 +1,145 @@
+import unittest
+import datetime
+import responses
+import logging
+import json
+
+from mylinky.enedis import Data, SessionExpired
+from mylinky.enedis import RetryPolicy, Backoff, CircuitBreaker, AdaptiveLimiter, CircuitOpen
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+BODY = {
+    "etat": { "valeur": "termine" },
+    "graphe": {
+        "decalage": 0,
+        "puissanceSouscrite": 9,
+        "periode": { "dateFin": "02/01/2019", "dateDebut": "01/01/2019" },
+        "data": [ {"valeur": 1.0, "ordre": 1} ]
+    }
+}
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.sleeps.append(delay)
+
+class TestRetry(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def policy(self, retries=3, threshold=5):
+        return RetryPolicy(retries=retries, backoff=Backoff(rand=lambda: 1.0),
+            breaker=CircuitBreaker(threshold=threshold, reset=30, clock=self.clock),
+            clock=self.clock, sleep=self.clock.sleep)
+
+    def query(self, policy):
+        d = Data(None, url="http://testme/data", retry=policy)
+        return d._query_data(Data.RESOURCE_HOURLY, datetime.datetime(2019, 1, 1), datetime.datetime(2019, 1, 2))
+
+    def testBackoff(self):
+        b = Backoff(base=0.5, cap=3, rand=lambda: 1.0)
+        self.assertEqual([b.delay(i) for i in range(5)], [0.5, 1, 2, 3, 3])
+
+    def testCircuitBreaker(self):
+        b = CircuitBreaker(threshold=2, reset=30, clock=self.clock)
+        b.failure("testme")
+        self.assertTrue(b.allow("testme"))
+        b.failure("testme")
+        self.assertFalse(b.allow("testme"))
+        self.assertEqual(b.remaining("testme"), 30)
+        self.assertTrue(b.allow("otherhost"))
+
+        # half-open: a single trial
+        self.clock.now = 31
+        self.assertTrue(b.allow("testme"))
+        self.assertFalse(b.allow("testme"))
+        b.failure("testme")
+        self.assertFalse(b.allow("testme"))
+        self.assertEqual(b.opened(), ["testme"])
+
+        self.clock.now = 62
+        self.assertTrue(b.allow("testme"))
+        b.success("testme")
+        self.assertTrue(b.allow("testme"))
+        self.assertEqual(b.opened(), [])
+
+    def testAdaptiveLimiter(self):
+        l = AdaptiveLimiter(limit=4, maximum=8, latency=1.0)
+        l.acquire()
+        l.release(0.1, failed=True)
+        self.assertEqual(l.limit, 2)
+        l.acquire()
+        l.release(5.0)
+        self.assertEqual(l.limit, 1)
+        l.acquire()
+        l.release(5.0)
+        self.assertEqual(l.limit, 1)
+        for i in range(3):
+            l.acquire()
+            l.release(0.1)
+        self.assertGreater(l.limit, 2)
+
+    @responses.activate
+    def testTransientFailures(self):
+        responses.add(responses.POST, "http://testme/data", status=502)
+        responses.add(responses.POST, "http://testme/data", status=200, body=json.dumps(BODY)[:20])
+        responses.add(responses.POST, "http://testme/data", status=200, json={"etat": {"valeur": "enattente"}})
+        responses.add(responses.POST, "http://testme/data", status=200, json=BODY)
+
+        policy = self.policy()
+        graphe = self.query(policy)
+        self.assertEqual(len(graphe["data"]), 1)
+        self.assertEqual(len(responses.calls), 4)
+        self.assertEqual(self.clock.sleeps, [0.5, 1, 2])
+
+        metrics = policy.metrics.snapshot()
+        self.assertEqual(metrics["counters"]["attempts"], 4)
+        self.assertEqual(metrics["counters"]["errors"], 3)
+        self.assertEqual(metrics["counters"]["retries"], 3)
+        self.assertEqual(metrics["gauges"]["circuits_open"], 0)
+
+    @responses.activate
+    def testRedirects(self):
+        responses.add(responses.POST, "http://testme/data", status=302, headers={"Location": "http://testme/login"})
+        responses.add(responses.POST, "http://testme/data", status=200, json=BODY)
+        responses.add(responses.POST, "http://testme/data", status=302, headers={"Location": "http://testme/login"})
+
+        policy = self.policy()
+        self.query(policy)
+        self.assertEqual(len(responses.calls), 2)
+
+        # an expired session is not retried
+        with self.assertRaises(SessionExpired):
+            self.query(policy)
+        self.assertEqual(len(responses.calls), 4)
+        self.assertEqual(policy.metrics.snapshot()["counters"]["redirects"], 2)
+        self.assertEqual(self.clock.sleeps, [])
+
+    @responses.activate
+    def testCircuitOpen(self):
+        responses.add(responses.POST, "http://testme/data", status=500)
+
+        policy = self.policy(threshold=2)
+        with self.assertRaises(CircuitOpen):
+            self.query(policy)
+        # the open circuit is waited for, and not hammered
+        self.assertEqual(len(responses.calls), 2)
+        self.assertEqual(self.clock.sleeps, [0.5, 30, 30])
+        self.assertEqual(policy.metrics.snapshot()["counters"]["circuit_rejected"], 2)
+        self.assertEqual(policy.metrics.snapshot()["counters"]["failures"], 1)
+
+        # the limit was halved after each failure
+        self.assertEqual(policy.limiter.limit, 2)
+
+if __name__ == "__main__":
+    unittest.main()
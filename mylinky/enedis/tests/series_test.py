@@ -0,0 +1,61 @@
+import unittest
+import datetime
+import logging
+import pytz
+
+from mylinky.enedis import Series
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+class TestSeries(unittest.TestCase):
+
+    def setUp(self):
+        self.tz = pytz.timezone("Europe/Paris")
+        self.start = self.tz.localize(datetime.datetime(2019, 11, 11))
+        self.series = Series(typed=True)
+        for i in range(48):
+            self.series.append(self.start + datetime.timedelta(minutes=30*i), 1800.0, float(i), "creuse" if i < 12 else "pleine")
+
+    def testRecord(self):
+        self.assertEqual(len(self.series), 48)
+        r = self.series[0]
+        self.assertEqual(r["date"], self.start)
+        self.assertEqual(r["duration"], 1800.0)
+        self.assertEqual(r["value"], 0.0)
+        self.assertEqual(r["type"], "creuse")
+        self.assertEqual(list(r.keys()), ["date", "duration", "value", "type"])
+        self.assertEqual(dict(self.series[-1])["type"], "pleine")
+        self.assertEqual(self.series[-1]["value"], 47.0)
+        with self.assertRaises(IndexError):
+            self.series[48]
+
+    def testUntyped(self):
+        s = Series.from_records([{"date": self.start, "duration": 86400, "value": 12.5}])
+        self.assertFalse(s.typed)
+        self.assertEqual(list(s[0].keys()), ["date", "duration", "value"])
+        self.assertEqual(list(s.rows()), [(self.start, 86400.0, 12.5)])
+
+    def testSlicing(self):
+        s = self.series[10:20]
+        self.assertEqual(len(s), 10)
+        self.assertEqual(s[0]["value"], 10.0)
+
+        s = self.series.between(self.start + datetime.timedelta(hours=1), self.start + datetime.timedelta(hours=2))
+        self.assertEqual([r["value"] for r in s], [2.0, 3.0])
+        self.assertEqual(len(self.series.between(end=self.start)), 0)
+
+    def testRows(self):
+        rows = list(self.series.rows())
+        self.assertEqual(rows[1], (self.start + datetime.timedelta(minutes=30), 1800.0, 1.0, "creuse"))
+
+    def testConcat(self):
+        s = Series.concat([self.series[24:], self.series[:30]])
+        self.assertEqual(s, self.series)
+
+        s = Series.concat([self.series[:24], self.series[24:]])
+        self.assertEqual(s, self.series)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import datetime
+import requests
+import responses
+import logging
+import tempfile
+import shutil
+import stat
+import time
+import os
+import pytz
+
+from mylinky.enedis import Enedis, SessionCache
+from mylinky.enedis.tests.enedis_test import hourly_callback
+from mylinky.tests.fleet_test import login_callback
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+class TestSession(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.tz = pytz.timezone("Europe/Paris")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def testPutGet(self):
+        c = SessionCache(self.path)
+        self.assertIsNone(c.get("testuser"))
+        c.put("testuser", [requests.cookies.create_cookie(domain="testme", name="iPlanetDirectoryPro", value="v1")])
+        cookies = c.get("testuser")
+        self.assertEqual([(k.name, k.value, k.domain) for k in cookies], [("iPlanetDirectoryPro", "v1", "testme")])
+        self.assertIsNone(c.get("otheruser"))
+
+        fname = c._fname("testuser")
+        self.assertFalse("testuser" in fname)
+        self.assertEqual(stat.S_IMODE(os.stat(fname).st_mode), 0o600)
+
+    def testDirectoryMode(self):
+        path = os.path.join(self.path, "sessions")
+        os.mkdir(path, 0o755)
+        os.chmod(path, 0o755)
+        SessionCache(path)
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o700)
+
+    def testExpired(self):
+        c = SessionCache(self.path, max_age=-1)
+        c.put("testuser", [requests.cookies.create_cookie(domain="testme", name="iPlanetDirectoryPro", value="v1")])
+        self.assertIsNone(c.get("testuser"))
+
+        c = SessionCache(self.path)
+        c.put("testuser", [requests.cookies.create_cookie(domain="testme", name="iPlanetDirectoryPro", value="v1", expires=int(time.time())-10)])
+        self.assertIsNone(c.get("testuser"))
+
+    @responses.activate
+    def testReuseAndRelogin(self):
+        logins = []
+        def counting_login(request):
+            logins.append(request)
+            return login_callback(request)
+
+        calls = []
+        def data_callback(request):
+            cookie = request._cookies.get("iPlanetDirectoryPro")
+            calls.append(cookie)
+            # the first session is refused by the server
+            if cookie == "cookie-testuser-old":
+                return (302, {"Location": "http://testme/login"}, "")
+            return hourly_callback(request)
+
+        responses.add_callback(responses.POST, "http://testme/login", callback=counting_login)
+        responses.add_callback(responses.POST, "http://testme/data", callback=data_callback)
+
+        sessions = SessionCache(self.path)
+        sessions.put("testuser", [requests.cookies.create_cookie(domain="testme", name="iPlanetDirectoryPro", value="cookie-testuser-old")])
+
+        e = Enedis(url="http://testme/login", url2="http://testme/data", sessions=sessions, workers=2)
+        e.login("testuser", "strongpassword")
+        self.assertEqual(len(logins), 0)
+
+        failures = []
+        data = e.getdata("hourly",
+            startDate=self.tz.localize(datetime.datetime(2019, 1, 1)),
+            endDate=self.tz.localize(datetime.datetime(2019, 1, 15)), failures=failures)
+        self.assertEqual(len(data), 14*48)
+        self.assertEqual(len(logins), 1)
+        self.assertEqual(failures, [])
+        self.assertEqual(sessions.get("testuser")[0].value, "cookie-testuser")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+import logging
+import datetime
+import pytz
+
+from mylinky.enedis.slots import SlotIndex, REGULAR
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+TZ = pytz.timezone("Europe/Paris")
+
+class TestSlotIndex(unittest.TestCase):
+
+    def testDays(self):
+        index = SlotIndex(TZ)
+        day = index.day(datetime.date(2019, 11, 11))
+        self.assertEqual((day.count, day.midnight), (48, int(TZ.localize(datetime.datetime(2019, 11, 11)).timestamp())))
+        self.assertIs(day.walls, REGULAR)
+        self.assertIs(index.day(datetime.date(2019, 11, 11)), day)
+
+        # DST starts: no 2:00-3:00
+        day = index.day(datetime.date(2019, 3, 31))
+        self.assertEqual(day.count, 46)
+        self.assertEqual(list(day.walls[:6]), [0, 1, 2, 3, 6, 7])
+        self.assertEqual(day.timestamp(4), int(TZ.localize(datetime.datetime(2019, 3, 31, 3)).timestamp()))
+
+        # DST ends: 2:00-3:00 twice
+        day = index.day(datetime.date(2019, 10, 27))
+        self.assertEqual(day.count, 50)
+        self.assertEqual(list(day.walls[:10]), [0, 1, 2, 3, 4, 5, 4, 5, 6, 7])
+        self.assertEqual(day.timestamp(6) - day.timestamp(4), 3600)
+
+    def testLocate(self):
+        index = SlotIndex(TZ)
+        (day, slot) = index.locate(datetime.date(2019, 3, 30), 48 + 46 + 3)
+        self.assertEqual((day.date, slot), (datetime.date(2019, 4, 1), 3))
+        (day, slot) = index.locate(datetime.date(2019, 3, 31), 45)
+        self.assertEqual((day.date, slot), (datetime.date(2019, 3, 31), 45))
+
+        walls = index.walls(datetime.date(2019, 3, 30), 48 + 46 + 2)
+        self.assertEqual(len(walls), 96)
+        self.assertEqual(list(walls[48:54]), [0, 1, 2, 3, 6, 7])
+        self.assertEqual(list(walls[-2:]), [0, 1])
+
+if __name__ == "__main__":
+    unittest.main()
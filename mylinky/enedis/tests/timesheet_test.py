@@ -0,0 +1,60 @@
+import unittest
+import datetime
+import logging
+import pytz
+
+from mylinky.enedis import Enedis, Series, Timesheet
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+def loop_type(timesheets, daytime):
+    for (stime, etime) in timesheets:
+        if stime<etime:
+            if daytime >= stime and daytime < etime:
+                return "creuse"
+        else:
+            if daytime >= stime or daytime < etime:
+                return "creuse"
+    return "pleine"
+
+class TestTimesheet(unittest.TestCase):
+
+    TIMESHEETS = [
+        [Enedis.parsetimesheet("00:00", "06:00")],
+        [Enedis.parsetimesheet("22:00", "06:30")],
+        [Enedis.parsetimesheet("01:30", "07:30"), Enedis.parsetimesheet("12:30", "14:30")],
+    ]
+
+    def testEmpty(self):
+        t = Timesheet()
+        self.assertFalse(t)
+        self.assertEqual(t.type(datetime.time(3, 0)), "normale")
+        self.assertEqual(list(t.classify_slots(range(48))), [Series.TYPE_CODES["normale"]]*48)
+
+    def testSameAsLoop(self):
+        for timesheets in TestTimesheet.TIMESHEETS:
+            t = Timesheet(timesheets)
+            types = t.classify_slots(range(Timesheet.SLOTS))
+            for minute in range(0, 24*60, 15):
+                daytime = datetime.time(minute // 60, minute % 60)
+                self.assertEqual(t.type(daytime), loop_type(timesheets, daytime), "%s %s" % (timesheets, daytime))
+                if minute % 30 == 0:
+                    self.assertEqual(Series.TYPES[types[minute // 30]], loop_type(timesheets, daytime))
+
+    def testClassifySeries(self):
+        tz = pytz.timezone("Europe/Paris")
+        # includes the switch to summer time
+        start = tz.localize(datetime.datetime(2019, 3, 30))
+        s = Series(typed=True)
+        for i in range(4*48):
+            s.append(int(start.timestamp()) + i*1800, 1800, 1.0, "normale")
+
+        timesheets = TestTimesheet.TIMESHEETS[1]
+        Timesheet(timesheets).classify(s)
+        for r in s:
+            self.assertEqual(r["type"], loop_type(timesheets, r["date"].time()), r["date"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import datetime
+import threading
+import logging
+import types
+import pytz
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from mylinky.enedis import Enedis, Transport
+from mylinky.enedis.tests.enedis_test import hourly_callback
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+class EnedisHandler(BaseHTTPRequestHandler):
+    # keep-alive
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+        headers = {}
+        if self.path.startswith("/login"):
+            (status, text) = (302, "")
+            headers["Set-Cookie"] = "iPlanetDirectoryPro=cookie-testuser; Path=/"
+        else:
+            (status, _, text) = hourly_callback(types.SimpleNamespace(body=body))
+        text = text.encode()
+
+        self.send_response(status)
+        for (k, v) in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(text)))
+        self.end_headers()
+        self.wfile.write(text)
+
+    def log_message(self, *args):
+        pass
+
+class TestTransport(unittest.TestCase):
+
+    def setUp(self):
+        self.tz = pytz.timezone("Europe/Paris")
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), EnedisHandler)
+        self.url = "http://127.0.0.1:%d" % self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def getdata(self, transport):
+        e = Enedis(url=self.url+"/login", url2=self.url+"/data", workers=1, transport=transport)
+        e.login("testuser", "strongpassword")
+        for month in (1, 2):
+            data = e.getdata("hourly",
+                startDate=self.tz.localize(datetime.datetime(2019, month, 1)),
+                endDate=self.tz.localize(datetime.datetime(2019, month, 15)))
+            self.assertEqual(len(data), 14*48)
+        return e
+
+    def testReuse(self):
+        # login + 2 calls of 2 windows, on a single connection
+        e = self.getdata(Transport(pool_size=2))
+        self.assertEqual(e.transport.stats(), {"requests": 5, "connections": 1, "reused": 4})
+
+    def testNoKeepalive(self):
+        e = self.getdata(Transport(keepalive=False))
+        self.assertEqual(e.transport.stats(), {"requests": 5, "connections": 5, "reused": 0})
+
+    def testTimeout(self):
+        t = Transport(timeout=0.5)
+        self.assertEqual(t.timeout, 0.5)
+        self.assertEqual(t.get_adapter("https://testme/").poolmanager.connection_pool_kw["maxsize"], 10)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import datetime
+
+from array import array
+
+from .series import Series
+
+NORMALE = Series.TYPE_CODES["normale"]
+CREUSE = Series.TYPE_CODES["creuse"]
+PLEINE = Series.TYPE_CODES["pleine"]
+
+class Timesheet:
+    """HP/HC timesheets compiled in lookup tables
+
+    The (start, end) timesheets are compiled once in a minute-of-day table,
+    and in a half-hour slot table usable with bytes.translate() to classify
+    a whole series in one pass.
+    """
+    MINUTES = 24*60
+    SLOT = 30
+    SLOTS = MINUTES // SLOT
+
+    def __init__(self, timesheets=None):
+        if isinstance(timesheets, Timesheet):
+            timesheets = timesheets.timesheets
+        self.timesheets = timesheets
+        self.minutes = Timesheet.compile(timesheets)
+
+        slots = bytes(self.minutes[i*Timesheet.SLOT] for i in range(Timesheet.SLOTS))
+        # translate() needs a 256 bytes table
+        self.slots = slots + bytes(256 - len(slots))
+
+    @classmethod
+    def compile(cls, timesheets):
+        if timesheets is None:
+            return bytes([NORMALE]) * cls.MINUTES
+
+        table = bytearray([PLEINE]) * cls.MINUTES
+        for (stime, etime) in timesheets:
+            start = stime.hour*60 + stime.minute
+            end = etime.hour*60 + etime.minute
+            if start < end:
+                # not crossing a day, e.g.: 00:00 --> 06:00
+                table[start:end] = bytes([CREUSE]) * (end-start)
+            else:
+                # crossing a day, e.g.: 22:00 --> 06:30
+                table[start:] = bytes([CREUSE]) * (cls.MINUTES-start)
+                table[:end] = bytes([CREUSE]) * end
+        return bytes(table)
+
+    def __bool__(self):
+        return self.timesheets is not None
+
+    def code(self, daytime):
+        # works with both time and datetime objects
+        return self.minutes[daytime.hour*60 + daytime.minute]
+
+    def type(self, daytime):
+        return Series.TYPES[self.code(daytime)]
+
+    def classify_slots(self, slots):
+        """tariff codes of a sequence of half-hour slots of the day (0-47)"""
+        return array('b', bytes(slots).translate(self.slots))
+
+    def classify(self, series):
+        """(re)compute the tariff codes of a whole series, in place"""
+        slots = bytearray(len(series))
+        tz = series.tz
+        offsets = {}
+        for (i, ts) in enumerate(series.dates):
+            # utc offsets only change on hour boundaries
+            hour = ts // 3600
+            offset = offsets.get(hour)
+            if offset is None:
+                offset = int(datetime.datetime.fromtimestamp(ts, tz=tz).utcoffset().total_seconds())
+                offsets[hour] = offset
+            slots[i] = ((ts + offset) // (Timesheet.SLOT*60)) % Timesheet.SLOTS
+        series.types = self.classify_slots(slots)
+        series.typed = True
+        return series
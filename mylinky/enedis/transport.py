@@ -0,0 +1,68 @@
+import logging
+import threading
+import requests
+
+from requests.adapters import HTTPAdapter
+
+log = logging.getLogger("enedis-transport")
+
+def _counting_pool(cls, transport):
+    # the connections of a pool are connected again after being closed (no keep-alive)
+    class CountingConnection(cls.ConnectionCls):
+        def connect(self):
+            transport._count("connections")
+            return super().connect()
+
+    class CountingPool(cls):
+        ConnectionCls = CountingConnection
+
+    CountingPool.__name__ = "Counting%s" % cls.__name__
+    return CountingPool
+
+class _CountingAdapter(HTTPAdapter):
+    def __init__(self, transport, **kwargs):
+        # init_poolmanager() is called by HTTPAdapter.__init__
+        self._transport = transport
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: _counting_pool(cls, self._transport) for (scheme, cls) in self.poolmanager.pool_classes_by_scheme.items()
+        }
+
+class Transport(requests.Session):
+    """HTTP session shared by Login and Data
+
+    Keeps a pool of up to 'pool_size' connections per host, applies a default
+    timeout to every request, and counts the requests and the connections
+    opened (the other requests reused a pooled connection).
+    """
+
+    def __init__(self, pool_size=10, keepalive=True, timeout=30):
+        super().__init__()
+        self.timeout = timeout
+        self.counters = {"requests": 0, "connections": 0}
+        self._lock = threading.Lock()
+
+        for prefix in ("http://", "https://"):
+            self.mount(prefix, _CountingAdapter(self, pool_connections=pool_size, pool_maxsize=pool_size))
+        if not keepalive:
+            self.headers["Connection"] = "close"
+        self.headers.update({'User-agent': "mylinky"})
+
+    def _count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        self._count("requests")
+        return super().request(method, url, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats["reused"] = max(0, stats["requests"] - stats["connections"])
+        return stats
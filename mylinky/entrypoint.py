@@ -1,6 +1,7 @@
+import io
+import copy
 import json
 import logging
-import boto3
 import os
 import tempfile
 import datetime
@@ -8,7 +9,12 @@ import pytz
 
 from mylinky import MyLinkyConfig
 from mylinky.datedelta import datedelta
-from mylinky.enedis import Enedis
+from mylinky.enedis import Enedis, ResponseCache, SessionCache, Series, Transport, LoginException
+from mylinky.enedis import RetryPolicy, Backoff, CircuitBreaker, AdaptiveLimiter
+from mylinky.metrics import Metrics
+from mylinky.holes import IntervalSet, Backfill
+from mylinky.store import StateStore, S3Backend, FileBackend, PreconditionFailed
+from mylinky.warm import WarmCache
 
 from base64 import b64decode
 
@@ -18,41 +24,150 @@ log = logging.getLogger()
 log.setLevel(logging.DEBUG)
 
 BUCKET = "mylinky"
-PASSWORD_TYPE = os.environ["PASSWORD_TYPE"] if "PASSWORD_TYPE" in os.environ else "kms"
-ENEDIS_USERNAME = os.environ["ENEDIS_USERNAME"] if "ENEDIS_USENAME" in os.environ else None
-ENEDIS_PASSWORD = os.environ["ENEDIS_PASSWORD"] if "ENEDIS_PASSWORD" in os.environ else None
+
+# kept across the warm invocations of the lambda
+STORE = None
+WARM = WarmCache()
+
+# decrypted credentials are kept at most this long (seconds)
+CREDENTIALS_TTL = 3600
+
+def get_store():
+    """State store of the bucket (or of the STORE_PATH local directory, for tests)"""
+    global STORE
+    if STORE is None:
+        if "STORE_PATH" in os.environ:
+            STORE = StateStore(FileBackend(os.environ["STORE_PATH"]))
+        else:
+            STORE = StateStore(S3Backend(BUCKET))
+    return STORE
 
 def json_converter(o):
     if isinstance(o, datetime.datetime):
         return o.isoformat()
+    if isinstance(o, Series):
+        return [dict(zip(o.fields(), row)) for row in o.rows()]
+
+def kms_client():
+    # boto3 takes a while to import: only done when needed
+    import boto3
+    return boto3.client("kms")
+
+def get_credentials(store, password_type):
+    if password_type == "kms":
+        blobs = (os.environ["ENEDIS_USERNAME"], os.environ["ENEDIS_PASSWORD"])
+        def decrypt():
+            kms = WARM.get("kms", kms_client)
+            return tuple(kms.decrypt(CiphertextBlob=b64decode(blob))['Plaintext'].decode() for blob in blobs)
+        # decrypted again if the encrypted values change
+        return WARM.get("credentials", decrypt, ttl=CREDENTIALS_TTL, fingerprint=(password_type, blobs))
+    elif password_type == "s3:clear":
+        body = store.get("creds.json")
+        def parse():
+            creds = json.loads(body)
+            return (creds["username"], creds["password"])
+        return WARM.get("credentials", parse, ttl=CREDENTIALS_TTL, fingerprint=(password_type, body))
+    raise ValueError("unknown PASSWORD_TYPE %s" % password_type)
+
+def get_config(store):
+    """Parsed config.yml (a copy: the invocation adds its event and credentials)"""
+    body = store.get("config.yml")
+    def parse():
+        config = MyLinkyConfig()
+        if body is not None:
+            try:
+                config.load_from_fileobj(io.BytesIO(body))
+            except Exception as e:
+                log.info("running with empty config, because of error: %s" % e)
+        return config
+    return copy.deepcopy(WARM.get("config", parse, fingerprint=body))
+
+def get_enedis(config, metrics_enabled):
+    """Logged-in Enedis (with its warm connections), until the session gets too old"""
+    def login():
+        # /tmp is kept between warm invocations of the lambda
+        cache = ResponseCache(config["cache"]["path"] or os.path.join(tempfile.gettempdir(), "mylinky-cache"),
+            max_size=config["cache"]["max-size"], ttl=config["cache"]["ttl"])
+
+        sessions = SessionCache(config["enedis"]["session-cache"] or os.path.join(tempfile.gettempdir(), "mylinky-sessions"),
+            max_age=config["enedis"]["session-max-age"])
+
+        transport = Transport(pool_size=config["http"]["pool-size"], keepalive=config["http"]["keepalive"], timeout=config["http"]["timeout"])
+        retry = RetryPolicy(retries=config["retry"]["retries"], metrics=Metrics(enabled=metrics_enabled),
+            backoff=Backoff(config["retry"]["backoff"], config["retry"]["max-backoff"]),
+            breaker=CircuitBreaker(config["retry"]["failure-threshold"], config["retry"]["reset-timeout"]),
+            limiter=AdaptiveLimiter(config["retry"]["concurrency"], maximum=config["retry"]["max-concurrency"], latency=config["retry"]["latency-target"]))
+        enedis = Enedis(timesheets=config["enedis"]["timesheets"], cache=cache, sessions=sessions, transport=transport, retry=retry,
+            stream_decode=config["http"]["stream"])
+        enedis.login(config["enedis"]["username"], config["enedis"]["password"])
+        return enedis
+
+    # built again when the configuration (or the credentials) change
+    fingerprint = (json.dumps(config.data, sort_keys=True, default=str), metrics_enabled)
+    enedis = WARM.get("enedis", login, ttl=config["enedis"]["session-max-age"], fingerprint=fingerprint)
+    enedis.metrics.reset()
+    return enedis
+
+def get_archiver(store, config, resource):
+    """Function writing a window of data to the bucket
+
+    As one JSON object per window ('<resource>/<name>.json'), or as columnar
+    files partitioned by year and month (archive format 'parquet' or 'arrow').
+    """
+    fmt = config["archive"]["format"]
+    if fmt == "json":
+        def archive(name, data):
+            store.backend.put("%s/%s.json" % (resource, name), json.dumps(data, default=json_converter).encode("utf-8"))
+        return archive
+
+    from mylinky.exporter import ParquetExporter
+    exporter = ParquetExporter(format=fmt, compression=config["archive"]["compression"], put=store.backend.put)
+    return lambda name, data: exporter.save_batch(resource, data)
+
+def backfill(enedis, holes, resource, now, store, config, context):
+    """Fill the most recent holes, until the lambda is about to time out"""
+    metrics = enedis.metrics
+    archive = get_archiver(store, config, resource)
+    def export(window, data):
+        with metrics.timer("export"):
+            archive("backfill-%s-%s" % (window[0].strftime("%Y-%m-%d"), window[1].strftime("%Y-%m-%d")), data)
+        metrics.incr("exported", len(data))
+
+    remaining = (lambda: context.get_remaining_time_in_millis() / 1000) if context is not None else None
+    return Backfill(enedis, holes, export, kind=resource, workers=config["backfill"]["workers"], margin=config["backfill"]["margin"],
+        retention=datedelta(days=config["backfill"]["retention-days"])).run(now, remaining)
+
+def save_holes(store, holes, attempts=2):
+    """Write holes.json, merged with the holes saved meanwhile by another invocation"""
+    for attempt in range(attempts):
+        try:
+            store.put_json("holes.json", holes.to_json(), default=json_converter)
+            return True
+        except PreconditionFailed:
+            log.info("holes.json was updated by another invocation, merged")
+            store.load(["holes.json"])
+            for (start, end) in IntervalSet.from_json(store.get_json("holes.json", [])):
+                holes.add(start, end)
+    return False
 
 def run(events, context):
     response = []
 
-    s3 = boto3.resource("s3")
     log.setLevel(logging.getLevelName(events["log"] if "log" in events else "INFO"))
 
     resource = events["resource"] if "resource" in events else "hourly"
-    if PASSWORD_TYPE == "kms":
-        username = boto3.client('kms').decrypt(CiphertextBlob=b64decode(ENEDIS_USERNAME))['Plaintext'].decode()
-        password = boto3.client('kms').decrypt(CiphertextBlob=b64decode(ENEDIS_PASSWORD))['Plaintext'].decode()
-    elif PASSWORD_TYPE == "s3:clear":
-        with tempfile.TemporaryFile() as f:
-            s3.Bucket(BUCKET).download_fileobj(Key="creds.json", Fileobj=f)
-            f.seek(0)
-            creds = json.load(f)
-            username = creds["username"]
-            password = creds["password"]
-
-    # Load the state from s3
-    state = {}
-    try:
-        with tempfile.TemporaryFile() as f:
-            s3.Bucket(BUCKET).download_fileobj(Key="state.json", Fileobj=f)
-            f.seek(0)
-            state = json.load(f)
-    except Exception as e:
-        log.info("running with empty sate, because of error: %s" % e)
+    password_type = os.environ.get("PASSWORD_TYPE", "kms")
+
+    # all the small objects at once, only downloaded again when they changed
+    store = get_store()
+    keys = ["state.json", "holes.json", "config.yml"]
+    if password_type == "s3:clear":
+        keys.append("creds.json")
+    store.load(keys)
+
+    (username, password) = get_credentials(store, password_type)
+
+    state = store.get_json("state.json", {})
     if resource not in state:
         state[resource] = {}
 
@@ -60,35 +175,28 @@ def run(events, context):
         state.update(events["state"])
     log.info("State: %s" % state)
 
-    # Load holes from s3
-    holes = []
-    try:
-        with tempfile.TemporaryFile() as f:
-            s3.Bucket(BUCKET).download_fileobj(Key="holes.json", Fileobj=f)
-            f.seek(0)
-            holes = json.load(f)
-    except Exception as e:
-        log.info("running with empty holes, because of error: %s" % e)
+    # merged intervals of the missing data
+    holes = IntervalSet.from_json(store.get_json("holes.json", []))
 
     # Load configuration
-    config = MyLinkyConfig()
-    try:
-        with tempfile.TemporaryFile() as f:
-            s3.Bucket(BUCKET).download_fileobj(Key="config.yml", Fileobj=f)
-            f.seek(0)
-            config.load_from_fileobj(f)
-    except Exception as e:
-        log.info("running with empty config, because of error: %s" % e)
-
+    config = get_config(store)
     config.load_from_dict(events)
     config.override_from_args({"username": username, "password": password})
     log.info("Configuration: %s" % config.data)
 
-    enedis = Enedis(timesheets=config["enedis"]["timesheets"])
-    enedis.login(config["enedis"]["username"], config["enedis"]["password"])
+    # {"profile": true} adds the timings and counters to the response, {"metrics-file": key} writes them to s3
+    try:
+        enedis = get_enedis(config, bool(events.get("profile")) or "metrics-file" in events)
+    except LoginException:
+        # the credentials may have changed
+        WARM.invalidate("credentials")
+        raise
+    metrics = enedis.metrics
+    transport = enedis.transport
 
-    startDate = datetime.datetime.strptime(state[resource]["last"], "%d/%m/%Y").replace(tzinfo=pytz.timezone("Europe/Paris"))+datedelta(days=1) if "last" in state[resource] else None
-    endDate = datetime.datetime.now().replace(hour=0,minute=0,second=0,microsecond=0,tzinfo=pytz.timezone("Europe/Paris"))
+    tz = pytz.timezone("Europe/Paris")
+    startDate = tz.localize(datetime.datetime.strptime(state[resource]["last"], "%d/%m/%Y"))+datedelta(days=1) if "last" in state[resource] else None
+    endDate = tz.localize(datetime.datetime.now(tz=tz).replace(hour=0,minute=0,second=0,microsecond=0,tzinfo=None))
     if startDate is None:
         # Max retention in ENEDIS is 1 year
         startDate = endDate - datedelta(years=1)
@@ -98,26 +206,77 @@ def run(events, context):
         })
         return response
     
-    data = enedis.getdata(resource, startDate=startDate, endDate=endDate)
+    # stream the data, one window at a time, to keep the memory usage flat
+    archive = get_archiver(store, config, resource)
+    items = 0
+    firstDate = None
+    lastDate = None
+    # windows failing after their retries, left to the backfill
+    failures = []
+    try:
+        for (n, data) in enumerate(enedis.getdata(resource, startDate=startDate, endDate=endDate, stream=True, failures=failures)):
+            if len(data)==0:
+                continue
+            if firstDate is None:
+                firstDate = data[0]["date"]
+            lastDate = data[-1]["date"]
+            items += len(data)
 
-    if len(data)==0:
+            name = endDate.strftime("%Y-%m-%d") if n==0 else "%s-%03d" % (endDate.strftime("%Y-%m-%d"), n)
+            with metrics.timer("export"):
+                archive(name, data)
+            metrics.incr("exported", len(data))
+    except Exception:
+        # do not reuse a client whose session or connections may be broken
+        WARM.invalidate("enedis")
+        raise
+
+    if items==0:
         log.info("Empty data")
     else:
-        if startDate < data[0]["date"]:
-            holes.append({"start": startDate, "end": data[0]["date"]})
-            s3.Bucket(BUCKET).put_object(Key="holes.json", Body=json.dumps(holes, default=json_converter).encode("utf-8"))
-
-        s3.Bucket(BUCKET).put_object(Key="%s/%s.json" % (resource, endDate.strftime("%Y-%m-%d")), Body=json.dumps(data, default=json_converter).encode("utf-8"))
+        if startDate < firstDate:
+            holes.add(startDate, firstDate)
 
         # Save the state
-        lastDate = data[-1]["date"]
         state[resource]["last"] = lastDate.strftime("%d/%m/%Y")
-        s3.Bucket(BUCKET).put_object(Key="state.json", Body=json.dumps(state).encode("utf-8"))
+    for (start, end) in failures:
+        log.error("window %s - %s failed, added to the holes" % (start, end))
+        holes.add(start, end)
+    if failures and items == 0:
+        WARM.invalidate("enedis")
+
+    # {"backfill": false} skips the filling of the holes with the time left
+    filled = None
+    if events.get("backfill", True) and len(holes):
+        filled = backfill(enedis, holes, resource, endDate, store, config, context)
+
+    # only the changed objects are written, and not over a concurrent update: the
+    # state only moves past the holes of this run once they are saved
+    if save_holes(store, holes):
+        try:
+            store.put_json("state.json", state, default=json_converter)
+        except PreconditionFailed:
+            log.error("state.json was updated by another invocation, not saved")
+            response.append({'error': "concurrent update of state.json"})
+    else:
+        log.error("holes.json was updated by another invocation, the state is not saved")
+        response.append({'error': "concurrent update of holes.json"})
 
+    for (k, v) in transport.stats().items():
+        metrics.gauge("http_%s" % k, v)
+    if "metrics-file" in events:
+        fmt = "prometheus" if events["metrics-file"].endswith(".prom") else "json"
+        store.backend.put(events["metrics-file"], metrics.report(fmt).encode("utf-8"))
     response.append({
         'startDate': str(startDate),
         'endDate': str(endDate),
-        'items': len(data)
+        'items': items
     })
+    if failures:
+        response.append({'failed': [(str(start), str(end)) for (start, end) in failures]})
+    if filled is not None:
+        response.append({'backfill': filled})
+    if events.get("profile"):
+        response.append({'metrics': metrics.snapshot()})
 
     return response
\ No newline at end of file
@@ -1,3 +1,19 @@
+from .exporter import Exporter
 
-from .influxdb import InfluxdbExporter
-from .csv import CsvExporter
\ No newline at end of file
+# the exporters (and their dependencies) are only imported when used
+_EXPORTERS = {
+    "StdoutExporter": ".stdout",
+    "InfluxdbExporter": ".influxdb",
+    "CsvExporter": ".csv",
+    "ParquetExporter": ".parquet",
+    "SqliteExporter": ".sqlite",
+    "CostExporter": ".cost",
+}
+
+__all__ = ["Exporter"] + list(_EXPORTERS.keys())
+
+def __getattr__(name):
+    if name not in _EXPORTERS:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    import importlib
+    return getattr(importlib.import_module(_EXPORTERS[name], __name__), name)
@@ -0,0 +1,36 @@
+import sys
+import json
+
+from mylinky.enedis import Series
+from mylinky.exporter.exporter import Exporter
+from mylinky.pricing import Pricing, TariffHistory
+
+class CostExporter(Exporter):
+    """Prints the cost of the readings with each tariff history, cheapest first"""
+
+    def __init__(self, histories, colours=None, stream=None):
+        self.histories = histories
+        self.colours = colours
+        self.stream = stream if stream is not None else sys.stdout
+
+    @classmethod
+    def from_config(cls, pricing, stream=None):
+        """From the 'pricing' section: a list of {name, tariffs} and a JSON file of the Tempo colours"""
+        if not pricing["tariffs"]:
+            raise ValueError("no tariffs in the configuration")
+        histories = {t["name"]: TariffHistory.from_list(t["tariffs"], name=t["name"]) for t in pricing["tariffs"]}
+        colours = None
+        if pricing["colours"]:
+            with open(pricing["colours"]) as f:
+                colours = json.load(f)
+        return cls(histories, colours=colours, stream=stream)
+
+    def save_data(self, serie, data, batchid=0, meter=None):
+        series = Series.concat(list(self.batches(data)))
+        with self.metrics.timer("export"):
+            costs = Pricing(series, colours=self.colours).compare(self.histories)
+        for (name, cost) in costs.items():
+            print("%s%-24s %10.2f kWh %10.2f (energy: %.2f, subscription: %.2f)" % ("%s " % meter if meter is not None else "",
+                name, sum(cost.energy), cost.total, sum(cost.cost), cost.subscription), file=self.stream)
+        self.metrics.incr("exported", len(series))
+        return len(series)
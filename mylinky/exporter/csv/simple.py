@@ -1,14 +1,154 @@
+import io
+import os
+import re
 import csv
+import glob
+import gzip
+import datetime
+import collections
 
-class CsvExporter:
-    def __init__(self, fname, mode):
+from mylinky.exporter.exporter import Exporter
+
+class CsvExporter(Exporter):
+    """Readings written as CSV rows, streamed one batch at a time
+
+    With mode 'a', the rows are appended, and the header is only written at
+    the beginning of a new (or empty) file. With mode 'w', the files are
+    overwritten the first time they are written by the exporter, and appended
+    to afterwards. A 'meter' column is added for the readings of a meter.
+
+    The files are compressed when their name ends with '.gz' (gzip) or '.zst'
+    (zstd, needs the zstandard package), or with 'compression'. With 'rotate',
+    there is one file per month: 'fname' is a strftime template, formatted with
+    the (local) date of the readings, e.g. 'linky-%Y-%m.csv.gz'.
+    """
+
+    COMPRESSIONS = {
+        ".gz": "gzip",
+        ".zst": "zstd",
+    }
+
+    def __init__(self, fname, mode="w", rotate=False, compression=None):
+        if compression is not None and compression not in CsvExporter.COMPRESSIONS.values():
+            raise ValueError("invalid compression '%s' (%s)" % (compression, ", ".join(CsvExporter.COMPRESSIONS.values())))
         self.fname = fname
         self.mode = mode
+        self.rotate = rotate
+        self.compression = compression
+        # files already written (appended to, even with mode 'w')
+        self._written = set()
+
+    def _compression(self, fname):
+        if self.compression is not None:
+            return self.compression
+        return CsvExporter.COMPRESSIONS.get(os.path.splitext(fname)[1])
+
+    def open(self, fname, mode="r"):
+        """Text file object of 'fname' ('r', 'w' or 'a'), compressed or not"""
+        compression = self._compression(fname)
+        if compression == "gzip":
+            # (appended gzip members are read back as one stream)
+            return gzip.open(fname, mode + "t", compresslevel=6, encoding="utf-8", newline="")
+        if compression == "zstd":
+            import zstandard
+            raw = open(fname, mode + "b")
+            if mode == "r":
+                stream = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+            else:
+                stream = zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+            return io.TextIOWrapper(stream, encoding="utf-8", newline="")
+        return open(fname, mode, encoding="utf-8", newline="")
+
+    def files(self, batch):
+        """(file name, part of the batch) to write"""
+        if not self.rotate:
+            yield (self.fname, batch)
+            return
+        for (_, part) in self.months(batch):
+            yield (part.date(0).strftime(self.fname), part)
+
+    def _start(self, fname, fields):
+        mode = "a" if fname in self._written else self.mode
+        new = mode == "w" or not os.path.exists(fname) or os.path.getsize(fname) == 0
+        f = self.open(fname, mode)
+        writer = csv.writer(f)
+        if new:
+            writer.writerow(fields)
+        self._written.add(fname)
+        return (fname, f, writer)
+
+    def save_data(self, serie, data, batchid=0, meter=None):
+        count = 0
+        # (file name, file object, writer) of the file being written
+        current = None
+        try:
+            for batch in self.batches(data):
+                with self.metrics.timer("export"):
+                    fields = batch.fields() if meter is None else ("meter",) + batch.fields()
+                    for (fname, part) in self.files(batch):
+                        if current is None or current[0] != fname:
+                            if current is not None:
+                                current[1].close()
+                            current = self._start(fname, fields)
+                        rows = part.rows()
+                        if meter is not None:
+                            rows = ((meter,) + row for row in rows)
+                        current[2].writerows(rows)
+                count += len(batch)
+        finally:
+            if current is not None:
+                current[1].close()
+        self.metrics.incr("exported", count)
+        return count
+
+    def _files(self):
+        """Existing files, the last one first"""
+        if not self.rotate:
+            return [self.fname] if os.path.exists(self.fname) else []
+        # the names sort as the dates, for a template like '%Y-%m'
+        return sorted(glob.glob(re.sub("%[a-zA-Z]", "*", glob.escape(self.fname))), reverse=True)
+
+    def _tail(self, fname):
+        if self._compression(fname) is not None:
+            # decompressed up to the end
+            with self.open(fname) as f:
+                return list(collections.deque(f, maxlen=2))
+        with open(fname, "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(0, size - 4096))
+            return f.read().decode("utf-8", errors="replace").splitlines()
+
+    @classmethod
+    def _date(cls, row, meter):
+        if not row:
+            return None
+        if meter is not None:
+            # only the rows of the meter, after their meter column
+            fields = row[1:2] if row[0] == meter else []
+        else:
+            # with or without the meter column
+            fields = row[:2]
+        for field in fields:
+            try:
+                return datetime.datetime.fromisoformat(field)
+            except ValueError:
+                continue
+        return None
 
-    def save_data(self, serie, data, batchid=0):
-        with open(self.fname, 'w', newline='') as csvfile:
-            fieldnames = data[0].keys()
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(data)
-        return True
+    def last_timestamp(self, serie, meter=None):
+        """Date of the last row (of 'meter') of the last file that has one"""
+        for fname in self._files():
+            for line in reversed(self._tail(fname)):
+                date = CsvExporter._date(next(csv.reader([line]), None), meter)
+                if date is not None:
+                    return date
+            if meter is None:
+                return None
+            # the last rows are of other meters: the whole file is read
+            last = None
+            with self.open(fname) as f:
+                for row in csv.reader(f):
+                    last = CsvExporter._date(row, meter) or last
+            if last is not None:
+                return last
+        return None
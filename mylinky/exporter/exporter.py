@@ -0,0 +1,67 @@
+import bisect
+
+from mylinky.datedelta import datedelta
+from mylinky.enedis import Series
+from mylinky.metrics import Metrics
+
+class Exporter:
+    # records given one by one are grouped in series of this size
+    BATCH_SIZE = 5000
+
+    # replaced by the metrics of the run, when profiling
+    metrics = Metrics(enabled=False)
+
+    @classmethod
+    def batches(cls, data):
+        """Split any exporter input in Series batches
+
+        'data' can be a Series, or any iterable (list, generator, ...) of Series
+        and/or records, consumed as the items arrive.
+        """
+        if isinstance(data, Series):
+            yield data
+            return
+
+        records = []
+        for item in data:
+            if isinstance(item, Series):
+                if records:
+                    yield Series.from_records(records)
+                    records = []
+                yield item
+                continue
+            records.append(item)
+            if len(records) >= cls.BATCH_SIZE:
+                yield Series.from_records(records)
+                records = []
+        if records:
+            yield Series.from_records(records)
+
+    @classmethod
+    def months(cls, batch):
+        """Split a batch (sorted by date) in ((year, month), Series), in the timezone of the batch"""
+        i = 0
+        while i < len(batch):
+            first = batch.date(i)
+            end = first.replace(day=1, hour=0, minute=0, second=0, microsecond=0) + datedelta(months=1)
+            j = bisect.bisect_left(batch.dates, int(end.timestamp()), i)
+            yield ((first.year, first.month), batch[i:j])
+            i = j
+
+    def last_timestamp(self, serie, meter=None):
+        """Date of the last reading exported for 'serie' (and 'meter'), None if unknown
+
+        The high-water mark of the incremental mode, which only fetches what follows.
+        """
+        return None
+
+    def save_batch(self, serie, batch, batchid=0, meter=None):
+        raise NotImplementedError()
+
+    def save_data(self, serie, data, batchid=0, meter=None):
+        count = 0
+        for batch in self.batches(data):
+            with self.metrics.timer("export"):
+                count += self.save_batch(serie, batch, batchid, meter)
+        self.metrics.incr("exported", count)
+        return count
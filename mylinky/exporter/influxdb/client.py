@@ -1,32 +1,85 @@
-from influxdb import InfluxDBClient
+import datetime
+import itertools
+
+from mylinky.enedis import Series
+from mylinky.exporter.exporter import Exporter
+
+def escape_key(s):
+    return str(s).replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+def escape_measurement(s):
+    return str(s).replace(",", "\\,").replace(" ", "\\ ")
+
+class InfluxdbExporter(Exporter):
+    # multiplier from epoch seconds, for each write precision
+    PRECISIONS = {
+        "s": 1,
+        "ms": 1000,
+        "u": 1000000,
+        "n": 1000000000,
+    }
+
+    # keep UDP datagrams well below the usual MTU/64KB limits
+    UDP_BATCH_SIZE = 100
+
+    def __init__(self, batch_size=5000, precision="s", gzip=False, udp=False, udp_port=4444, **kwargs):
+        if precision not in InfluxdbExporter.PRECISIONS:
+            raise ValueError("invalid precision '%s' (%s)" % (precision, ", ".join(InfluxdbExporter.PRECISIONS.keys())))
 
-class InfluxdbExporter:
-    def __init__(self, **kwargs):
         self.prefix = kwargs["prefix"]
         del kwargs["prefix"]
-        self.client = InfluxDBClient(**kwargs)
+        self.database = kwargs.get("database")
+        self.batch_size = batch_size
+        self.precision = precision
+        self.udp = udp
+        # influxdb (and its dependencies) is only loaded when exporting to it
+        from influxdb import InfluxDBClient
+        self.client = InfluxDBClient(gzip=gzip, use_udp=udp, udp_port=udp_port, **kwargs)
 
     def connect(self):
         pass
 
-    def save_data(self, serie, data, batchid=0):
-        d = []
-        for item in data:
-            tags = {
-                "batchid" : batchid
-            }
-            if "type" in item:
-                tags["type"] = item["type"]
-
-            d.append({
-                "measurement": "%s%s"% (self.prefix, serie),
-                "tags": tags,
-                "time": item['date'].strftime('%Y-%m-%dT%H:%M:%SZ'),
-                "fields": {
-                    "value": (item['value']*1000),
-                    "duration": item['duration']
-                }
-            })
-
-        self.client.write_points(d)
-        return len(d)
\ No newline at end of file
+    def lines(self, serie, data, batchid=0, meter=None):
+        """InfluxDB line protocol for each reading"""
+        measurement = escape_measurement("%s%s" % (self.prefix, serie))
+        # the UDP listener has no precision parameter: nanoseconds (its default setting)
+        multiplier = InfluxdbExporter.PRECISIONS["n" if self.udp else self.precision]
+
+        head = "%s,batchid=%s" % (measurement, escape_key(batchid))
+        if meter is not None:
+            head += ",meter=%s" % escape_key(meter)
+        if data.typed:
+            heads = ["%s,type=%s" % (head, escape_key(t)) for t in Series.TYPES]
+            for (date, duration, value, t) in zip(data.dates, data.durations, data.values, data.types):
+                yield "%s value=%r,duration=%r %d" % (heads[t], value*1000, duration, date*multiplier)
+        else:
+            for (date, duration, value) in zip(data.dates, data.durations, data.values):
+                yield "%s value=%r,duration=%r %d" % (head, value*1000, duration, date*multiplier)
+
+    def last_timestamp(self, serie, meter=None):
+        query = 'SELECT last("value") FROM "%s"' % ("%s%s" % (self.prefix, serie)).replace('"', '\\"')
+        if meter is not None:
+            query += " WHERE \"meter\" = '%s'" % str(meter).replace("'", "\\'")
+        points = list(self.client.query(query, database=self.database, epoch="s").get_points())
+        if not points:
+            return None
+        return datetime.datetime.fromtimestamp(points[0]["time"], tz=Series.TZ)
+
+    def _send(self, lines):
+        if self.udp:
+            # fire-and-forget
+            self.client.send_packet(lines, protocol='line')
+        else:
+            self.client.write(lines, params={'db': self.database, 'precision': self.precision}, protocol='line')
+
+    def save_batch(self, serie, data, batchid=0, meter=None):
+        count = 0
+        size = InfluxdbExporter.UDP_BATCH_SIZE if self.udp else self.batch_size
+        lines = self.lines(serie, data, batchid, meter)
+        while True:
+            batch = list(itertools.islice(lines, size))
+            if not batch:
+                break
+            self._send(batch)
+            count += len(batch)
+        return count
@@ -0,0 +1,96 @@
+import os
+import tempfile
+
+from mylinky.enedis import Series
+from mylinky.exporter.exporter import Exporter
+
+class LocalWriter:
+    """Writes the files under a local directory (atomically)"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, key, body):
+        fname = os.path.join(self.path, key)
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+        (fd, tmpname) = tempfile.mkstemp(dir=os.path.dirname(fname), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+        os.replace(tmpname, fname)
+
+class ParquetExporter(Exporter):
+    """Compressed columnar files, partitioned by serie, year and month
+
+    The files are laid out as '<serie>/year=YYYY/month=MM/<meter>-<first reading>.parquet'
+    (Hive partitioning, understood by Athena, Spark, DuckDB, pyarrow.dataset, ...):
+    one file per batch and month. Exporting a batch starting at the same reading
+    again replaces its file, but the batches overlapping it from another start
+    (a backfilled window, a longer range) add files with the same readings: the
+    queries deduplicate on (meter, date). The columns are built from the arrays
+    of the Series, without going through the records:
+     - meter: string (dictionary), only when given
+     - date: timestamp (seconds, UTC) of the beginning of the reading
+     - duration: seconds
+     - value: float
+     - type: string (dictionary), for typed series only
+
+    The files are written by 'put(key, body)': a LocalWriter of 'path' by default,
+    or the put of a store backend (S3).
+    """
+
+    FORMATS = {
+        "parquet": ".parquet",
+        "arrow": ".arrow",
+    }
+
+    def __init__(self, path=".", format="parquet", compression="zstd", put=None):
+        if format not in ParquetExporter.FORMATS:
+            raise ValueError("invalid format '%s' (%s)" % (format, ", ".join(ParquetExporter.FORMATS.keys())))
+        self.format = format
+        self.compression = compression
+        self.put = put if put is not None else LocalWriter(path)
+        # pyarrow is only loaded when exporting to it
+        import pyarrow
+        self.pa = pyarrow
+
+    @classmethod
+    def key(cls, serie, year, month, first, meter=None, ext=".parquet"):
+        name = "%s-%d" % (meter, first) if meter is not None else "%d" % first
+        return "%s/year=%04d/month=%02d/%s%s" % (serie, year, month, name, ext)
+
+    def table(self, batch, meter=None):
+        pa = self.pa
+        n = len(batch)
+        # the arrays of the series are used as the column buffers
+        columns = [
+            pa.Array.from_buffers(pa.timestamp("s", tz="UTC"), n, [None, pa.py_buffer(batch.dates)]),
+            pa.Array.from_buffers(pa.float64(), n, [None, pa.py_buffer(batch.durations)]),
+            pa.Array.from_buffers(pa.float64(), n, [None, pa.py_buffer(batch.values)]),
+        ]
+        names = ["date", "duration", "value"]
+        if batch.typed:
+            indices = pa.Array.from_buffers(pa.int8(), n, [None, pa.py_buffer(batch.types)])
+            columns.append(pa.DictionaryArray.from_arrays(indices, pa.array(Series.TYPES)))
+            names.append("type")
+        if meter is not None:
+            indices = pa.Array.from_buffers(pa.int8(), n, [None, pa.py_buffer(bytes(n))])
+            columns.insert(0, pa.DictionaryArray.from_arrays(indices, pa.array([str(meter)])))
+            names.insert(0, "meter")
+        return pa.Table.from_arrays(columns, names=names)
+
+    def encode(self, table):
+        sink = self.pa.BufferOutputStream()
+        if self.format == "arrow":
+            options = self.pa.ipc.IpcWriteOptions(compression=self.compression)
+            with self.pa.ipc.new_file(sink, table.schema, options=options) as writer:
+                writer.write_table(table)
+        else:
+            import pyarrow.parquet
+            pyarrow.parquet.write_table(table, sink, compression=self.compression)
+        return sink.getvalue().to_pybytes()
+
+    def save_batch(self, serie, batch, batchid=0, meter=None):
+        ext = ParquetExporter.FORMATS[self.format]
+        for ((year, month), part) in ParquetExporter.months(batch):
+            self.put(ParquetExporter.key(serie, year, month, part.dates[0], meter, ext), self.encode(self.table(part, meter)))
+        return len(batch)
@@ -0,0 +1,112 @@
+import sqlite3
+import datetime
+import logging
+import itertools
+import threading
+
+from mylinky.enedis import Series
+from mylinky.exporter.exporter import Exporter
+
+log = logging.getLogger("sqlite")
+
+class SqliteExporter(Exporter):
+    """Local history of the readings, in a SQLite database
+
+    The readings are upserted on (meter, resource, timestamp): exporting the
+    same period again (overlapping windows, re-runs) updates the rows in place.
+    The rows of a save_data() are inserted with executemany in one transaction
+    (committed every 'transaction_size' rows), the database being in WAL mode.
+
+    The table is clustered on its primary key (WITHOUT ROWID), so the range
+    queries of a meter only read its rows, and two covering indexes serve the
+    range queries of all the meters and the per-tariff queries:
+
+        SELECT timestamp, value FROM readings WHERE meter=? AND resource='hourly' AND timestamp BETWEEN ? AND ?
+        SELECT meter, SUM(value) FROM readings WHERE resource='hourly' AND timestamp BETWEEN ? AND ? GROUP BY meter
+        SELECT SUM(value) FROM readings WHERE meter=? AND resource='hourly' AND type='pleine' AND timestamp BETWEEN ? AND ?
+
+    'meter' is '' for the readings exported without one.
+    """
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS readings (
+            meter TEXT NOT NULL,
+            resource TEXT NOT NULL,
+            timestamp INTEGER NOT NULL,
+            duration REAL NOT NULL,
+            value REAL NOT NULL,
+            type TEXT,
+            PRIMARY KEY (meter, resource, timestamp)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS readings_by_time ON readings (resource, timestamp, meter, value, duration)",
+        "CREATE INDEX IF NOT EXISTS readings_by_type ON readings (meter, resource, type, timestamp, value)",
+    ]
+
+    # UPSERT needs SQLite 3.24, the same rows are replaced on older versions
+    if sqlite3.sqlite_version_info >= (3, 24, 0):
+        INSERT = ("INSERT INTO readings (meter, resource, timestamp, duration, value, type) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (meter, resource, timestamp) DO UPDATE SET duration=excluded.duration, value=excluded.value, type=excluded.type")
+    else:
+        INSERT = "INSERT OR REPLACE INTO readings (meter, resource, timestamp, duration, value, type) VALUES (?, ?, ?, ?, ?, ?)"
+
+    def __init__(self, fname, transaction_size=100000):
+        self.fname = fname
+        self.transaction_size = transaction_size
+        # the transactions are handled here, not by the sqlite3 module
+        self.conn = sqlite3.connect(fname, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # durable at the checkpoints only, which is enough for data fetched again on failure
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in SqliteExporter.SCHEMA:
+            self.conn.execute(statement)
+
+    @classmethod
+    def rows(cls, resource, batch, meter=None):
+        """(meter, resource, timestamp, duration, value, type) tuples, from the arrays of the batch"""
+        meters = itertools.repeat(meter if meter is not None else "")
+        resources = itertools.repeat(resource)
+        types = map(Series.TYPES.__getitem__, batch.types) if batch.typed else itertools.repeat(None)
+        return zip(meters, resources, batch.dates, batch.durations, batch.values, types)
+
+    def last_timestamp(self, serie, meter=None):
+        with self._lock:
+            (last,) = self.conn.execute("SELECT MAX(timestamp) FROM readings WHERE meter=? AND resource=?",
+                (meter if meter is not None else "", serie)).fetchone()
+        if last is None:
+            return None
+        return datetime.datetime.fromtimestamp(last, tz=Series.TZ)
+
+    def _begin(self):
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+
+    def _commit(self):
+        if self.conn.in_transaction:
+            self.conn.execute("COMMIT")
+        self._pending = 0
+
+    def save_batch(self, serie, batch, batchid=0, meter=None):
+        self._begin()
+        self.conn.executemany(SqliteExporter.INSERT, SqliteExporter.rows(serie, batch, meter))
+        self._pending += len(batch)
+        if self._pending >= self.transaction_size:
+            self._commit()
+        return len(batch)
+
+    def save_data(self, serie, data, batchid=0, meter=None):
+        with self._lock:
+            try:
+                count = super().save_data(serie, data, batchid, meter)
+            except Exception:
+                if self.conn.in_transaction:
+                    self.conn.execute("ROLLBACK")
+                self._pending = 0
+                raise
+            self._commit()
+        log.debug("%d readings saved to %s" % (count, self.fname))
+        return count
+
+    def close(self):
+        self.conn.close()
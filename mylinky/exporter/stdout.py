@@ -0,0 +1,20 @@
+import sys
+
+from mylinky.exporter.exporter import Exporter
+
+class StdoutExporter(Exporter):
+    def __init__(self, pretty=False, stream=None):
+        self.pretty = pretty
+        self.stream = stream if stream is not None else sys.stdout
+
+    def save_batch(self, serie, batch, batchid=0, meter=None):
+        if self.pretty:
+            import pprint
+        for row in batch.rows():
+            if meter is not None:
+                row = (meter,) + row
+            if self.pretty:
+                pprint.pprint(row, stream=self.stream)
+            else:
+                print(*row, sep="\t", file=self.stream)
+        return len(batch)
@@ -0,0 +1,128 @@
+import unittest
+import datetime
+import logging
+import tempfile
+import shutil
+import os
+import gzip
+import pytz
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from mylinky.enedis import Series
+from mylinky.exporter import CsvExporter
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+class TestCsvExporter(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.fname = os.path.join(self.path, "data.csv")
+        tz = pytz.timezone("Europe/Paris")
+        self.start = tz.localize(datetime.datetime(2019, 11, 11))
+        self.series = Series(typed=True)
+        for i in range(4):
+            self.series.append(self.start + datetime.timedelta(minutes=30*i), 1800.0, float(i), "pleine")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def testSaveData(self):
+        CsvExporter(fname=self.fname, mode="w").save_data("hourly", self.series)
+        with open(self.fname) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], "date,duration,value,type")
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(lines[1], "%s,1800.0,0.0,pleine" % self.start)
+
+    def testLastTimestamp(self):
+        exporter = CsvExporter(fname=self.fname, mode="a")
+        self.assertIsNone(exporter.last_timestamp("hourly"))
+        exporter.save_data("hourly", self.series[:2])
+        self.assertEqual(exporter.last_timestamp("hourly"), self.start + datetime.timedelta(minutes=30))
+        # appended
+        exporter.save_data("hourly", self.series[2:])
+        self.assertEqual(exporter.last_timestamp("hourly"), self.start + datetime.timedelta(minutes=90))
+
+    def testLastTimestampMeter(self):
+        exporter = CsvExporter(fname=self.fname, mode="a")
+        exporter.save_data("hourly", self.series[:2], meter="home")
+        exporter.save_data("hourly", self.series, meter="office")
+        self.assertEqual(exporter.last_timestamp("hourly", meter="home"), self.start + datetime.timedelta(minutes=30))
+        self.assertEqual(exporter.last_timestamp("hourly", meter="office"), self.start + datetime.timedelta(minutes=90))
+        self.assertIsNone(exporter.last_timestamp("hourly", meter="cellar"))
+        self.assertEqual(exporter.last_timestamp("hourly"), self.start + datetime.timedelta(minutes=90))
+
+    def testAppend(self):
+        exporter = CsvExporter(fname=self.fname, mode="a")
+        exporter.save_data("hourly", self.series[:2])
+        exporter.save_data("hourly", iter([self.series[2:3], self.series[3:]]))
+        CsvExporter(fname=self.fname, mode="a").save_data("hourly", self.series[:1])
+        with open(self.fname) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], "date,duration,value,type")
+        self.assertEqual(len(lines), 6)
+
+        # overwritten by a new exporter, appended to afterwards
+        exporter = CsvExporter(fname=self.fname, mode="w")
+        exporter.save_data("hourly", self.series[:2], meter="home")
+        exporter.save_data("hourly", self.series[2:], meter="home")
+        with open(self.fname) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], "meter,date,duration,value,type")
+        self.assertEqual(lines[1], "home,%s,1800.0,0.0,pleine" % self.start)
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(exporter.last_timestamp("hourly"), self.start + datetime.timedelta(minutes=90))
+
+    def testGzip(self):
+        fname = os.path.join(self.path, "data.csv.gz")
+        exporter = CsvExporter(fname=fname, mode="a")
+        exporter.save_data("hourly", self.series[:2])
+        CsvExporter(fname=fname, mode="a").save_data("hourly", self.series[2:])
+        with gzip.open(fname, "rt") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(lines[4], "%s,1800.0,3.0,pleine" % (self.start + datetime.timedelta(minutes=90)))
+        self.assertEqual(exporter.last_timestamp("hourly"), self.start + datetime.timedelta(minutes=90))
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def testZstd(self):
+        fname = os.path.join(self.path, "data.csv.zst")
+        CsvExporter(fname=fname, mode="a").save_data("hourly", self.series[:2])
+        exporter = CsvExporter(fname=fname, mode="a")
+        exporter.save_data("hourly", self.series[2:])
+        with exporter.open(fname) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(exporter.last_timestamp("hourly"), self.start + datetime.timedelta(minutes=90))
+
+    def testRotate(self):
+        tz = pytz.timezone("Europe/Paris")
+        series = Series()
+        for i in range(6):
+            series.append(tz.localize(datetime.datetime(2019, 12, 31, 22, 30)) + datetime.timedelta(minutes=30*i), 1800.0, float(i))
+        template = os.path.join(self.path, "linky-%Y-%m.csv.gz")
+        exporter = CsvExporter(fname=template, mode="a", rotate=True)
+        self.assertIsNone(exporter.last_timestamp("hourly"))
+        self.assertEqual(exporter.save_data("hourly", iter([series[:2], series[2:]])), 6)
+        self.assertEqual(sorted(os.listdir(self.path)), ["linky-2019-12.csv.gz", "linky-2020-01.csv.gz"])
+        with gzip.open(os.path.join(self.path, "linky-2019-12.csv.gz"), "rt") as f:
+            self.assertEqual(len(f.read().splitlines()), 1+3)
+        with gzip.open(os.path.join(self.path, "linky-2020-01.csv.gz"), "rt") as f:
+            self.assertEqual(len(f.read().splitlines()), 1+3)
+        self.assertEqual(exporter.last_timestamp("hourly"), series.date(-1))
+
+    def testSaveEmpty(self):
+        CsvExporter(fname=self.fname, mode="w").save_data("hourly", Series(typed=True))
+        with open(self.fname) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines, ["date,duration,value,type"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+import datetime
+import logging
+import pytz
+
+from mylinky.enedis import Series
+from mylinky.exporter import Exporter
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+class ListExporter(Exporter):
+    BATCH_SIZE = 4
+
+    def __init__(self):
+        self.batches_saved = []
+
+    def save_batch(self, serie, batch, batchid=0, meter=None):
+        self.batches_saved.append(batch)
+        return len(batch)
+
+class TestExporter(unittest.TestCase):
+
+    def setUp(self):
+        tz = pytz.timezone("Europe/Paris")
+        self.start = tz.localize(datetime.datetime(2019, 11, 11))
+
+    def records(self, count):
+        for i in range(count):
+            yield {"date": self.start + datetime.timedelta(minutes=30*i), "duration": 1800.0, "value": float(i), "type": "pleine"}
+
+    def testBatchesFromSeries(self):
+        s = Series.from_records(self.records(10))
+        batches = list(Exporter.batches(s))
+        self.assertEqual(len(batches), 1)
+        self.assertIs(batches[0], s)
+
+        batches = list(Exporter.batches(iter([s[:5], s[5:]])))
+        self.assertEqual([len(b) for b in batches], [5, 5])
+
+    def testBatchesFromRecords(self):
+        e = ListExporter()
+        count = e.save_data("hourly", self.records(10))
+        self.assertEqual(count, 10)
+        self.assertEqual([len(b) for b in e.batches_saved], [4, 4, 2])
+        self.assertEqual(e.batches_saved[2][1]["value"], 9.0)
+        self.assertEqual(e.batches_saved[0][0]["type"], "pleine")
+
+    def testMonths(self):
+        tz = pytz.timezone("Europe/Paris")
+        # 2019-10-31 22:00 (local) to 2019-11-01 02:00
+        series = Series.from_records({"date": tz.localize(datetime.datetime(2019, 10, 31, 22)) + datetime.timedelta(minutes=30*i), "duration": 1800.0, "value": 1.0}
+            for i in range(8))
+        months = list(Exporter.months(series))
+        self.assertEqual([m[0] for m in months], [(2019, 10), (2019, 11)])
+        self.assertEqual(len(months[0][1]), 4)
+        self.assertEqual(months[1][1].date(0), tz.localize(datetime.datetime(2019, 11, 1)))
+        self.assertEqual(list(Exporter.months(Series())), [])
+
+        # in local time: the first hours of the month (UTC) are in the previous month
+        series = Series()
+        series.append(tz.localize(datetime.datetime(2019, 12, 31, 23, 30)), 1800.0, 1.0)
+        series.append(tz.localize(datetime.datetime(2020, 1, 1, 0, 30)), 1800.0, 1.0)
+        self.assertEqual([m[0] for m in Exporter.months(series)], [(2019, 12), (2020, 1)])
+
+if __name__ == "__main__":
+    unittest.main()
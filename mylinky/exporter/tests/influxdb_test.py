@@ -0,0 +1,77 @@
+import unittest
+import datetime
+import responses
+import logging
+import gzip
+import pytz
+
+from mylinky.enedis import Series
+from mylinky.exporter import InfluxdbExporter
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+class TestInfluxdbExporter(unittest.TestCase):
+
+    def setUp(self):
+        tz = pytz.timezone("Europe/Paris")
+        self.start = tz.localize(datetime.datetime(2019, 11, 11))
+        self.series = Series(typed=True)
+        for i in range(10):
+            self.series.append(self.start + datetime.timedelta(minutes=30*i), 1800.0, 0.5, "creuse" if i < 5 else "pleine")
+
+    def exporter(self, **kwargs):
+        return InfluxdbExporter(host="testme", port=8086, database="linky", username=None, password=None, prefix="linky_", **kwargs)
+
+    def testPrecisions(self):
+        # the choices of the command line
+        from mylinky.main import INFLUXDB_PRECISIONS
+        self.assertEqual(set(INFLUXDB_PRECISIONS), set(InfluxdbExporter.PRECISIONS))
+
+    def testLines(self):
+        lines = list(self.exporter().lines("hourly", self.series, batchid=3))
+        self.assertEqual(len(lines), 10)
+        self.assertEqual(lines[0], "linky_hourly,batchid=3,type=creuse value=500.0,duration=1800.0 %d" % self.start.timestamp())
+        self.assertTrue(lines[9].startswith("linky_hourly,batchid=3,type=pleine "))
+
+        lines = list(self.exporter(precision="ms").lines("monthly", Series.from_records([{"date": self.start, "duration": 1.0, "value": 2.0}])))
+        self.assertEqual(lines, ["linky_monthly,batchid=0 value=2000.0,duration=1.0 %d" % (self.start.timestamp()*1000)])
+
+    def testLinesUdp(self):
+        # always in nanoseconds, whatever the precision
+        lines = list(self.exporter(precision="s", udp=True).lines("hourly", self.series))
+        self.assertTrue(lines[0].endswith(" %d" % (self.start.timestamp()*1000000000)))
+
+    @responses.activate
+    def testSaveBatches(self):
+        responses.add(responses.POST, "http://testme:8086/write", status=204)
+        count = self.exporter(batch_size=4).save_data("hourly", self.series)
+        self.assertEqual(count, 10)
+        self.assertEqual(len(responses.calls), 3)
+        self.assertTrue("precision=s" in responses.calls[0].request.url)
+        self.assertEqual(responses.calls[2].request.body.decode().count("\n"), 2)
+
+    @responses.activate
+    def testSaveGzip(self):
+        responses.add(responses.POST, "http://testme:8086/write", status=204)
+        self.exporter(gzip=True).save_data("hourly", self.series)
+        self.assertEqual(len(responses.calls), 1)
+        request = responses.calls[0].request
+        self.assertEqual(request.headers["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(request.body).decode().count("\n"), 10)
+
+    @responses.activate
+    def testLastTimestamp(self):
+        responses.add(responses.GET, "http://testme:8086/query", json={"results": [{"statement_id": 0, "series": [
+            {"name": "linky_hourly", "columns": ["time", "last"], "values": [[int(self.start.timestamp()), 500.0]]}]}]})
+        self.assertEqual(self.exporter().last_timestamp("hourly", meter="home"), self.start)
+        query = responses.calls[0].request.params
+        self.assertEqual(query["q"], 'SELECT last("value") FROM "linky_hourly" WHERE "meter" = \'home\'')
+        self.assertEqual(query["epoch"], "s")
+
+        responses.replace(responses.GET, "http://testme:8086/query", json={"results": [{"statement_id": 0}]})
+        self.assertIsNone(self.exporter().last_timestamp("hourly"))
+
+if __name__ == "__main__":
+    unittest.main()
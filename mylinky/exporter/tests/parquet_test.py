@@ -0,0 +1,76 @@
+import unittest
+import datetime
+import logging
+import tempfile
+import shutil
+import os
+import pytz
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+from mylinky.enedis import Series
+from mylinky.exporter.parquet import ParquetExporter
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+class TestParquetExporter(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.tz = pytz.timezone("Europe/Paris")
+        # 2019-10-31 22:00 (local) to 2019-11-01 02:00
+        self.start = self.tz.localize(datetime.datetime(2019, 10, 31, 22))
+        self.series = Series(typed=True)
+        for i in range(8):
+            self.series.append(self.start + datetime.timedelta(minutes=30*i), 1800.0, float(i), "pleine" if i%2 else "creuse")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def testKey(self):
+        self.assertEqual(ParquetExporter.key("hourly", 2019, 3, 1551394800), "hourly/year=2019/month=03/1551394800.parquet")
+        self.assertEqual(ParquetExporter.key("hourly", 2019, 3, 1551394800, meter="home", ext=".arrow"), "hourly/year=2019/month=03/home-1551394800.arrow")
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def testSaveData(self):
+        import pyarrow.parquet
+        exporter = ParquetExporter(path=self.path)
+        self.assertEqual(exporter.save_data("hourly", self.series, meter="home"), 8)
+        files = sorted(os.path.relpath(os.path.join(d, f), self.path) for (d, _, fs) in os.walk(self.path) for f in fs)
+        self.assertEqual(files, [
+            ParquetExporter.key("hourly", 2019, 10, self.series.dates[0], "home"),
+            ParquetExporter.key("hourly", 2019, 11, self.series.dates[4], "home")])
+
+        table = pyarrow.parquet.read_table(os.path.join(self.path, files[0]))
+        self.assertEqual(table.column_names, ["meter", "date", "duration", "value", "type"])
+        self.assertEqual(table.column("value").to_pylist(), [0.0, 1.0, 2.0, 3.0])
+        self.assertEqual(table.column("type").to_pylist(), ["creuse", "pleine", "creuse", "pleine"])
+        self.assertEqual(table.column("meter").to_pylist(), ["home"] * 4)
+        self.assertEqual(table.column("date").to_pylist()[0], self.start)
+
+        # exported again: the same files are replaced
+        exporter.save_data("hourly", self.series, meter="home")
+        self.assertEqual(sum(len(fs) for (_, _, fs) in os.walk(self.path)), 2)
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def testArrow(self):
+        import pyarrow.ipc
+        bodies = {}
+        exporter = ParquetExporter(format="arrow", put=bodies.__setitem__)
+        exporter.save_data("hourly", self.series[4:])
+        self.assertEqual(list(bodies.keys()), [ParquetExporter.key("hourly", 2019, 11, self.series.dates[4], ext=".arrow")])
+        table = pyarrow.ipc.open_file(pyarrow.py_buffer(list(bodies.values())[0])).read_all()
+        self.assertEqual(table.column_names, ["date", "duration", "value", "type"])
+        self.assertEqual(table.num_rows, 4)
+
+    def testInvalidFormat(self):
+        with self.assertRaises(ValueError):
+            ParquetExporter(format="orc")
+
+if __name__ == "__main__":
+    unittest.main()
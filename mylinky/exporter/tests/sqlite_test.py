@@ -0,0 +1,78 @@
+import unittest
+import datetime
+import logging
+import tempfile
+import shutil
+import os
+import pytz
+
+from mylinky.enedis import Series
+from mylinky.exporter import SqliteExporter
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+class TestSqliteExporter(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.fname = os.path.join(self.path, "mylinky.db")
+        tz = pytz.timezone("Europe/Paris")
+        self.start = tz.localize(datetime.datetime(2019, 11, 11))
+        self.series = Series(typed=True)
+        for i in range(10):
+            self.series.append(self.start + datetime.timedelta(minutes=30*i), 1800.0, float(i), "pleine" if i%2 else "creuse")
+        self.exporter = SqliteExporter(self.fname, transaction_size=4)
+
+    def tearDown(self):
+        self.exporter.close()
+        shutil.rmtree(self.path)
+
+    def testSaveData(self):
+        self.assertEqual(self.exporter.save_data("hourly", self.series, meter="home"), 10)
+        self.assertEqual(self.exporter.save_data("hourly", self.series[:2]), 2)
+        conn = self.exporter.conn
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertFalse(conn.in_transaction)
+        rows = conn.execute("SELECT * FROM readings WHERE meter='home' ORDER BY timestamp").fetchall()
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(rows[1], ("home", "hourly", self.series.dates[1], 1800.0, 1.0, "pleine"))
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM readings WHERE meter=''").fetchone()[0], 2)
+
+    def testUpsert(self):
+        self.exporter.save_data("hourly", self.series[:6], meter="home")
+        # overlapping window, with updated values
+        updated = Series(typed=True, dates=self.series.dates[4:], durations=self.series.durations[4:],
+            values=[v*10 for v in self.series.values[4:]], types=self.series.types[4:])
+        self.exporter.save_data("hourly", updated, meter="home")
+        values = [r[0] for r in self.exporter.conn.execute("SELECT value FROM readings ORDER BY timestamp")]
+        self.assertEqual(values, [0.0, 1.0, 2.0, 3.0] + [10.0*i for i in range(4, 10)])
+
+    def testIndexes(self):
+        self.exporter.save_data("hourly", self.series, meter="home")
+        def plan(query):
+            return " ".join(r[-1] for r in self.exporter.conn.execute("EXPLAIN QUERY PLAN " + query))
+        self.assertIn("COVERING INDEX readings_by_time", plan("SELECT meter, SUM(value) FROM readings WHERE resource='hourly' AND timestamp BETWEEN 0 AND 1 GROUP BY meter"))
+        self.assertIn("COVERING INDEX readings_by_type", plan("SELECT SUM(value) FROM readings WHERE meter='home' AND resource='hourly' AND type='pleine' AND timestamp BETWEEN 0 AND 1"))
+        self.assertIn("PRIMARY KEY", plan("SELECT timestamp, value FROM readings WHERE meter='home' AND resource='hourly' AND timestamp BETWEEN 0 AND 1"))
+
+    def testLastTimestamp(self):
+        self.assertIsNone(self.exporter.last_timestamp("hourly"))
+        self.exporter.save_data("hourly", self.series[:4], meter="home")
+        self.exporter.save_data("hourly", self.series)
+        self.assertEqual(self.exporter.last_timestamp("hourly", meter="home"), self.series.date(3))
+        self.assertEqual(self.exporter.last_timestamp("hourly"), self.series.date(-1))
+        self.assertIsNone(self.exporter.last_timestamp("monthly"))
+
+    def testRollback(self):
+        def data():
+            yield self.series[:2]
+            raise ValueError("failed")
+        self.exporter.transaction_size = 100
+        with self.assertRaises(ValueError):
+            self.exporter.save_data("hourly", data())
+        self.assertEqual(self.exporter.conn.execute("SELECT COUNT(*) FROM readings").fetchone()[0], 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import bisect
+import itertools
+import logging
+import datetime
+import tempfile
+import threading
+import pytz
+
+from concurrent.futures import ThreadPoolExecutor
+
+from mylinky.datedelta import datedelta
+from mylinky.enedis import Enedis, PartialData, Series, Transport
+
+log = logging.getLogger("fleet")
+
+class FleetState:
+    """Last collected day, per meter and per kind, kept in a local JSON file
+
+    The windows that failed after their retries are kept with it, to be
+    fetched again by the next run (the last day is past them).
+    """
+
+    def __init__(self, fname):
+        self.fname = fname
+        self._lock = threading.Lock()
+        self.data = {}
+        if fname is not None and os.path.exists(fname):
+            with open(fname) as f:
+                self.data = json.load(f)
+
+    def last(self, meter, kind):
+        with self._lock:
+            last = self.data.get(meter, {}).get(kind, {}).get("last")
+        if last is None:
+            return None
+        return pytz.timezone("Europe/Paris").localize(datetime.datetime.strptime(last, "%d/%m/%Y"))
+
+    def failed(self, meter, kind):
+        """(start, end) of the windows to fetch again"""
+        with self._lock:
+            windows = self.data.get(meter, {}).get(kind, {}).get("failed", [])
+        return [tuple(datetime.datetime.fromisoformat(d).astimezone(Series.TZ) for d in w) for w in windows]
+
+    def update(self, meter, kind, lastDate=None, failed=None):
+        """Save the last collected day (never moved backwards) and/or the windows to fetch again"""
+        with self._lock:
+            entry = self.data.setdefault(meter, {}).setdefault(kind, {})
+            if lastDate is not None:
+                last = entry.get("last")
+                if last is None or lastDate.date() >= datetime.datetime.strptime(last, "%d/%m/%Y").date():
+                    entry["last"] = lastDate.strftime("%d/%m/%Y")
+            if failed:
+                entry["failed"] = [[start.isoformat(), end.isoformat()] for (start, end) in failed]
+            elif failed is not None:
+                entry.pop("failed", None)
+            if self.fname is None:
+                return
+            (fd, tmpname) = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.fname)), suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.data, f)
+            os.replace(tmpname, self.fname)
+
+class Fleet:
+    """Collect many accounts on a worker pool, with a shared exporter
+
+    All the accounts share the exporter (writes are serialized), the response
+    cache, the rate limiter and the retry policy of the ENEDIS requests. Each account has its own
+    HTTP transport (and cookies), built from 'http' (Transport arguments).
+    """
+    DELTAS = {"hourly": datedelta(days=1), "monthly": datedelta(months=1), "yearly": datedelta(years=1)}
+
+    def __init__(self, accounts, exporter, kind="hourly", workers=8, limiter=None, state=None, cache=None, sessions=None, chunk_workers=1, url=None, url2=None, http=None, retry=None, stream_decode=False):
+        self.accounts = accounts
+        self.exporter = exporter
+        self.kind = kind
+        self.workers = workers
+        self.limiter = limiter
+        self.state = state if state is not None else FleetState(None)
+        self.cache = cache
+        self.sessions = sessions
+        self.chunk_workers = chunk_workers
+        self._url = url
+        self._url2 = url2
+        self.http = http if http is not None else {}
+        self.stream_decode = stream_decode
+        self.retry = retry
+        self._lock = threading.Lock()
+
+    def _run_account(self, account, endDate, delta):
+        meter = account["name"]
+        result = {"meter": meter, "points": 0, "seconds": 0.0, "error": None}
+        begin = time.monotonic()
+        try:
+            enedis = Enedis(url=self._url, url2=self._url2, timesheets=account.get("timesheets"),
+                workers=self.chunk_workers, cache=self.cache, limiter=self.limiter, sessions=self.sessions,
+                transport=Transport(**self.http), retry=self.retry, stream_decode=self.stream_decode)
+            enedis.login(account["username"], account["password"])
+
+            with self._lock:
+                (startDate, watermark) = Fleet.since(self.exporter, self.state, self.kind, meter)
+            if startDate is None:
+                startDate = endDate - delta
+            # the windows that failed before, then the new data
+            failed = self.state.failed(meter, self.kind)
+            failures = []
+            data = Fleet.refetch(enedis, self.kind, failed, failures)
+            if startDate < endDate:
+                data = itertools.chain(data, Fleet.after(enedis.getdata(self.kind, startDate=startDate, endDate=endDate, stream=True, failures=failures), watermark))
+            lastDate = None
+            for batch in data:
+                if self.exporter is not None:
+                    with self._lock:
+                        result["points"] += self.exporter.save_data(self.kind, batch, meter=meter)
+                else:
+                    result["points"] += len(batch)
+                lastDate = batch.date(-1)
+
+            self.state.update(meter, self.kind, lastDate, failed=failures)
+            if failures:
+                raise PartialData(failures)
+        except Exception as e:
+            log.error("meter %s failed: %s" % (meter, e))
+            result["error"] = repr(e)
+
+        result["seconds"] = time.monotonic() - begin
+        log.info("meter %s: %d points in %.2fs" % (meter, result["points"], result["seconds"]))
+        return result
+
+    @classmethod
+    def since(cls, exporter, state, kind, meter=None, key=None):
+        """(startDate, watermark) of the data still to fetch
+
+        From the last reading known by the exporter (the watermark): its day is
+        fetched again, and the readings up to the watermark are dropped by after().
+        Otherwise, from the day following the last one of the state (for 'key',
+        'meter' by default). (None, None) when nothing was collected yet.
+        """
+        last = exporter.last_timestamp(kind, meter=meter) if exporter is not None else None
+        if last is not None:
+            last = last.astimezone(Series.TZ)
+            # adding a (null) datedelta localizes the midnight again
+            return (last.replace(hour=0, minute=0, second=0, microsecond=0) + datedelta(), last)
+
+        last = state.last(key if key is not None else meter, kind) if state is not None else None
+        if last is not None:
+            return (last + datedelta(days=1), None)
+        return (None, None)
+
+    @classmethod
+    def refetch(cls, enedis, kind, windows, failures):
+        """The data of the windows that failed before (see FleetState.failed), those failing again appended to 'failures'"""
+        for (start, end) in windows:
+            log.info("fetching again %s - %s" % (start, end))
+            yield from enedis.getdata(kind, startDate=start, endDate=end, stream=True, failures=failures)
+
+    @classmethod
+    def after(cls, data, watermark=None):
+        """The non-empty batches of 'data', without the readings up to 'watermark'"""
+        limit = int(watermark.timestamp()) if watermark is not None else None
+        for batch in data:
+            if limit is not None and len(batch) and batch.dates[0] <= limit:
+                batch = batch[bisect.bisect_right(batch.dates, limit):]
+            if len(batch):
+                yield batch
+
+    def run(self, endDate, delta=None):
+        if delta is None:
+            delta = Fleet.DELTAS[self.kind]
+
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            return list(pool.map(lambda account: self._run_account(account, endDate, delta), self.accounts))
+
+    @classmethod
+    def summary(cls, results):
+        lines = []
+        for r in results:
+            lines.append("%-24s %8d points %8.2fs %s" % (r["meter"], r["points"], r["seconds"], "FAILED: %s" % r["error"] if r["error"] else "ok"))
+
+        seconds = [r["seconds"] for r in results]
+        failed = [r for r in results if r["error"]]
+        lines.append("%d meters, %d failed, %d points, time min/avg/max: %.2fs/%.2fs/%.2fs" % (
+            len(results), len(failed), sum(r["points"] for r in results),
+            min(seconds) if seconds else 0, sum(seconds)/len(seconds) if seconds else 0, max(seconds) if seconds else 0))
+        return "\n".join(lines)
@@ -0,0 +1,150 @@
+import bisect
+import logging
+import datetime
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from mylinky.datedelta import datedelta
+from mylinky.enedis import Enedis, Series
+
+log = logging.getLogger("holes")
+
+class IntervalSet:
+    """Sorted, disjoint [start, end) datetime intervals
+
+    Added intervals are merged with the ones they overlap or touch, removed
+    intervals shrink or split the ones they overlap.
+    """
+
+    def __init__(self, intervals=()):
+        self.starts = []
+        self.ends = []
+        for (start, end) in intervals:
+            self.add(start, end)
+
+    def add(self, start, end):
+        if start >= end:
+            return
+        # first interval ending at or after 'start', and first starting after 'end'
+        i = bisect.bisect_left(self.ends, start)
+        j = bisect.bisect_right(self.starts, end)
+        if i < j:
+            start = min(start, self.starts[i])
+            end = max(end, self.ends[j-1])
+        self.starts[i:j] = [start]
+        self.ends[i:j] = [end]
+
+    def remove(self, start, end):
+        if start >= end:
+            return
+        i = bisect.bisect_right(self.ends, start)
+        j = bisect.bisect_left(self.starts, end)
+        if i >= j:
+            return
+        starts = []
+        ends = []
+        if self.starts[i] < start:
+            starts.append(self.starts[i])
+            ends.append(start)
+        if self.ends[j-1] > end:
+            starts.append(end)
+            ends.append(self.ends[j-1])
+        self.starts[i:j] = starts
+        self.ends[i:j] = ends
+
+    def __iter__(self):
+        return iter(zip(self.starts, self.ends))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __eq__(self, other):
+        return isinstance(other, IntervalSet) and list(self) == list(other)
+
+    def __repr__(self):
+        return "IntervalSet(%r)" % list(self)
+
+    def total(self):
+        return sum(((end - start) for (start, end) in self), datetime.timedelta())
+
+    @classmethod
+    def from_json(cls, holes, tz=None):
+        """From the holes.json entries ({"start": isoformat, "end": isoformat})"""
+        tz = tz if tz is not None else Series.TZ
+        return cls((datetime.datetime.fromisoformat(h["start"]).astimezone(tz), datetime.datetime.fromisoformat(h["end"]).astimezone(tz))
+            for h in holes)
+
+    def to_json(self):
+        return [{"start": start.isoformat(), "end": end.isoformat()} for (start, end) in self]
+
+class Backfill:
+    """Fill the holes, most recent first, within a time budget
+
+    The holes are split in windows (Enedis.CHUNKS), fetched on 'workers'
+    threads. No new window is started when less than 'margin' seconds are
+    left ('remaining' returns the seconds left). The data of each window is
+    given to 'export', then removed from the holes: the part before the first
+    returned reading stays a hole. Holes older than the ENEDIS retention are
+    dropped.
+    """
+
+    def __init__(self, enedis, holes, export, kind="hourly", workers=2, margin=30, retention=datedelta(days=365)):
+        self.enedis = enedis
+        self.holes = holes
+        self.export = export
+        self.kind = kind
+        self.workers = workers
+        self.margin = margin
+        self.retention = retention
+
+    def windows(self):
+        """The windows of the holes, by priority (most recent first)"""
+        windows = []
+        for (start, end) in self.holes:
+            windows.extend(Enedis.chunks(Enedis.RESOURCE[self.kind], start, end))
+        return sorted(windows, key=lambda w: w[1], reverse=True)
+
+    def _fetch(self, window):
+        return self.enedis.getdata(self.kind, startDate=window[0], endDate=window[1])
+
+    def run(self, now, remaining=None):
+        """Returns the number of filled windows and readings"""
+        if remaining is None:
+            remaining = lambda: float("inf")
+
+        # not kept by ENEDIS anymore
+        if len(self.holes):
+            self.holes.remove(self.holes.starts[0], now - self.retention)
+
+        result = {"windows": 0, "points": 0, "failed": 0}
+        windows = iter(self.windows())
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            pending = {}
+            while True:
+                while len(pending) < max(1, self.workers) and remaining() > self.margin:
+                    window = next(windows, None)
+                    if window is None:
+                        break
+                    pending[pool.submit(self._fetch, window)] = window
+                if not pending:
+                    break
+
+                (done, _) = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    window = pending.pop(future)
+                    try:
+                        data = future.result()
+                    except Exception as e:
+                        log.warning("backfill of %s - %s failed: %s" % (window[0], window[1], e))
+                        result["failed"] += 1
+                        continue
+                    if len(data) == 0:
+                        continue
+                    self.export(window, data)
+                    # the part before the first reading is not available (yet)
+                    self.holes.remove(max(window[0], data.date(0)), window[1])
+                    result["windows"] += 1
+                    result["points"] += len(data)
+
+        log.info("backfill: %s, %s left in %d holes" % (result, self.holes.total(), len(self.holes)))
+        return result
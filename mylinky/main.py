@@ -16,28 +16,45 @@ It defines classes_and_methods
 import sys
 import os
 import logging
-import pkg_resources
 import datetime
 import argparse
-import pprint
+import itertools
 import pytz
 
 from argparse import ArgumentParser
 from argparse import RawDescriptionHelpFormatter
 
 from mylinky.datedelta import datedelta
-from mylinky.enedis import Enedis
-from mylinky.exporter import InfluxdbExporter, CsvExporter
+from mylinky.enedis import Enedis, ResponseCache, SessionCache, TokenBucket, Transport
+from mylinky.enedis import RetryPolicy, Backoff, CircuitBreaker, AdaptiveLimiter
+from mylinky.fleet import Fleet, FleetState
+from mylinky.metrics import Metrics
+from mylinky.rollup import Rollup
 from mylinky import MyLinkyConfig
 
 __all__ = []
-__version__ = "UNKNOWN"
 __date__ = '2019-11-15'
 
-try:
-    __version__ = pkg_resources.get_distribution("mylinky").version
-except pkg_resources.DistributionNotFound:
-    pass
+def get_version():
+    # resolving the distribution is slow: only done for --version
+    from importlib import metadata
+    try:
+        return metadata.version("mylinky")
+    except metadata.PackageNotFoundError:
+        return "UNKNOWN"
+
+def __getattr__(name):
+    if name == "__version__":
+        return get_version()
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+class VersionAction(argparse.Action):
+    def __init__(self, option_strings, dest=argparse.SUPPRESS, default=argparse.SUPPRESS, help=None):
+        super().__init__(option_strings=option_strings, dest=dest, default=default, nargs=0, help=help)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        print("%s %s" % (parser.prog, get_version()))
+        parser.exit()
 
 # Default logging configuration
 logging.basicConfig(format='%(asctime)s %(message)s') #, datefmt='%m/%d/%Y %I:%M:%S %p')
@@ -46,11 +63,13 @@ log.setLevel(logging.INFO)
 
 DEBUG = 1
 TESTRUN = 0
-PROFILE = 0
+
+# the keys of InfluxdbExporter.PRECISIONS, without importing the exporter to parse the arguments
+INFLUXDB_PRECISIONS = ("s", "ms", "u", "n")
 
 def datetime_converter(s):
     try:
-        return datetime.datetime.strptime(s, "%d/%m/%Y").replace(tzinfo=pytz.timezone("Europe/Paris"))
+        return pytz.timezone("Europe/Paris").localize(datetime.datetime.strptime(s, "%d/%m/%Y"))
     except ValueError:
         raise argparse.ArgumentTypeError("Invalid date (DD/MM/YYYY): %s" % s)
 
@@ -67,6 +86,54 @@ def timesheet_converter(s):
     except ValueError:
         raise argparse.ArgumentTypeError("Cannot parse timesheet 'time:time', with time '%h:%m'")
 
+def create_exporter(args, config):
+    # only the selected exporter (and its dependencies) is imported
+    if args.exporter == "influxdb":
+        from mylinky.exporter import InfluxdbExporter
+        return InfluxdbExporter(
+            host=config["influxdb"]["host"], 
+            port=config["influxdb"]["port"],
+            database=config["influxdb"]["database"],
+            username=config["influxdb"]["username"],
+            password=config["influxdb"]["password"],
+            prefix=config["influxdb"]["measurement-prefix"],
+            batch_size=config["influxdb"]["batch-size"],
+            precision=config["influxdb"]["precision"],
+            gzip=config["influxdb"]["gzip"],
+            udp=config["influxdb"]["udp-port"] is not None,
+            udp_port=config["influxdb"]["udp-port"] or 4444
+        )
+    elif args.exporter == "stdout":
+        from mylinky.exporter import StdoutExporter
+        return StdoutExporter(pretty=args.pretty)
+    elif args.exporter == "csv":
+        from mylinky.exporter import CsvExporter
+        # the incremental runs add to what was exported by the previous ones
+        mode = "a" if args.incremental or args.fleet else args.mode
+        return CsvExporter(fname=args.filename, mode=mode, rotate=args.rotate, compression=args.csv_compression)
+    elif args.exporter == "sqlite":
+        from mylinky.exporter import SqliteExporter
+        return SqliteExporter(fname=args.filename)
+    elif args.exporter == "cost":
+        from mylinky.exporter import CostExporter
+        return CostExporter.from_config(config["pricing"])
+    elif args.exporter == "parquet":
+        from mylinky.exporter import ParquetExporter
+        return ParquetExporter(path=args.path, format=args.format, compression=config["archive"]["compression"])
+    return None
+
+def track(data, update):
+    """The batches of 'data', calling update(last date) once each one is exported"""
+    for batch in data:
+        yield batch
+        update(batch.date(-1))
+
+def report(args, metrics):
+    if args.metrics_file:
+        metrics.write(args.metrics_file)
+    if args.profile:
+        sys.stderr.write(metrics.report() + "\n")
+
 def main(argv=None): # IGNORE:C0111
     '''Command line options.'''
     if argv is None:
@@ -75,7 +142,6 @@ def main(argv=None): # IGNORE:C0111
         sys.argv.extend(argv)
 
     program_name = os.path.basename(sys.argv[0])
-    program_version_message = '%%(prog)s %s' % (__version__)
     program_shortdesc = "LINKY Power consumption toolbox (from ENEDIS)"
     program_license = '''%s
 
@@ -93,8 +159,10 @@ USAGE
         # Setup argument parser
         parser = ArgumentParser(description=program_license, formatter_class=RawDescriptionHelpFormatter)
         parser.add_argument('-v', '--verbose', action='count', default=0, help="set verbosity level [default: %(default)s]")
-        parser.add_argument('-V', '--version', action='version', version=program_version_message)
+        parser.add_argument('-V', '--version', action=VersionAction, help="show program's version number and exit")
         parser.add_argument('-c', "--config", help="configuration file")
+        parser.add_argument("--profile", action="store_true", help="print the timings and counters of each stage at the end")
+        parser.add_argument("--metrics-file", help="write the timings and counters to this file (Prometheus text format for a '.prom' file, JSON otherwise)")
         
         group = parser.add_argument_group("importer", "Data importer parameters")
         group.add_argument("--importer", choices=["enedis"], help="select importer [default: %(default)s]", default="enedis")
@@ -103,14 +171,30 @@ USAGE
         enedis.add_argument('-u', '--username', help="Enedis username")
         enedis.add_argument('-p', '--password', help="Enedis password")
         enedis.add_argument("--timesheet", action="append", type=timesheet_converter, help="enter new HP/HC timesheet")
+        enedis.add_argument("--session-cache", help="directory where the login sessions are kept, and reused (disabled by default)")
+        enedis.add_argument("--cache", help="directory of the on-disk response cache (disabled by default)")
+        enedis.add_argument("--workers", type=int, default=4, help="number of windows fetched in parallel (default: %(default)s)")
+        enedis.add_argument("--pool-size", type=int, help="max. HTTP connections kept open per host")
+        enedis.add_argument("--timeout", type=float, help="HTTP requests timeout, in seconds")
+        enedis.add_argument("--retries", type=int, help="max. retries of a failed data request")
+        enedis.add_argument("--no-keepalive", action="store_true", help="close the HTTP connections after each request")
+        enedis.add_argument("--stream", action="store_true", help="decode the data incrementally, from the HTTP responses stream")
+
+        fleet = parser.add_argument_group("fleet", "collect all the accounts of the configuration")
+        fleet.add_argument("--fleet", action="store_true", help="run the 'accounts' of the configuration on a worker pool")
+        fleet.add_argument("--fleet-workers", type=int, help="number of accounts collected in parallel")
+        fleet.add_argument("--rate", type=float, help="max. ENEDIS requests per second, for all the accounts")
+        fleet.add_argument("--state", help="per-meter state file, for incremental collection")
 
         parser.add_argument("--type", choices=Enedis.RESOURCE.keys(), default="hourly", help="query data source (default: %(default)s)")
 
         date = parser.add_argument_group("date range", "select the date range")
-        date.add_argument("--to", help="to/end query data range (format DD/MM/YYYY)", type=datetime_converter, default=datetime.datetime.now().replace(tzinfo=pytz.timezone("Europe/Paris")))
+        date.add_argument("--to", help="to/end query data range (format DD/MM/YYYY)", type=datetime_converter, default=datetime.datetime.now(tz=pytz.timezone("Europe/Paris")))
         group = date.add_mutually_exclusive_group()
         group.add_argument("--from", help="from/start query date range (format DD/MM/YYYY)", type=datetime_converter)
         group.add_argument("--last", help="query for last days/months/year depending 'type'", type=datedelta_converter)
+        date.add_argument("--rollup", help="file of the daily totals of the hourly data, updated by the hourly queries, and answering the monthly/yearly ones it covers")
+        date.add_argument("--incremental", action="store_true", help="only query what follows the last reading of the exporter (or of the --state file), --last the first time")
 
         subparsers = parser.add_subparsers(help='exporter help', dest="exporter")
 
@@ -119,13 +203,29 @@ USAGE
         subparser.add_argument("--db", help="Database name")
         subparser.add_argument("--dbuser", help="Database username")
         subparser.add_argument("--dbpassword", help="Database password")
+        subparser.add_argument("--batch-size", type=int, help="number of points per write request")
+        subparser.add_argument("--precision", choices=INFLUXDB_PRECISIONS, help="timestamps precision")
+        subparser.add_argument("--gzip", action="store_true", help="compress the write requests")
+        subparser.add_argument("--udp-port", type=int, help="send the points (fire-and-forget) to this UDP port")
 
         subparser = subparsers.add_parser("stdout", help="Export to STDOUT")
         subparser.add_argument("--pretty", help="enable pretty printing")
 
         subparser = subparsers.add_parser("csv", help="Export to STDOUT")
         subparser.add_argument("--filename", help="csv filename")
-        subparser.add_argument("--mode", help="open mode (default %(default)s - overwrite)", default="w")
+        subparser.add_argument("--mode", choices=["w", "a"], help="open mode: w (overwrite) or a (append) (default %(default)s, always a with --incremental or --fleet)", default="w")
+        subparser.add_argument("--rotate", action="store_true", help="one file per month, 'filename' being a strftime template (e.g. 'linky-%%Y-%%m.csv.gz')")
+        subparser.add_argument("--compression", dest="csv_compression", choices=["gzip", "zstd"], help="compress the file (default: from the '.gz'/'.zst' extension)")
+
+        subparser = subparsers.add_parser("sqlite", help="Export to a SQLite database")
+        subparser.add_argument("--filename", help="database filename (default: %(default)s)", default="mylinky.db")
+
+        subparser = subparsers.add_parser("cost", help="Print the cost of the data with each tariff of the configuration")
+
+        subparser = subparsers.add_parser("parquet", help="Export to Parquet/Arrow files, partitioned by year and month")
+        subparser.add_argument("--path", help="root directory (default: %(default)s)", default=".")
+        subparser.add_argument("--format", choices=["parquet", "arrow"], help="file format (default: %(default)s)", default="parquet")
+        subparser.add_argument("--compression", help="compression codec (default: zstd)")
 
         args = parser.parse_args()
         kwargs = vars(args)
@@ -143,39 +243,106 @@ USAGE
         config.override_from_args(kwargs)
         log.debug("config: %s" % config.data)
 
-        enedis = Enedis(timesheets=config["enedis"]["timesheets"])
-        enedis.login(config["enedis"]["username"], config["enedis"]["password"])
+        cache = None
+        if config["cache"]["path"]:
+            cache = ResponseCache(config["cache"]["path"], max_size=config["cache"]["max-size"], ttl=config["cache"]["ttl"])
+
+        sessions = None
+        if config["enedis"]["session-cache"]:
+            sessions = SessionCache(config["enedis"]["session-cache"], max_age=config["enedis"]["session-max-age"])
+
+        http = {
+            "pool_size": config["http"]["pool-size"],
+            "keepalive": config["http"]["keepalive"],
+            "timeout": config["http"]["timeout"]
+        }
+
+        metrics = Metrics(enabled=args.profile or args.metrics_file is not None)
+        retry = RetryPolicy(retries=config["retry"]["retries"], metrics=metrics,
+            backoff=Backoff(config["retry"]["backoff"], config["retry"]["max-backoff"]),
+            breaker=CircuitBreaker(config["retry"]["failure-threshold"], config["retry"]["reset-timeout"]),
+            limiter=AdaptiveLimiter(config["retry"]["concurrency"], maximum=config["retry"]["max-concurrency"], latency=config["retry"]["latency-target"]))
 
-        startDate = kwargs["from"]
         endDate = kwargs["to"]
+        if args.fleet:
+            limiter = TokenBucket(config["fleet"]["rate"], config["fleet"]["burst"])
+            exporter = create_exporter(args, config)
+            if exporter is not None:
+                exporter.metrics = metrics
+            fleet = Fleet(config["accounts"], exporter, kind=args.type,
+                workers=config["fleet"]["workers"], limiter=limiter, state=FleetState(config["fleet"]["state"]), cache=cache, sessions=sessions, http=http, retry=retry, stream_decode=config["http"]["stream"])
+            results = fleet.run(endDate, delta=args.last)
+            print(Fleet.summary(results))
+            report(args, metrics)
+            return 1 if any(r["error"] for r in results) else 0
+
+        exporter = create_exporter(args, config)
+        if exporter is not None:
+            exporter.metrics = metrics
+
+        startDate = kwargs["from"]
+        watermark = None
+        # windows that failed in the previous runs, fetched again
+        failed = []
+        if args.incremental:
+            # the state file is used for the exporters that do not know their last reading
+            state = FleetState(config["fleet"]["state"])
+            (since, watermark) = Fleet.since(exporter, state, args.type, key=config["enedis"]["username"])
+            if since is not None:
+                startDate = since
+            failed = state.failed(config["enedis"]["username"], args.type)
+            log.info("incremental: from %s (last reading: %s)" % (startDate, watermark))
         if startDate is None:
             delta = args.last
             if not delta:
-                delta = {"hourly": datedelta(days=1), "monthly": datedelta(months=1), "yearly": datedelta(years=1) }[args.type]
+                delta = Fleet.DELTAS[args.type]
             startDate = endDate - delta
 
-        data = enedis.getdata(args.type, startDate=startDate, endDate=endDate)
-
-        if args.exporter == "influxdb":
-            influx = InfluxdbExporter(
-                host=config["influxdb"]["host"], 
-                port=config["influxdb"]["port"],
-                database=config["influxdb"]["database"],
-                username=config["influxdb"]["username"],
-                password=config["influxdb"]["password"],
-                prefix=config["influxdb"]["measurement-prefix"]
-            )
-
-            influx.save_data(args.type, data)
-
-        elif args.exporter == "stdout":
-            pprint.pprint(data)
-
-        elif args.exporter == "csv":
-            csv = CsvExporter(fname=args.filename, mode=args.mode)
-            csv.save_data(args.type, data)
-
-
+        rollup = Rollup.load(args.rollup) if args.rollup else None
+        enedis = None
+        # windows failing after their retries
+        failures = []
+        if startDate >= endDate and not failed:
+            log.info("up to date")
+        elif not failed and rollup is not None and args.type in Rollup.PERIODS and rollup.covers(args.type, *Enedis.normalize(args.type, startDate, endDate)):
+            # computed from the hourly data already collected, without any request
+            log.info("%s data computed from %s" % (args.type, args.rollup))
+            if exporter is not None:
+                exporter.save_data(args.type, Fleet.after([rollup.series(args.type, *Enedis.normalize(args.type, startDate, endDate))], watermark))
+        else:
+            enedis = Enedis(timesheets=config["enedis"]["timesheets"], workers=args.workers, cache=cache, sessions=sessions,
+                transport=Transport(**http), retry=retry, stream_decode=config["http"]["stream"])
+            enedis.login(config["enedis"]["username"], config["enedis"]["password"])
+
+            # the data is streamed to the exporters, one window at a time
+            data = Fleet.refetch(enedis, args.type, failed, failures)
+            if startDate < endDate:
+                data = itertools.chain(data, Fleet.after(enedis.getdata(args.type, startDate=startDate, endDate=endDate, stream=True, failures=failures), watermark))
+            if rollup is not None and args.type == "hourly":
+                data = rollup.feed(data)
+            if args.incremental:
+                # the last day moves past the failed windows: they are kept in the state until the end
+                data = track(data, lambda lastDate: state.update(config["enedis"]["username"], args.type, lastDate,
+                    failed=failed + [w for w in failures if w not in failed]))
+            if exporter is not None:
+                exporter.save_data(args.type, data)
+            else:
+                # nothing is exported, the windows are still fetched for the rollup
+                for _ in data:
+                    pass
+            if args.incremental:
+                state.update(config["enedis"]["username"], args.type, failed=failures)
+
+        if rollup is not None and enedis is not None and args.type == "hourly":
+            rollup.save(args.rollup)
+
+        if enedis is not None:
+            for (k, v) in enedis.transport.stats().items():
+                metrics.gauge("http_%s" % k, v)
+        report(args, metrics)
+        if failures:
+            log.error("%d windows failed: %s" % (len(failures), ", ".join("%s - %s" % w for w in failures)))
+            return 1
         return 0
 
     except Exception as e:
@@ -197,15 +364,4 @@ if __name__ == "__main__":
     if TESTRUN:
         import doctest
         doctest.testmod()
-    if PROFILE:
-        import cProfile
-        import pstats
-        profile_filename = 'profile.txt'
-        cProfile.run('main()', profile_filename)
-        statsfile = open("profile_stats.txt", "wb")
-        p = pstats.Stats(profile_filename, stream=statsfile)
-        stats = p.strip_dirs().sort_stats('cumulative')
-        stats.print_stats()
-        statsfile.close()
-        sys.exit(0)
-    main()
+    sys.exit(main())
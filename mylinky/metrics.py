@@ -0,0 +1,96 @@
+import json
+import time
+import threading
+import contextlib
+
+class Metrics:
+    """Thread-safe counters, gauges and timers, shared by the components of a run
+
+    When disabled, nothing is recorded (the timers do not even read the clock).
+    """
+
+    PREFIX = "mylinky_"
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        # name -> [count, total seconds]
+        self.timers = {}
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.gauges = {}
+            self.timers = {}
+
+    def incr(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            timer = self.timers.setdefault(name, [0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+
+    @contextlib.contextmanager
+    def _timer(self, name):
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - begin)
+
+    def timer(self, name):
+        """Context manager timing a stage"""
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._timer(name)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "timers": {name: {"count": t[0], "seconds": t[1]} for (name, t) in self.timers.items()}
+            }
+
+    def prometheus(self):
+        """Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+        for (name, value) in sorted(snapshot["counters"].items()):
+            lines.append("# TYPE %s%s_total counter" % (Metrics.PREFIX, name))
+            lines.append("%s%s_total %r" % (Metrics.PREFIX, name, value))
+        for (name, value) in sorted(snapshot["gauges"].items()):
+            lines.append("# TYPE %s%s gauge" % (Metrics.PREFIX, name))
+            lines.append("%s%s %r" % (Metrics.PREFIX, name, value))
+        for (name, timer) in sorted(snapshot["timers"].items()):
+            lines.append("# TYPE %s%s_seconds summary" % (Metrics.PREFIX, name))
+            lines.append("%s%s_seconds_count %d" % (Metrics.PREFIX, name, timer["count"]))
+            lines.append("%s%s_seconds_sum %r" % (Metrics.PREFIX, name, timer["seconds"]))
+        return "\n".join(lines) + "\n"
+
+    def report(self, fmt="json"):
+        if fmt == "prometheus":
+            return self.prometheus()
+        return json.dumps(self.snapshot(), indent=2, sort_keys=True)
+
+    def write(self, fname, fmt=None):
+        """Write the report to 'fname', in Prometheus format for a '.prom' file, JSON otherwise"""
+        if fmt is None:
+            fmt = "prometheus" if fname.endswith(".prom") else "json"
+        with open(fname, "w") as f:
+            f.write(self.report(fmt))
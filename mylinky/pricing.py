@@ -0,0 +1,214 @@
+import bisect
+import logging
+import datetime
+import collections
+
+from array import array
+
+from mylinky.enedis import Series
+
+log = logging.getLogger("pricing")
+
+# Tempo day colours (a Tempo day runs from 6:00 to 6:00 the next day)
+COLOURS = ("bleu", "blanc", "rouge")
+COLOUR_CODES = {c: i for (i, c) in enumerate(COLOURS)}
+TEMPO_SHIFT = 6*3600
+
+EPOCH = datetime.date(1970, 1, 1).toordinal()
+
+class Cost(collections.namedtuple("Cost", ["energy", "cost", "subscription"])):
+    """Energy (kWh) and cost of the energy per tariff code, and the cost of the subscription"""
+    __slots__ = ()
+
+    @property
+    def total(self):
+        return sum(self.cost) + self.subscription
+
+    def __add__(self, other):
+        return Cost(tuple(a + b for (a, b) in zip(self.energy, other.energy)),
+            tuple(a + b for (a, b) in zip(self.cost, other.cost)), self.subscription + other.subscription)
+
+class Tariff:
+    """Prices of a contract, from its 'start' date on
+
+    'prices' (per kWh) is either:
+     - a number: base price
+     - {"creuse": price, "pleine": price}: HP/HC prices
+     - {"bleu": {...}, "blanc": {...}, "rouge": {...}}: HP/HC prices of each Tempo day colour
+    'subscription' is the yearly price of the subscription.
+
+    The prices are compiled in a table indexed by colour*3 + tariff code: the
+    readings without HP/HC ("normale") are priced as HP, and a base price
+    applies to all the readings.
+    """
+
+    def __init__(self, start, prices, subscription=0.0, name=None):
+        self.start = start
+        self.prices = prices
+        self.subscription = subscription
+        self.name = name
+        self.table = Tariff.compile(prices)
+
+    @classmethod
+    def _hphc(cls, prices):
+        if isinstance(prices, (int, float)):
+            return [float(prices)] * len(Series.TYPES)
+        pleine = prices.get("pleine", prices.get("normale"))
+        creuse = prices.get("creuse", pleine)
+        normale = prices.get("normale", pleine)
+        if pleine is None:
+            raise ValueError("no price for the 'pleine' hours: %s" % prices)
+        table = [0.0] * len(Series.TYPES)
+        table[Series.TYPE_CODES["normale"]] = float(normale)
+        table[Series.TYPE_CODES["creuse"]] = float(creuse)
+        table[Series.TYPE_CODES["pleine"]] = float(pleine)
+        return table
+
+    @classmethod
+    def compile(cls, prices):
+        if isinstance(prices, dict) and any(c in prices for c in COLOURS):
+            # tempo: the missing colours are priced as the blue days
+            base = prices.get("bleu")
+            return [p for c in COLOURS for p in cls._hphc(prices.get(c, base))]
+        return cls._hphc(prices) * len(COLOURS)
+
+    def price(self, type, colour="bleu"):
+        return self.table[COLOUR_CODES[colour]*len(Series.TYPES) + Series.TYPE_CODES[type]]
+
+    @classmethod
+    def from_dict(cls, d):
+        start = d["start"]
+        if isinstance(start, str):
+            start = datetime.date.fromisoformat(start)
+        return cls(start, d["prices"], subscription=d.get("subscription", 0.0), name=d.get("name"))
+
+    def __repr__(self):
+        return "Tariff(%s, %r)" % (self.start, self.name or self.prices)
+
+class TariffHistory:
+    """Successive tariffs of a contract (each one applies until the start of the next one)"""
+
+    def __init__(self, tariffs, name=None):
+        self.tariffs = sorted(tariffs, key=lambda t: t.start)
+        self.starts = [t.start for t in self.tariffs]
+        self.name = name
+
+    def index(self, day):
+        """Index of the tariff of a (local) date"""
+        i = bisect.bisect_right(self.starts, day) - 1
+        if i < 0:
+            raise ValueError("no tariff on %s (the first one starts on %s)" % (day, self.starts[0] if self.starts else None))
+        return i
+
+    def at(self, day):
+        return self.tariffs[self.index(day)]
+
+    @classmethod
+    def from_list(cls, tariffs, name=None):
+        return cls([t if isinstance(t, Tariff) else Tariff.from_dict(t) for t in tariffs], name=name)
+
+class Pricing:
+    """Costs of a series of readings, for one or several tariff histories
+
+    The dates of the readings are indexed once: for each distinct hour, its
+    local date and its Tempo colour. A tariff history only has to find the
+    tariff of each distinct date, and each reading is then priced by a lookup
+    in the price tables (vectorized with numpy when it is installed), so
+    comparing tariffs over years of readings stays cheap.
+
+    'colours' maps the dates (or their isoformat) to their Tempo colour, blue
+    by default.
+    """
+
+    def __init__(self, series, colours=None, tz=None, numpy=None):
+        self.series = series
+        self.tz = tz if tz is not None else series.tz
+        self.colours = {(datetime.date.fromisoformat(d) if isinstance(d, str) else d): COLOUR_CODES[c] for (d, c) in (colours or {}).items()}
+        if numpy is None:
+            try:
+                import numpy
+            except ImportError:
+                numpy = None
+        elif numpy is True:
+            import numpy
+        self.np = numpy or None
+
+        # utc day -> its utc offset, False on the days of a DST change
+        self._day_offsets = {}
+        # distinct hours (utc offsets only change on hour boundaries) of the readings
+        hours = {}
+        self.hour_index = array('l', (hours.setdefault(ts // 3600, len(hours)) for ts in series.dates))
+        self.hours = list(hours.keys())
+        # their local date (as an ordinal, and its index in self.days), and their Tempo colour
+        colours = {d.toordinal(): c for (d, c) in self.colours.items()}
+        days = {}
+        self.hour_days = array('l')
+        self.hour_colours = array('l')
+        for hour in self.hours:
+            ts = hour*3600
+            day = EPOCH + (ts + self._offset(ts)) // 86400
+            self.hour_days.append(days.setdefault(day, len(days)))
+            ts -= TEMPO_SHIFT
+            self.hour_colours.append(colours.get(EPOCH + (ts + self._offset(ts)) // 86400, 0))
+        self.days = [datetime.date.fromordinal(d) for d in days.keys()]
+
+        types = series.types if series.typed else bytes(len(series))
+        if self.np is not None:
+            np = self.np
+            self._energy = np.frombuffer(series.values, dtype=np.float64) * np.frombuffer(series.durations, dtype=np.float64) / 3600
+            self._types = np.frombuffer(types, dtype=np.int8).astype(np.int64)
+            self._hour_index = np.frombuffer(self.hour_index, dtype=np.int64) if self.hour_index.itemsize == 8 else np.array(self.hour_index, dtype=np.int64)
+        else:
+            self._energy = array('d', (v * d / 3600 for (v, d) in zip(series.values, series.durations)))
+            self._types = types
+
+    def _offset(self, ts):
+        """UTC offset (seconds) at a timestamp, computed once per UTC day without DST change"""
+        day = ts // 86400
+        offset = self._day_offsets.get(day)
+        if offset is None:
+            first = int(datetime.datetime.fromtimestamp(day*86400, tz=self.tz).utcoffset().total_seconds())
+            last = int(datetime.datetime.fromtimestamp(day*86400 + 86399, tz=self.tz).utcoffset().total_seconds())
+            offset = self._day_offsets[day] = first if first == last else False
+        if offset is False:
+            return int(datetime.datetime.fromtimestamp(ts, tz=self.tz).utcoffset().total_seconds())
+        return offset
+
+    def _offsets(self, history):
+        """For each distinct hour: offset of its prices in the flat table of all the tariffs"""
+        tariffs = [history.index(day) for day in self.days]
+        width = len(COLOURS) * len(Series.TYPES)
+        return [tariffs[d]*width + c*len(Series.TYPES) for (d, c) in zip(self.hour_days, self.hour_colours)]
+
+    def prices(self, history):
+        """Price (per kWh) of each reading"""
+        table = [p for t in history.tariffs for p in t.table]
+        offsets = self._offsets(history)
+        if self.np is not None:
+            np = self.np
+            return np.asarray(table)[np.asarray(offsets, dtype=np.int64)[self._hour_index] + self._types]
+        return array('d', (table[offsets[h] + t] for (h, t) in zip(self.hour_index, self._types)))
+
+    def cost(self, history):
+        ntypes = len(Series.TYPES)
+        prices = self.prices(history)
+        if self.np is not None:
+            np = self.np
+            energy = tuple(np.bincount(self._types, weights=self._energy, minlength=ntypes).tolist())
+            cost = tuple(np.bincount(self._types, weights=self._energy * prices, minlength=ntypes).tolist())
+        else:
+            energy = [0.0] * ntypes
+            cost = [0.0] * ntypes
+            for (e, p, t) in zip(self._energy, prices, self._types):
+                energy[t] += e
+                cost[t] += e * p
+            (energy, cost) = (tuple(energy), tuple(cost))
+
+        # prorated per day of readings
+        subscription = sum(history.at(day).subscription for day in self.days) / 365
+        return Cost(energy, cost, subscription)
+
+    def compare(self, histories):
+        """Cost with each history ({name: TariffHistory}), cheapest first"""
+        costs = [(name, self.cost(history)) for (name, history) in histories.items()]
+        return collections.OrderedDict(sorted(costs, key=lambda c: c[1].total))
@@ -0,0 +1,233 @@
+import os
+import json
+import logging
+import datetime
+import tempfile
+import collections
+
+from array import array
+
+from mylinky.enedis import Series
+
+log = logging.getLogger("rollup")
+
+# one slot per half-hour of the local day, 50 on the day the DST ends (25 hours)
+SLOT = 1800
+SLOTS = 50
+
+class Bucket(collections.namedtuple("Bucket", ["start", "end", "seconds", "energy"])):
+    """A period: its local [start, end), the seconds of readings it holds, and its energy (kWh) per tariff code"""
+    __slots__ = ()
+
+    @property
+    def length(self):
+        return (self.end - self.start).total_seconds()
+
+    @property
+    def complete(self):
+        return self.seconds >= self.length
+
+    @property
+    def total(self):
+        return sum(self.energy)
+
+class Day:
+    """Readings of a local day, in half-hour slots from its midnight"""
+    __slots__ = ("seconds", "energy", "types")
+
+    def __init__(self, seconds=None, energy=None, types=None):
+        self.seconds = array('d', seconds if seconds is not None else [0.0] * SLOTS)
+        self.energy = array('d', energy if energy is not None else [0.0] * SLOTS)
+        self.types = bytearray(types if types is not None else SLOTS)
+
+    def totals(self):
+        """(seconds of readings, energy per tariff code)"""
+        energy = [0.0] * len(Series.TYPES)
+        for (e, t) in zip(self.energy, self.types):
+            energy[t] += e
+        return (sum(self.seconds), energy)
+
+class Rollup:
+    """Energy totals (kWh) of the hourly readings, per period and per tariff (HP/HC)
+
+    The periods (daily, weekly - from Monday -, monthly, yearly) are in local
+    time: a reading belongs to the day of its local date, so the DST days have
+    46 or 50 half-hours, and a month is complete when all its readings are
+    there, whatever its length in hours.
+
+    add() is incremental: the readings replace the ones of the same slot (so
+    overlapping windows are not counted twice), and only the periods of the
+    updated days are computed again, on the next query.
+    """
+
+    PERIODS = ("daily", "weekly", "monthly", "yearly")
+
+    def __init__(self, tz=None):
+        self.tz = tz if tz is not None else Series.TZ
+        # date -> Day
+        self.days = {}
+        # period -> first date of the period -> (seconds, energy per code)
+        self._totals = {period: {} for period in Rollup.PERIODS}
+        self._dirty = {period: set() for period in Rollup.PERIODS}
+        # caches: utc hour -> local date, local date -> utc timestamp of its midnight
+        self._hours = {}
+        self._midnights = {}
+
+    def _localize(self, dt):
+        if hasattr(self.tz, "localize"):
+            return self.tz.localize(dt)
+        return dt.replace(tzinfo=self.tz)
+
+    def midnight(self, day):
+        """Local midnight of a date, as an aware datetime"""
+        return self._localize(datetime.datetime.combine(day, datetime.time()))
+
+    def _midnight(self, day):
+        ts = self._midnights.get(day)
+        if ts is None:
+            ts = int(self.midnight(day).timestamp())
+            self._midnights[day] = ts
+        return ts
+
+    def _day(self, ts):
+        # utc offsets only change on hour boundaries
+        hour = ts // 3600
+        day = self._hours.get(hour)
+        if day is None:
+            day = datetime.datetime.fromtimestamp(hour*3600, tz=self.tz).date()
+            self._hours[hour] = day
+        return day
+
+    @classmethod
+    def key(cls, period, day):
+        """First date of the period of 'day'"""
+        if period == "daily":
+            return day
+        if period == "weekly":
+            return day - datetime.timedelta(days=day.weekday())
+        if period == "monthly":
+            return day.replace(day=1)
+        if period == "yearly":
+            return day.replace(month=1, day=1)
+        raise ValueError("invalid period '%s' (%s)" % (period, ", ".join(Rollup.PERIODS)))
+
+    @classmethod
+    def next(cls, period, key):
+        """First date of the period following the one starting at 'key'"""
+        if period == "daily":
+            return key + datetime.timedelta(days=1)
+        if period == "weekly":
+            return key + datetime.timedelta(days=7)
+        if period == "monthly":
+            return key.replace(year=key.year + 1, month=1) if key.month == 12 else key.replace(month=key.month + 1)
+        return key.replace(year=key.year + 1)
+
+    def add(self, series):
+        """Add (or replace) hourly readings, returns the updated dates"""
+        types = series.types if series.typed else bytes(len(series))
+        updated = set()
+        for (ts, duration, value, t) in zip(series.dates, series.durations, series.values, types):
+            day = self._day(ts)
+            entry = self.days.get(day)
+            if entry is None:
+                entry = self.days[day] = Day()
+            slot = (ts - self._midnight(day)) // SLOT
+            # value: average power (kW) over the reading
+            entry.seconds[slot] = duration
+            entry.energy[slot] = value * duration / 3600
+            entry.types[slot] = t
+            updated.add(day)
+
+        for day in updated:
+            for period in Rollup.PERIODS:
+                self._dirty[period].add(Rollup.key(period, day))
+        return updated
+
+    def feed(self, data):
+        """Pass-through of a stream of hourly batches, added on the way"""
+        for batch in data:
+            self.add(batch)
+            yield batch
+
+    def _compute(self, period, key):
+        end = Rollup.next(period, key)
+        seconds = 0.0
+        energy = [0.0] * len(Series.TYPES)
+        day = key
+        while day < end:
+            entry = self.days.get(day)
+            if entry is not None:
+                (s, e) = entry.totals()
+                seconds += s
+                energy = [a + b for (a, b) in zip(energy, e)]
+            day += datetime.timedelta(days=1)
+        return (seconds, energy)
+
+    def _totals_of(self, period, key):
+        totals = self._totals[period]
+        dirty = self._dirty[period]
+        if key in dirty or key not in totals:
+            totals[key] = self._compute(period, key)
+            dirty.discard(key)
+        return totals[key]
+
+    def _keys(self, period, start, end):
+        key = Rollup.key(period, start.astimezone(self.tz).date())
+        last = end.astimezone(self.tz)
+        while self.midnight(key) < last:
+            yield key
+            key = Rollup.next(period, key)
+
+    def buckets(self, period, start, end):
+        """Buckets of the periods overlapping [start, end) (aware datetimes)"""
+        result = []
+        for key in self._keys(period, start, end):
+            (seconds, energy) = self._totals_of(period, key)
+            result.append(Bucket(self.midnight(key), self.midnight(Rollup.next(period, key)), seconds, tuple(energy)))
+        return result
+
+    def covers(self, period, start, end):
+        """Whether all the periods overlapping [start, end) are complete"""
+        buckets = self.buckets(period, start, end)
+        return len(buckets) > 0 and all(b.complete for b in buckets)
+
+    def series(self, period, start, end, split=False):
+        """Energy of the periods (with readings) overlapping [start, end), as the monthly/yearly ENEDIS data
+
+        One reading per period (date: its start, duration: its length), or
+        with 'split', one per period and tariff (a typed series).
+        """
+        data = Series(typed=split, tz=self.tz)
+        for b in self.buckets(period, start, end):
+            if b.seconds == 0:
+                continue
+            if not split:
+                data.append(b.start, b.length, b.total)
+                continue
+            for (code, energy) in enumerate(b.energy):
+                if energy:
+                    data.append(b.start, b.length, energy, code)
+        return data
+
+    def to_json(self):
+        return {day.isoformat(): [list(d.seconds), list(d.energy), list(d.types)] for (day, d) in sorted(self.days.items())}
+
+    @classmethod
+    def from_json(cls, data, tz=None):
+        rollup = cls(tz=tz)
+        for (day, (seconds, energy, types)) in data.items():
+            rollup.days[datetime.date.fromisoformat(day)] = Day(seconds, energy, types)
+        return rollup
+
+    @classmethod
+    def load(cls, fname, tz=None):
+        if not os.path.exists(fname):
+            return cls(tz=tz)
+        with open(fname) as f:
+            return cls.from_json(json.load(f), tz=tz)
+
+    def save(self, fname):
+        (fd, tmpname) = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(fname)), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.to_json(), f)
+        os.replace(tmpname, fname)
@@ -0,0 +1,187 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger("store")
+
+class PreconditionFailed(Exception):
+    """The object was changed by someone else since it was loaded"""
+    pass
+
+class S3Backend:
+    """Objects of an S3 bucket, with conditional GETs (If-None-Match) and PUTs (If-Match)"""
+
+    def __init__(self, bucket, client=None):
+        self.bucket = bucket
+        if client is None:
+            import boto3
+            client = boto3.client("s3")
+        self.client = client
+
+    def get(self, key, etag=None):
+        """Return (body, etag), with a None body if the object still has 'etag'
+
+        Raises KeyError if the object does not exist.
+        """
+        from botocore.exceptions import ClientError
+        kwargs = {"IfNoneMatch": etag} if etag is not None else {}
+        try:
+            resp = self.client.get_object(Bucket=self.bucket, Key=key, **kwargs)
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code")
+            if code in ("304", "NotModified"):
+                return (None, etag)
+            if code in ("404", "NoSuchKey"):
+                raise KeyError(key)
+            raise
+        return (resp["Body"].read(), resp["ETag"])
+
+    def put(self, key, body, etag=None, conditional=False):
+        """Write the object, and return its new etag
+
+        A conditional put fails (PreconditionFailed) if the object does not have
+        'etag' anymore, or already exists when 'etag' is None.
+        """
+        from botocore.exceptions import ClientError
+        kwargs = {}
+        if conditional:
+            kwargs = {"IfMatch": etag} if etag is not None else {"IfNoneMatch": "*"}
+        try:
+            resp = self.client.put_object(Bucket=self.bucket, Key=key, Body=body, **kwargs)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("412", "PreconditionFailed", "ConditionalRequestConflict"):
+                raise PreconditionFailed(key)
+            raise
+        return resp["ETag"]
+
+class FileBackend:
+    """Same as S3Backend, on a local directory (etag: md5 of the content)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+    @classmethod
+    def _etag(cls, body):
+        return '"%s"' % hashlib.md5(body).hexdigest()
+
+    def _read(self, key):
+        try:
+            with open(os.path.join(self.path, key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(key)
+
+    def get(self, key, etag=None):
+        body = self._read(key)
+        current = FileBackend._etag(body)
+        if etag == current:
+            return (None, etag)
+        return (body, current)
+
+    def put(self, key, body, etag=None, conditional=False):
+        fname = os.path.join(self.path, key)
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+        with self._lock:
+            if conditional:
+                try:
+                    current = FileBackend._etag(self._read(key))
+                except KeyError:
+                    current = None
+                if current != etag:
+                    raise PreconditionFailed(key)
+            (fd, tmpname) = tempfile.mkstemp(dir=os.path.dirname(fname), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(body)
+            os.replace(tmpname, fname)
+        return FileBackend._etag(body)
+
+class StateStore:
+    """Small objects of the bucket (state, holes, configuration), kept in memory
+
+    The objects are fetched concurrently. A store kept across warm invocations
+    only downloads the objects changed since (conditional GETs), and only
+    writes back the objects that changed, failing if they were updated by
+    someone else in the meantime (conditional PUTs).
+    """
+
+    def __init__(self, backend, workers=4):
+        self.backend = backend
+        self.workers = workers
+        self._lock = threading.Lock()
+        # key -> (etag, body), None for a missing object
+        self._objects = {}
+        self.stats = {"downloaded": 0, "not_modified": 0, "written": 0, "unchanged": 0}
+
+    def _count(self, counter):
+        with self._lock:
+            self.stats[counter] += 1
+
+    def _fetch(self, key):
+        with self._lock:
+            cached = self._objects.get(key)
+        try:
+            (body, etag) = self.backend.get(key, etag=cached[0] if cached is not None else None)
+        except KeyError:
+            return (key, None)
+        if body is None:
+            self._count("not_modified")
+            return (key, cached)
+        self._count("downloaded")
+        return (key, (etag, body))
+
+    def load(self, keys):
+        """Fetch the objects (concurrently), return a dict key -> body (None if missing)"""
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(keys)))) as pool:
+            objects = list(pool.map(self._fetch, keys))
+        with self._lock:
+            self._objects.update(objects)
+        log.debug("store: %s" % self.stats)
+        return {key: obj[1] if obj is not None else None for (key, obj) in objects}
+
+    def get(self, key):
+        obj = self._objects.get(key)
+        return obj[1] if obj is not None else None
+
+    def get_json(self, key, default=None):
+        body = self.get(key)
+        if body is None:
+            return default
+        try:
+            return json.loads(body)
+        except ValueError as e:
+            log.warning("ignoring invalid %s: %s" % (key, e))
+            return default
+
+    def put(self, key, body):
+        """Write back the object if it changed; returns whether it was written"""
+        obj = self._objects.get(key)
+        if obj is not None and obj[1] == body:
+            self._count("unchanged")
+            return False
+        try:
+            etag = self.backend.put(key, body, etag=obj[0] if obj is not None else None, conditional=True)
+        except PreconditionFailed:
+            # loaded again by the next load()
+            self.invalidate(key)
+            raise
+        with self._lock:
+            self._objects[key] = (etag, body)
+        self._count("written")
+        return True
+
+    def put_json(self, key, data, **kwargs):
+        return self.put(key, json.dumps(data, **kwargs).encode("utf-8"))
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._objects.clear()
+            else:
+                self._objects.pop(key, None)
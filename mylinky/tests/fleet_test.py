@@ -0,0 +1,174 @@
+import unittest
+import datetime
+import responses
+import logging
+import tempfile
+import shutil
+import os
+import pytz
+
+from urllib.parse import parse_qs
+
+from mylinky import MyLinkyConfig
+from mylinky.datedelta import datedelta
+from mylinky.enedis import TokenBucket, Series, RetryPolicy, ResponseCache
+from mylinky.exporter import SqliteExporter
+from mylinky.enedis.tests.enedis_test import hourly_callback
+from mylinky.exporter.tests.exporter_test import ListExporter
+from mylinky.fleet import Fleet, FleetState
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+def login_callback(request):
+    form = parse_qs(request.body)
+    if form["IDToken2"][0] != "strongpassword":
+        return (302, {}, "")
+    return (302, {"Set-Cookie": "iPlanetDirectoryPro=cookie-%s; Domain=testme; Path=/" % form["IDToken1"][0]}, "")
+
+class TestFleet(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.tz = pytz.timezone("Europe/Paris")
+        self.config = MyLinkyConfig().load_from_dict({
+            "enedis": {"timesheets": [["22:00", "06:00"]]},
+            "accounts": [
+                {"username": "user1", "password": "strongpassword"},
+                {"name": "home", "username": "user2", "password": "strongpassword", "timesheets": [["00:00", "06:00"]]},
+                {"username": "baduser", "password": "wrong"},
+            ]
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def testAccountsConfig(self):
+        accounts = self.config["accounts"]
+        self.assertEqual([a["name"] for a in accounts], ["user1", "home", "baduser"])
+        self.assertEqual(accounts[0]["timesheets"], [(datetime.time(22, 0), datetime.time(6, 0))])
+        self.assertEqual(accounts[1]["timesheets"], [(datetime.time(0, 0), datetime.time(6, 0))])
+
+    @responses.activate
+    def testRun(self):
+        responses.add_callback(responses.POST, "http://testme/login", callback=login_callback)
+        responses.add_callback(responses.POST, "http://testme/data", callback=hourly_callback)
+
+        exporter = ListExporter()
+        state = FleetState(os.path.join(self.path, "state.json"))
+        fleet = Fleet(self.config["accounts"], exporter, workers=3, limiter=TokenBucket(1000, 10), state=state,
+            url="http://testme/login", url2="http://testme/data")
+        endDate = self.tz.localize(datetime.datetime(2019, 1, 10))
+        results = fleet.run(endDate)
+
+        self.assertEqual([r["points"] for r in results], [48, 48, 0])
+        self.assertIsNone(results[0]["error"])
+        self.assertIsNotNone(results[2]["error"])
+        self.assertEqual(len(exporter.batches_saved), 2)
+        summary = Fleet.summary(results)
+        self.assertTrue("3 meters, 1 failed, 96 points" in summary, summary)
+
+        # the state is persisted, and the next run only fetches the new days
+        state = FleetState(os.path.join(self.path, "state.json"))
+        self.assertEqual(state.last("home", "hourly"), self.tz.localize(datetime.datetime(2019, 1, 9)))
+        fleet = Fleet(self.config["accounts"][:2], exporter, state=state, url="http://testme/login", url2="http://testme/data")
+        results = fleet.run(self.tz.localize(datetime.datetime(2019, 1, 12)))
+        self.assertEqual([r["points"] for r in results], [96, 96])
+
+    @responses.activate
+    def testSharedCache(self):
+        def callback(request):
+            # each account has its own readings
+            (status, headers, body) = hourly_callback(request)
+            return (status, headers, body.replace('"valeur": 1.0', '"valeur": %d.0' % (2 if "cookie-user2" in request.headers.get("Cookie", "") else 1)))
+        def login(request):
+            # a host-only cookie, sent back with the data requests
+            return (302, {"Set-Cookie": "iPlanetDirectoryPro=cookie-%s; Path=/" % parse_qs(request.body)["IDToken1"][0]}, "")
+        responses.add_callback(responses.POST, "http://testme/login", callback=login)
+        responses.add_callback(responses.POST, "http://testme/data", callback=callback)
+
+        exporter = SqliteExporter(os.path.join(self.path, "mylinky.db"))
+        fleet = Fleet(self.config["accounts"][:2], exporter, workers=1, cache=ResponseCache(os.path.join(self.path, "cache")),
+            url="http://testme/login", url2="http://testme/data")
+        results = fleet.run(self.tz.localize(datetime.datetime(2019, 1, 10)))
+        self.assertEqual([r["points"] for r in results], [48, 48])
+        self.assertEqual(len([c for c in responses.calls if c.request.url.startswith("http://testme/data")]), 2)
+        self.assertEqual(exporter.conn.execute("SELECT meter, SUM(value) FROM readings GROUP BY meter ORDER BY meter").fetchall(),
+            [("home", 96.0), ("user1", 48.0)])
+        exporter.close()
+
+    @responses.activate
+    def testWatermark(self):
+        responses.add_callback(responses.POST, "http://testme/login", callback=login_callback)
+        responses.add_callback(responses.POST, "http://testme/data", callback=hourly_callback)
+
+        exporter = SqliteExporter(os.path.join(self.path, "mylinky.db"))
+        self.assertEqual(Fleet.since(exporter, None, "hourly", "home"), (None, None))
+        fleet = Fleet(self.config["accounts"][1:2], exporter, url="http://testme/login", url2="http://testme/data")
+        fleet.run(self.tz.localize(datetime.datetime(2019, 1, 10)))
+
+        # the day of the last reading is fetched again, and only what follows is exported
+        (startDate, watermark) = Fleet.since(exporter, None, "hourly", "home")
+        self.assertEqual(startDate, self.tz.localize(datetime.datetime(2019, 1, 9)))
+        self.assertEqual(watermark, self.tz.localize(datetime.datetime(2019, 1, 9, 23, 30)))
+        results = fleet.run(self.tz.localize(datetime.datetime(2019, 1, 12)))
+        self.assertEqual(results[0]["points"], 96)
+        self.assertEqual(exporter.conn.execute("SELECT COUNT(*) FROM readings").fetchone()[0], 3*48)
+        exporter.close()
+
+        # without watermark, the state is used
+        state = FleetState(None)
+        state.update("home", "hourly", self.tz.localize(datetime.datetime(2019, 1, 9, 23, 30)))
+        self.assertEqual(Fleet.since(ListExporter(), state, "hourly", "home"), (self.tz.localize(datetime.datetime(2019, 1, 10)), None))
+
+    @responses.activate
+    def testFailedWindow(self):
+        failing = {"ok": False}
+        def callback(request):
+            # the second window fails (after its retries) the first time
+            if not failing["ok"] and parse_qs(request.body)["_lincspartdisplaycdc_WAR_lincspartcdcportlet_dateDebut"] == ["08/01/2019"]:
+                return (500, {}, "")
+            return hourly_callback(request)
+        responses.add_callback(responses.POST, "http://testme/login", callback=login_callback)
+        responses.add_callback(responses.POST, "http://testme/data", callback=callback)
+
+        exporter = SqliteExporter(os.path.join(self.path, "mylinky.db"))
+        state = FleetState(os.path.join(self.path, "state.json"))
+        fleet = Fleet(self.config["accounts"][1:2], exporter, state=state, url="http://testme/login", url2="http://testme/data", retry=RetryPolicy(retries=0))
+        results = fleet.run(self.tz.localize(datetime.datetime(2019, 1, 22)), delta=datedelta(days=21))
+        self.assertIsNotNone(results[0]["error"])
+        self.assertEqual(results[0]["points"], 14*48)
+        # the last day is past the failed window, kept to be fetched again
+        self.assertEqual(state.last("home", "hourly"), self.tz.localize(datetime.datetime(2019, 1, 21)))
+        window = (self.tz.localize(datetime.datetime(2019, 1, 8)), self.tz.localize(datetime.datetime(2019, 1, 15)))
+        self.assertEqual(FleetState(state.fname).failed("home", "hourly"), [window])
+
+        failing["ok"] = True
+        results = fleet.run(self.tz.localize(datetime.datetime(2019, 1, 22)))
+        self.assertIsNone(results[0]["error"])
+        self.assertEqual(results[0]["points"], 7*48)
+        self.assertEqual(exporter.conn.execute("SELECT COUNT(*) FROM readings").fetchone()[0], 21*48)
+        self.assertEqual(state.failed("home", "hourly"), [])
+        self.assertEqual(state.last("home", "hourly"), self.tz.localize(datetime.datetime(2019, 1, 21)))
+        exporter.close()
+
+    @responses.activate
+    def testNoExporter(self):
+        responses.add_callback(responses.POST, "http://testme/login", callback=login_callback)
+        responses.add_callback(responses.POST, "http://testme/data", callback=hourly_callback)
+
+        fleet = Fleet(self.config["accounts"][1:2], None, url="http://testme/login", url2="http://testme/data")
+        results = fleet.run(self.tz.localize(datetime.datetime(2019, 1, 10)))
+        self.assertIsNone(results[0]["error"])
+        self.assertEqual(results[0]["points"], 48)
+
+    def testAfter(self):
+        start = self.tz.localize(datetime.datetime(2019, 1, 9))
+        series = Series(dates=[int(start.timestamp()) + 1800*i for i in range(6)], durations=[1800.0]*6, values=[1.0]*6)
+        batches = list(Fleet.after([series[:3], Series(), series[3:]], self.tz.localize(datetime.datetime(2019, 1, 9, 1, 0))))
+        self.assertEqual([len(b) for b in batches], [3])
+        self.assertEqual([len(b) for b in Fleet.after([series[:3], series[3:]])], [3, 3])
+
+if __name__ == "__main__":
+    unittest.main()
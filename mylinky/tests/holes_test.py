@@ -0,0 +1,128 @@
+import unittest
+import logging
+import datetime
+import threading
+import pytz
+
+from mylinky.datedelta import datedelta
+from mylinky.enedis import Series
+from mylinky.holes import IntervalSet, Backfill
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+TZ = pytz.timezone("Europe/Paris")
+
+def day(d, month=3):
+    return TZ.localize(datetime.datetime(2019, month, d))
+
+class FakeEnedis:
+    """Half-hourly readings, only from 'available' on"""
+
+    def __init__(self, available=None, fail=()):
+        self.available = available
+        self.fail = fail
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def getdata(self, kind, startDate, endDate):
+        with self._lock:
+            self.calls.append((startDate, endDate))
+        if startDate in self.fail:
+            raise ValueError("failed")
+        data = Series()
+        begin = max(startDate, self.available) if self.available is not None else startDate
+        t = int(begin.timestamp())
+        while t < endDate.timestamp():
+            data.append(t, 1800, 1.0)
+            t += 1800
+        return data
+
+class TestIntervalSet(unittest.TestCase):
+
+    def testAdd(self):
+        holes = IntervalSet()
+        holes.add(day(10), day(12))
+        holes.add(day(1), day(3))
+        holes.add(day(20), day(21))
+        self.assertEqual(list(holes), [(day(1), day(3)), (day(10), day(12)), (day(20), day(21))])
+
+        # overlapping and adjacent intervals are merged
+        holes.add(day(2), day(10))
+        self.assertEqual(list(holes), [(day(1), day(12)), (day(20), day(21))])
+        holes.add(day(21), day(22))
+        self.assertEqual(list(holes), [(day(1), day(12)), (day(20), day(22))])
+        holes.add(day(5), day(6))
+        self.assertEqual(len(holes), 2)
+        holes.add(day(1), day(25))
+        self.assertEqual(list(holes), [(day(1), day(25))])
+
+        # empty
+        holes.add(day(26), day(26))
+        self.assertEqual(len(holes), 1)
+
+    def testRemove(self):
+        holes = IntervalSet([(day(1), day(10)), (day(15), day(20))])
+        holes.remove(day(5), day(6))
+        self.assertEqual(list(holes), [(day(1), day(5)), (day(6), day(10)), (day(15), day(20))])
+        holes.remove(day(8), day(16))
+        self.assertEqual(list(holes), [(day(1), day(5)), (day(6), day(8)), (day(16), day(20))])
+        holes.remove(day(10), day(12))
+        self.assertEqual(len(holes), 3)
+        holes.remove(day(1), day(20))
+        self.assertEqual(list(holes), [])
+        self.assertEqual(holes.total(), datetime.timedelta())
+
+    def testJson(self):
+        holes = IntervalSet([(day(1), day(10)), (day(5), day(12, month=4))])
+        self.assertEqual(holes.to_json(), [{"start": "2019-03-01T00:00:00+01:00", "end": "2019-04-12T00:00:00+02:00"}])
+        self.assertEqual(IntervalSet.from_json(holes.to_json()), holes)
+        # the entries written by the previous versions, with duplicates
+        old = [{"start": "2019-03-01T00:00:00+01:00", "end": "2019-03-04T00:00:00+01:00"}] * 2
+        self.assertEqual(list(IntervalSet.from_json(old)), [(day(1), day(4))])
+
+class TestBackfill(unittest.TestCase):
+
+    def testPriority(self):
+        holes = IntervalSet([(day(1), day(15)), (day(20), day(22))])
+        exported = []
+        enedis = FakeEnedis()
+        result = Backfill(enedis, holes, lambda window, data: exported.append(window), workers=1).run(day(25))
+        self.assertEqual(result, {"windows": 3, "points": 16*48, "failed": 0})
+        # most recent first
+        self.assertEqual(enedis.calls[0], (day(20), day(22)))
+        self.assertEqual(enedis.calls[1], (day(8), day(15)))
+        self.assertEqual(len(holes), 0)
+
+    def testPartial(self):
+        # the beginning of the hole is still not available
+        holes = IntervalSet([(day(1), day(5))])
+        enedis = FakeEnedis(available=day(3))
+        Backfill(enedis, holes, lambda window, data: None).run(day(10))
+        self.assertEqual(list(holes), [(day(1), day(3))])
+
+        enedis = FakeEnedis(fail=(day(1),))
+        result = Backfill(enedis, holes, lambda window, data: None).run(day(10))
+        self.assertEqual(result["failed"], 1)
+        self.assertEqual(list(holes), [(day(1), day(3))])
+
+    def testBudget(self):
+        holes = IntervalSet([(day(1), day(29))])
+        left = [100]
+        def export(window, data):
+            left[0] -= 40
+        enedis = FakeEnedis()
+        result = Backfill(enedis, holes, export, workers=1, margin=30).run(day(29), lambda: left[0])
+        self.assertEqual(result["windows"], 2)
+        self.assertEqual(list(holes), [(day(1), day(15))])
+
+    def testRetention(self):
+        holes = IntervalSet([(day(1), day(10))])
+        enedis = FakeEnedis()
+        Backfill(enedis, holes, lambda window, data: None, retention=datedelta(days=30)).run(day(5, month=4))
+        self.assertEqual(enedis.calls, [(day(6), day(10))])
+        self.assertEqual(len(holes), 0)
+
+if __name__ == "__main__":
+    unittest.main()
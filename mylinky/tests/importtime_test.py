@@ -0,0 +1,39 @@
+import unittest
+import subprocess
+import logging
+import json
+import sys
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+# only imported when actually used
+LAZY = ["pkg_resources", "influxdb", "boto3", "aiohttp", "requests_toolbelt", "yaml", "pprint", "numpy", "pandas",
+    "pyarrow", "zstandard", "mylinky.exporter.influxdb", "mylinky.exporter.csv", "mylinky.exporter.stdout",
+    "mylinky.exporter.parquet", "mylinky.exporter.sqlite", "mylinky.enedis.async_enedis"]
+
+class TestImportTime(unittest.TestCase):
+
+    def modules(self, code):
+        """Modules loaded by 'code', run in a new interpreter"""
+        code = "import sys, json\n%s\nprint(json.dumps(sorted(sys.modules)))" % code
+        return json.loads(subprocess.check_output([sys.executable, "-c", code]).decode().splitlines()[-1])
+
+    def check(self, modules, what):
+        for name in LAZY:
+            self.assertFalse(name in modules, "%s imports %s" % (what, name))
+
+    def testMain(self):
+        self.check(self.modules("import mylinky.main"), "mylinky.main")
+
+    def testMainArguments(self):
+        # the command line is parsed (here, rejected) without loading any exporter
+        code = "from mylinky.main import main\nsys.argv = ['mylinky', '--type', 'none', 'influxdb']\ntry:\n    main()\nexcept SystemExit:\n    pass"
+        self.check(self.modules(code), "the arguments parsing")
+
+    def testEntrypoint(self):
+        self.check(self.modules("import mylinky.entrypoint"), "mylinky.entrypoint")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import datetime
+import responses
+import logging
+import tempfile
+import shutil
+import sys
+import os
+import csv
+import json
+
+from unittest import mock
+
+from mylinky.enedis import Data
+from mylinky.enedis.login import Login
+from mylinky.enedis.tests.enedis_test import hourly_callback
+from mylinky.main import main
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+class TestMain(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def run_main(self, *args):
+        with mock.patch.object(sys, "argv", ["mylinky"]):
+            return main(list(args))
+
+    @responses.activate
+    def testIncrementalCsv(self):
+        responses.add(responses.POST, Login.URL, status=302, headers={"Set-Cookie": "iPlanetDirectoryPro=cookie; Domain=.enedis.fr; Path=/"})
+        responses.add_callback(responses.POST, Data.URL, callback=hourly_callback)
+
+        fname = os.path.join(self.path, "linky.csv")
+        common = ["-u", "user", "-p", "password", "--state", os.path.join(self.path, "state.json"), "--incremental"]
+        self.assertEqual(self.run_main(*common, "--from", "01/01/2019", "--to", "03/01/2019", "csv", "--filename", fname), 0)
+        # the default mode ('w') does not truncate what the first run wrote
+        self.assertEqual(self.run_main(*common, "--to", "05/01/2019", "csv", "--filename", fname), 0)
+
+        with open(fname) as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ["date", "duration", "value", "type"])
+        self.assertEqual(len(rows), 1 + 4*48)
+        self.assertEqual(datetime.datetime.fromisoformat(rows[1][0]).date(), datetime.date(2019, 1, 1))
+        self.assertEqual(datetime.datetime.fromisoformat(rows[-1][0]).date(), datetime.date(2019, 1, 4))
+
+    @responses.activate
+    def testRollupWithoutExporter(self):
+        responses.add(responses.POST, Login.URL, status=302, headers={"Set-Cookie": "iPlanetDirectoryPro=cookie; Domain=.enedis.fr; Path=/"})
+        responses.add_callback(responses.POST, Data.URL, callback=hourly_callback)
+
+        fname = os.path.join(self.path, "rollup.json")
+        self.assertEqual(self.run_main("-u", "user", "-p", "password", "--from", "01/01/2019", "--to", "03/01/2019", "--rollup", fname), 0)
+        with open(fname) as f:
+            self.assertEqual(sorted(json.load(f)), ["2019-01-01", "2019-01-02"])
+
+if __name__ == "__main__":
+    unittest.main()
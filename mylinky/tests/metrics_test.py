@@ -0,0 +1,95 @@
+import unittest
+import datetime
+import responses
+import logging
+import tempfile
+import shutil
+import json
+import os
+import pytz
+
+from unittest import mock
+
+from mylinky.metrics import Metrics
+from mylinky.enedis import Enedis
+from mylinky.exporter.tests.exporter_test import ListExporter
+from mylinky.enedis.tests.enedis_test import hourly_callback
+from mylinky.tests.fleet_test import login_callback
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.tz = pytz.timezone("Europe/Paris")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def testDisabled(self):
+        m = Metrics(enabled=False)
+        m.incr("points", 10)
+        m.gauge("limit", 2)
+        with m.timer("query"):
+            pass
+        self.assertEqual(m.snapshot(), {"counters": {}, "gauges": {}, "timers": {}})
+
+    def testReports(self):
+        m = Metrics()
+        m.incr("points", 10)
+        m.incr("points", 5)
+        m.gauge("limit", 2)
+        with m.timer("query"):
+            pass
+        m.observe("query", 1.5)
+
+        snapshot = json.loads(m.report())
+        self.assertEqual(snapshot["counters"], {"points": 15})
+        self.assertEqual(snapshot["gauges"], {"limit": 2})
+        self.assertEqual(snapshot["timers"]["query"]["count"], 2)
+        self.assertGreaterEqual(snapshot["timers"]["query"]["seconds"], 1.5)
+
+        lines = m.prometheus().splitlines()
+        self.assertIn("# TYPE mylinky_points_total counter", lines)
+        self.assertIn("mylinky_points_total 15", lines)
+        self.assertIn("mylinky_limit 2", lines)
+        self.assertIn("mylinky_query_seconds_count 2", lines)
+
+        m.write(os.path.join(self.path, "metrics.prom"))
+        with open(os.path.join(self.path, "metrics.prom")) as f:
+            self.assertEqual(f.read(), m.prometheus())
+
+    @responses.activate
+    def testStages(self):
+        responses.add_callback(responses.POST, "http://testme/login", callback=login_callback)
+        responses.add_callback(responses.POST, "http://testme/data", callback=hourly_callback)
+
+        metrics = Metrics()
+        e = Enedis(url="http://testme/login", url2="http://testme/data", workers=2, metrics=metrics)
+        exporter = ListExporter()
+        exporter.metrics = metrics
+
+        # the responses are not dumped when the debug logs are disabled
+        logging.getLogger().setLevel(logging.INFO)
+        try:
+            with mock.patch("requests_toolbelt.utils.dump.dump_response") as dump_response:
+                e.login("testuser", "strongpassword")
+                exporter.save_data("hourly", e.getdata("hourly", stream=True,
+                    startDate=self.tz.localize(datetime.datetime(2019, 1, 1)),
+                    endDate=self.tz.localize(datetime.datetime(2019, 1, 10))))
+        finally:
+            logging.getLogger().setLevel(logging.DEBUG)
+        dump_response.assert_not_called()
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(sorted(snapshot["timers"].keys()), ["decode", "export", "login", "query", "transform"])
+        self.assertEqual(snapshot["timers"]["query"]["count"], 2)
+        self.assertEqual(snapshot["counters"]["points"], 9*48)
+        self.assertEqual(snapshot["counters"]["exported"], 9*48)
+        self.assertGreater(snapshot["counters"]["bytes"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+import logging
+import datetime
+import io
+import pytz
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from mylinky.enedis import Series, Timesheet
+from mylinky.exporter import CostExporter
+from mylinky.pricing import Tariff, TariffHistory, Pricing
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+TZ = pytz.timezone("Europe/Paris")
+
+def hourly(start, days, value=1.0):
+    """Half-hourly readings of 'value' kW, HC from 22:00 to 6:00"""
+    begin = int(TZ.localize(datetime.datetime.combine(start, datetime.time())).timestamp())
+    stop = int(TZ.localize(datetime.datetime.combine(start + datetime.timedelta(days=days), datetime.time())).timestamp())
+    count = (stop - begin) // 1800
+    series = Series(dates=range(begin, stop, 1800), durations=[1800.0] * count, values=[value] * count)
+    return Timesheet([(datetime.time(22, 0), datetime.time(6, 0))]).classify(series)
+
+class TestPricing(unittest.TestCase):
+
+    def setUp(self):
+        self.base = TariffHistory([Tariff(datetime.date(2019, 1, 1), 0.15, subscription=365.0)], name="base")
+        self.hphc = TariffHistory.from_list([
+            {"start": "2019-01-01", "prices": {"creuse": 0.10, "pleine": 0.20}},
+            {"start": "2019-02-01", "prices": {"creuse": 0.12, "pleine": 0.24}},
+        ], name="hphc")
+        self.tempo = TariffHistory([Tariff(datetime.date(2019, 1, 1), {
+            "bleu": {"creuse": 0.10, "pleine": 0.12},
+            "blanc": {"creuse": 0.12, "pleine": 0.15},
+            "rouge": {"creuse": 0.15, "pleine": 0.50}})], name="tempo")
+
+    def pricings(self, series, **kwargs):
+        pricings = [Pricing(series, numpy=False, **kwargs)]
+        if numpy is not None:
+            pricings.append(Pricing(series, numpy=True, **kwargs))
+        return pricings
+
+    def testTariff(self):
+        self.assertEqual(self.base.at(datetime.date(2019, 5, 1)).price("creuse"), 0.15)
+        tariff = self.hphc.at(datetime.date(2019, 2, 1))
+        self.assertEqual((tariff.price("creuse"), tariff.price("pleine"), tariff.price("normale")), (0.12, 0.24, 0.24))
+        self.assertEqual(self.hphc.at(datetime.date(2019, 1, 31)).price("creuse", "rouge"), 0.10)
+        self.assertEqual(self.tempo.tariffs[0].price("pleine", "rouge"), 0.50)
+        with self.assertRaises(ValueError):
+            self.hphc.at(datetime.date(2018, 12, 31))
+
+    def testCost(self):
+        # a day on each tariff of the history
+        series = Series.concat([hourly(datetime.date(2019, 1, 31), 1), hourly(datetime.date(2019, 2, 1), 1)])
+        for pricing in self.pricings(series):
+            cost = pricing.cost(self.hphc)
+            self.assertEqual(cost.energy, (0.0, 16.0, 32.0))
+            self.assertAlmostEqual(cost.total, 8*0.10 + 16*0.20 + 8*0.12 + 16*0.24)
+
+            cost = pricing.cost(self.base)
+            self.assertAlmostEqual(sum(cost.cost), 48*0.15)
+            self.assertAlmostEqual(cost.subscription, 2.0)
+
+    def testTempo(self):
+        # the red day runs from 6:00 on the 10th to 6:00 on the 11th
+        series = hourly(datetime.date(2019, 1, 10), 2)
+        for pricing in self.pricings(series, colours={"2019-01-10": "rouge"}):
+            cost = pricing.cost(self.tempo)
+            # HC: 10th 0-6 blue, 10th 22-24 + 11th 0-6 red, 11th 22-24 blue
+            self.assertAlmostEqual(cost.cost[1], (6 + 2)*0.10 + 8*0.15)
+            self.assertAlmostEqual(cost.cost[2], 16*0.50 + 16*0.12)
+            prices = pricing.prices(self.tempo)
+            self.assertAlmostEqual(prices[11], 0.10)
+            self.assertAlmostEqual(prices[12], 0.50)
+            self.assertAlmostEqual(prices[48+11], 0.15)
+            self.assertAlmostEqual(prices[48+12], 0.12)
+
+    def testDST(self):
+        # 23 hours, on the local date of the readings
+        series = hourly(datetime.date(2019, 3, 31), 1)
+        self.assertEqual(len(series), 46)
+        for pricing in self.pricings(series):
+            self.assertEqual(pricing.days, [datetime.date(2019, 3, 31)])
+            self.assertAlmostEqual(sum(pricing.cost(self.base).energy), 23.0)
+
+    def testCompare(self):
+        series = hourly(datetime.date(2019, 1, 1), 60)
+        for pricing in self.pricings(series, colours={datetime.date(2019, 1, 2): "rouge"}):
+            costs = pricing.compare({"base": self.base, "hphc": self.hphc, "tempo": self.tempo})
+            self.assertEqual(list(costs.keys()), ["tempo", "hphc", "base"])
+            self.assertTrue(costs["tempo"].total < costs["hphc"].total < costs["base"].total)
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def testNumpy(self):
+        series = hourly(datetime.date(2019, 1, 1), 365, value=1.3)
+        colours = {datetime.date(2019, 1, d): "rouge" for d in range(1, 20)}
+        (python, vectorized) = (Pricing(series, colours=colours, numpy=False), Pricing(series, colours=colours, numpy=True))
+        for history in (self.base, self.hphc, self.tempo):
+            self.assertEqual(list(python.prices(history)), vectorized.prices(history).tolist())
+            for (a, b) in zip(python.cost(history), vectorized.cost(history)):
+                self.assertEqual(numpy.round(a, 6).tolist(), numpy.round(b, 6).tolist())
+
+    def testExporter(self):
+        stream = io.StringIO()
+        exporter = CostExporter.from_config({"tariffs": [
+            {"name": "base", "tariffs": [{"start": "2019-01-01", "prices": 0.15}]},
+            {"name": "hphc", "tariffs": [{"start": "2019-01-01", "prices": {"creuse": 0.10, "pleine": 0.20}}]}], "colours": None}, stream=stream)
+        self.assertEqual(exporter.save_data("hourly", iter([hourly(datetime.date(2019, 1, 1), 1), hourly(datetime.date(2019, 1, 2), 1)])), 96)
+        lines = stream.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith("base "), lines)
+        self.assertIn("7.20", lines[0])
+        self.assertTrue(lines[1].startswith("hphc "), lines)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+import logging
+import datetime
+import tempfile
+import shutil
+import os
+import pytz
+
+from mylinky.enedis import Series, Timesheet
+from mylinky.rollup import Rollup
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+TZ = pytz.timezone("Europe/Paris")
+
+def hourly(start, end, value=1.0, timesheet=None):
+    """Half-hourly readings of 'value' kW, on [start, end) (local dates)"""
+    begin = int(TZ.localize(datetime.datetime.combine(start, datetime.time())).timestamp())
+    stop = int(TZ.localize(datetime.datetime.combine(end, datetime.time())).timestamp())
+    series = Series(dates=range(begin, stop, 1800), durations=[1800.0] * ((stop-begin)//1800), values=[value] * ((stop-begin)//1800))
+    if timesheet is not None:
+        Timesheet(timesheet).classify(series)
+    return series
+
+class TestRollup(unittest.TestCase):
+
+    def testDaily(self):
+        rollup = Rollup()
+        rollup.add(hourly(datetime.date(2019, 3, 30), datetime.date(2019, 4, 1)))
+        buckets = rollup.buckets("daily", TZ.localize(datetime.datetime(2019, 3, 30)), TZ.localize(datetime.datetime(2019, 4, 1)))
+        # DST: the 31th has 23 hours
+        self.assertEqual([b.length for b in buckets], [86400, 82800])
+        self.assertEqual([b.total for b in buckets], [24.0, 23.0])
+        self.assertTrue(all(b.complete for b in buckets))
+
+        rollup.add(hourly(datetime.date(2019, 10, 27), datetime.date(2019, 10, 28)))
+        (bucket,) = rollup.buckets("daily", TZ.localize(datetime.datetime(2019, 10, 27)), TZ.localize(datetime.datetime(2019, 10, 28)))
+        self.assertEqual((bucket.length, bucket.total, bucket.complete), (90000, 25.0, True))
+
+    def testPeriods(self):
+        rollup = Rollup()
+        rollup.add(hourly(datetime.date(2019, 1, 1), datetime.date(2020, 1, 1), value=2.0))
+        start = TZ.localize(datetime.datetime(2019, 1, 1))
+        end = TZ.localize(datetime.datetime(2020, 1, 1))
+
+        months = rollup.buckets("monthly", start, end)
+        self.assertEqual(len(months), 12)
+        self.assertEqual(months[2].total, 2.0 * (31*24 - 1))
+        self.assertEqual(months[9].total, 2.0 * (31*24 + 1))
+        self.assertTrue(rollup.covers("monthly", start, end))
+        (year,) = rollup.buckets("yearly", start, end)
+        self.assertEqual(year.total, 2.0 * 365 * 24)
+
+        # weeks start on monday: the first one (from 31/12/2018) is incomplete
+        weeks = rollup.buckets("weekly", start, end)
+        self.assertEqual(weeks[0].start, TZ.localize(datetime.datetime(2018, 12, 31)))
+        self.assertFalse(weeks[0].complete)
+        self.assertTrue(weeks[1].complete)
+        self.assertFalse(rollup.covers("weekly", start, end))
+        self.assertFalse(rollup.covers("yearly", start, TZ.localize(datetime.datetime(2020, 2, 1))))
+
+    def testSplit(self):
+        rollup = Rollup()
+        rollup.add(hourly(datetime.date(2019, 11, 1), datetime.date(2019, 12, 1), timesheet=[(datetime.time(22, 0), datetime.time(6, 0))]))
+        data = rollup.series("monthly", TZ.localize(datetime.datetime(2019, 11, 1)), TZ.localize(datetime.datetime(2019, 12, 1)), split=True)
+        self.assertEqual([(r["type"], r["value"]) for r in data], [("creuse", 30*8.0), ("pleine", 30*16.0)])
+
+        data = rollup.series("monthly", TZ.localize(datetime.datetime(2019, 11, 1)), TZ.localize(datetime.datetime(2019, 12, 1)))
+        self.assertEqual(list(data), [{"date": TZ.localize(datetime.datetime(2019, 11, 1)), "duration": 30*86400.0, "value": 720.0}])
+
+    def testIncremental(self):
+        rollup = Rollup()
+        rollup.add(hourly(datetime.date(2019, 11, 1), datetime.date(2019, 11, 20)))
+        start = TZ.localize(datetime.datetime(2019, 11, 1))
+        end = TZ.localize(datetime.datetime(2019, 12, 1))
+        self.assertFalse(rollup.covers("monthly", start, end))
+        self.assertEqual(rollup.buckets("monthly", start, end)[0].total, 19*24.0)
+
+        # overlapping days replace the previous readings, and only the buckets of the new days are computed again
+        self.assertEqual(rollup.add(hourly(datetime.date(2019, 11, 19), datetime.date(2019, 12, 1), value=2.0)),
+            {datetime.date(2019, 11, d) for d in range(19, 31)})
+        self.assertEqual(rollup._dirty["monthly"], {datetime.date(2019, 11, 1)})
+        self.assertTrue(rollup.covers("monthly", start, end))
+        self.assertEqual(rollup.buckets("monthly", start, end)[0].total, 18*24.0 + 12*48.0)
+        self.assertEqual(rollup._dirty["monthly"], set())
+
+    def testSave(self):
+        path = tempfile.mkdtemp()
+        try:
+            fname = os.path.join(path, "rollup.json")
+            self.assertEqual(Rollup.load(fname).days, {})
+            rollup = Rollup()
+            rollup.add(hourly(datetime.date(2019, 10, 26), datetime.date(2019, 10, 28), timesheet=[(datetime.time(22, 0), datetime.time(6, 0))]))
+            rollup.save(fname)
+            start = TZ.localize(datetime.datetime(2019, 10, 26))
+            end = TZ.localize(datetime.datetime(2019, 10, 28))
+            self.assertEqual(Rollup.load(fname).buckets("daily", start, end), rollup.buckets("daily", start, end))
+        finally:
+            shutil.rmtree(path)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,254 @@
+import unittest
+import responses
+import logging
+import tempfile
+import shutil
+import datetime
+import json
+import os
+
+from unittest import mock
+from urllib.parse import parse_qs
+
+from mylinky import entrypoint
+from mylinky.enedis import Login, Data
+from mylinky.warm import WarmCache
+from mylinky.store import StateStore, FileBackend, PreconditionFailed
+from mylinky.enedis.tests.enedis_test import hourly_callback
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+class CountingBackend(FileBackend):
+    def __init__(self, path):
+        super().__init__(path)
+        self.gets = []
+        self.puts = []
+
+    def get(self, key, etag=None):
+        self.gets.append((key, etag))
+        return super().get(key, etag)
+
+    def put(self, key, body, etag=None, conditional=False):
+        self.puts.append(key)
+        return super().put(key, body, etag, conditional)
+
+class ConflictingBackend(FileBackend):
+    """holes.json is written by another invocation (one of 'holes') before the next writes"""
+    def __init__(self, path, holes):
+        super().__init__(path)
+        self.holes = holes
+
+    def put(self, key, body, etag=None, conditional=False):
+        if key == "holes.json" and self.holes:
+            super().put(key, json.dumps(self.holes.pop(0)).encode("utf-8"))
+        return super().put(key, body, etag, conditional)
+
+class TestStore(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        with open(os.path.join(self.path, "state.json"), "w") as f:
+            json.dump({"hourly": {"last": "01/01/2019"}}, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def testConditionalGet(self):
+        backend = CountingBackend(self.path)
+        store = StateStore(backend)
+        objects = store.load(["state.json", "holes.json"])
+        self.assertEqual(objects["holes.json"], None)
+        self.assertEqual(store.get_json("state.json"), {"hourly": {"last": "01/01/2019"}})
+        self.assertEqual(store.get_json("holes.json", []), [])
+
+        # warm: the etag of the cached object is sent, and it is not downloaded again
+        store.load(["state.json"])
+        self.assertEqual(backend.gets[-1][0], "state.json")
+        self.assertIsNotNone(backend.gets[-1][1])
+        self.assertEqual(store.stats["downloaded"], 1)
+        self.assertEqual(store.stats["not_modified"], 1)
+        self.assertEqual(store.get_json("state.json"), {"hourly": {"last": "01/01/2019"}})
+
+        # changed by someone else
+        FileBackend(self.path).put("state.json", b'{"hourly": {}}')
+        store.load(["state.json"])
+        self.assertEqual(store.get_json("state.json"), {"hourly": {}})
+        self.assertEqual(store.stats["downloaded"], 2)
+
+    def testConditionalPut(self):
+        backend = CountingBackend(self.path)
+        store = StateStore(backend)
+        store.load(["state.json", "holes.json"])
+
+        # unchanged: not written
+        self.assertFalse(store.put("state.json", store.get("state.json")))
+        self.assertTrue(store.put_json("holes.json", [{"start": "a", "end": "b"}]))
+        self.assertEqual(backend.puts, ["holes.json"])
+        self.assertTrue(store.put_json("state.json", {"hourly": {"last": "02/01/2019"}}))
+
+        # lost update
+        other = StateStore(FileBackend(self.path))
+        other.load(["state.json"])
+        other.put_json("state.json", {"hourly": {"last": "03/01/2019"}})
+        with self.assertRaises(PreconditionFailed):
+            store.put_json("state.json", {"hourly": {"last": "04/01/2019"}})
+        store.load(["state.json"])
+        self.assertEqual(store.get_json("state.json"), {"hourly": {"last": "03/01/2019"}})
+
+        # created meanwhile
+        store = StateStore(FileBackend(self.path))
+        store.load(["new.json"])
+        other.put_json("new.json", {})
+        with self.assertRaises(PreconditionFailed):
+            store.put_json("new.json", {"a": 1})
+
+class TestEntrypoint(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.bucket = os.path.join(self.path, "bucket")
+        os.makedirs(self.bucket)
+        with open(os.path.join(self.bucket, "creds.json"), "w") as f:
+            json.dump({"username": "testuser", "password": "strongpassword"}, f)
+        with open(os.path.join(self.bucket, "config.yml"), "w") as f:
+            f.write("cache:\n  path: %s\nenedis:\n  session-cache: %s\n" % (os.path.join(self.path, "cache"), os.path.join(self.path, "sessions")))
+        entrypoint.STORE = None
+        entrypoint.WARM = WarmCache()
+
+    def tearDown(self):
+        entrypoint.STORE = None
+        entrypoint.WARM = WarmCache()
+        shutil.rmtree(self.path)
+
+    @responses.activate
+    def testRun(self):
+        responses.add(responses.POST, Login.URL, status=302,
+            headers={"Set-Cookie": "iPlanetDirectoryPro=cookie-testuser; Domain=enedis.fr; Path=/"})
+        responses.add_callback(responses.POST, Data.URL, callback=hourly_callback)
+
+        last = (datetime.datetime.now() - datetime.timedelta(days=10)).strftime("%d/%m/%Y")
+        with mock.patch.dict(os.environ, {"STORE_PATH": self.bucket, "PASSWORD_TYPE": "s3:clear"}):
+            response = entrypoint.run({"state": {"hourly": {"last": last}}}, None)
+            self.assertNotIn("error", response[-1])
+            with open(os.path.join(self.bucket, "state.json")) as f:
+                state = json.load(f)
+            self.assertNotEqual(state["hourly"]["last"], last)
+            self.assertTrue(os.path.isdir(os.path.join(self.bucket, "hourly")))
+
+            # warm invocation: nothing new, the objects are not downloaded nor written again
+            backend = entrypoint.STORE.backend
+            with mock.patch.object(backend, "put", wraps=backend.put) as put:
+                response = entrypoint.run({}, None)
+                self.assertIn("error", response[0])
+                put.assert_not_called()
+            # state, holes, config and creds
+            self.assertEqual(entrypoint.STORE.stats["not_modified"], 4)
+
+            # the credentials, configuration and logged-in client are reused
+            self.assertEqual(len([c for c in responses.calls if c.request.url == Login.URL]), 1)
+            self.assertEqual(entrypoint.WARM.stats["hits"], 3)
+
+            # a new configuration: a new client (the session is reused from the session cache)
+            with open(os.path.join(self.bucket, "config.yml"), "a") as f:
+                f.write("http:\n  timeout: 10\n")
+            entrypoint.run({}, None)
+            self.assertEqual(entrypoint.WARM.stats["misses"], 5)
+            self.assertEqual(len([c for c in responses.calls if c.request.url == Login.URL]), 1)
+
+    @responses.activate
+    def testBackfill(self):
+        responses.add(responses.POST, Login.URL, status=302,
+            headers={"Set-Cookie": "iPlanetDirectoryPro=cookie-testuser; Domain=enedis.fr; Path=/"})
+        responses.add_callback(responses.POST, Data.URL, callback=hourly_callback)
+
+        today = datetime.date.today()
+        hole = (today - datetime.timedelta(days=40), today - datetime.timedelta(days=30))
+        with open(os.path.join(self.bucket, "holes.json"), "w") as f:
+            json.dump([{"start": "%sT00:00:00+01:00" % d.isoformat(), "end": "%sT00:00:00+01:00" % d.isoformat()} for d in hole] +
+                [{"start": "%sT00:00:00+01:00" % hole[0].isoformat(), "end": "%sT00:00:00+01:00" % hole[1].isoformat()}], f)
+
+        last = (today - datetime.timedelta(days=2)).strftime("%d/%m/%Y")
+        with mock.patch.dict(os.environ, {"STORE_PATH": self.bucket, "PASSWORD_TYPE": "s3:clear"}):
+            response = entrypoint.run({"state": {"hourly": {"last": last}}}, None)
+        self.assertEqual(response[-1]["backfill"]["windows"], 2)
+        with open(os.path.join(self.bucket, "holes.json")) as f:
+            self.assertEqual(json.load(f), [])
+        self.assertEqual(len([f for f in os.listdir(os.path.join(self.bucket, "hourly")) if f.startswith("backfill-")]), 2)
+
+    @responses.activate
+    def testFailedWindow(self):
+        responses.add(responses.POST, Login.URL, status=302,
+            headers={"Set-Cookie": "iPlanetDirectoryPro=cookie-testuser; Domain=enedis.fr; Path=/"})
+        today = datetime.date.today()
+        failing = [(today - datetime.timedelta(days=13)).strftime("%d/%m/%Y")]
+        def callback(request):
+            # the middle window of the run
+            if parse_qs(request.body)["_lincspartdisplaycdc_WAR_lincspartcdcportlet_dateDebut"] == failing:
+                return (500, {}, "")
+            return hourly_callback(request)
+        responses.add_callback(responses.POST, Data.URL, callback=callback)
+        with open(os.path.join(self.bucket, "config.yml"), "a") as f:
+            f.write("retry:\n  retries: 0\n")
+
+        last = (today - datetime.timedelta(days=21)).strftime("%d/%m/%Y")
+        with mock.patch.dict(os.environ, {"STORE_PATH": self.bucket, "PASSWORD_TYPE": "s3:clear"}):
+            response = entrypoint.run({"state": {"hourly": {"last": last}}, "backfill": False}, None)
+            self.assertEqual(len(response[-1]["failed"]), 1)
+            with open(os.path.join(self.bucket, "holes.json")) as f:
+                holes = json.load(f)
+            self.assertEqual([(h["start"][:10], h["end"][:10]) for h in holes],
+                [((today - datetime.timedelta(days=13)).isoformat(), (today - datetime.timedelta(days=6)).isoformat())])
+
+            # filled by the backfill of the next invocation
+            failing = []
+            response = entrypoint.run({"state": {"hourly": {"last": (today - datetime.timedelta(days=2)).strftime("%d/%m/%Y")}}}, None)
+            self.assertEqual(response[-1]["backfill"]["windows"], 1)
+            with open(os.path.join(self.bucket, "holes.json")) as f:
+                self.assertEqual(json.load(f), [])
+
+    def runConcurrentHoles(self, conflicts):
+        responses.add(responses.POST, Login.URL, status=302,
+            headers={"Set-Cookie": "iPlanetDirectoryPro=cookie-testuser; Domain=enedis.fr; Path=/"})
+        today = datetime.date.today()
+        def callback(request):
+            # the first window of the run is missing
+            if parse_qs(request.body)["_lincspartdisplaycdc_WAR_lincspartcdcportlet_dateDebut"] == [(today - datetime.timedelta(days=13)).strftime("%d/%m/%Y")]:
+                return (500, {}, "")
+            return hourly_callback(request)
+        responses.add_callback(responses.POST, Data.URL, callback=callback)
+        with open(os.path.join(self.bucket, "config.yml"), "a") as f:
+            f.write("retry:\n  retries: 0\n")
+
+        other = [[{"start": "2019-01-0%dT00:00:00+01:00" % (i+1), "end": "2019-01-0%dT00:00:00+01:00" % (i+2)}] for i in range(conflicts)]
+        entrypoint.STORE = StateStore(ConflictingBackend(self.bucket, other))
+        last = (today - datetime.timedelta(days=14)).strftime("%d/%m/%Y")
+        with open(os.path.join(self.bucket, "state.json"), "w") as f:
+            json.dump({"hourly": {"last": last}}, f)
+        with mock.patch.dict(os.environ, {"PASSWORD_TYPE": "s3:clear"}):
+            response = entrypoint.run({"backfill": False}, None)
+        with open(os.path.join(self.bucket, "holes.json")) as f:
+            holes = [h["start"][:10] for h in json.load(f)]
+        with open(os.path.join(self.bucket, "state.json")) as f:
+            state = json.load(f)
+        return (response, holes, state["hourly"]["last"] != last)
+
+    @responses.activate
+    def testConcurrentHoles(self):
+        # merged with the holes of the other invocation, then the state is saved
+        (response, holes, advanced) = self.runConcurrentHoles(conflicts=1)
+        self.assertEqual(holes, ["2019-01-01", (datetime.date.today() - datetime.timedelta(days=13)).isoformat()])
+        self.assertTrue(advanced)
+        self.assertFalse(any("error" in r for r in response))
+
+    @responses.activate
+    def testConcurrentHolesNotSaved(self):
+        # the holes of the run are not saved: neither is the state, the next run fetches them again
+        (response, holes, advanced) = self.runConcurrentHoles(conflicts=2)
+        self.assertEqual(holes, ["2019-01-02"])
+        self.assertFalse(advanced)
+        self.assertIn({"error": "concurrent update of holes.json"}, response)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import logging
+
+from mylinky.warm import WarmCache
+
+logging.basicConfig()
+logging.getLogger().setLevel(logging.DEBUG)
+log = logging.getLogger("test")
+
+class TestWarmCache(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.built = []
+        self.cache = WarmCache(clock=lambda: self.now)
+
+    def factory(self, value):
+        def build():
+            self.built.append(value)
+            return value
+        return build
+
+    def testTtl(self):
+        self.assertEqual(self.cache.get("a", self.factory(1), ttl=10), 1)
+        self.now = 9
+        self.assertEqual(self.cache.get("a", self.factory(2), ttl=10), 1)
+        self.now = 10
+        self.assertEqual(self.cache.get("a", self.factory(3), ttl=10), 3)
+        self.assertEqual(self.built, [1, 3])
+        self.assertEqual(self.cache.stats, {"hits": 1, "misses": 2})
+
+    def testFingerprint(self):
+        self.assertEqual(self.cache.get("a", self.factory(1), fingerprint="v1"), 1)
+        self.assertEqual(self.cache.get("a", self.factory(2), fingerprint="v1"), 1)
+        self.assertEqual(self.cache.get("a", self.factory(3), fingerprint="v2"), 3)
+        self.assertEqual(self.built, [1, 3])
+
+    def testInvalidate(self):
+        self.cache.get("a", self.factory(1))
+        self.cache.get("b", self.factory(2))
+        self.cache.invalidate("a")
+        self.assertEqual(self.cache.get("a", self.factory(3)), 3)
+        self.assertEqual(self.cache.get("b", self.factory(4)), 2)
+        self.cache.invalidate()
+        self.assertEqual(self.cache.get("b", self.factory(5)), 5)
+
+    def testFactoryError(self):
+        def fail():
+            raise ValueError("login failed")
+        with self.assertRaises(ValueError):
+            self.cache.get("a", fail)
+        # nothing is kept
+        self.assertEqual(self.cache.get("a", self.factory(1)), 1)
+
+if __name__ == "__main__":
+    unittest.main()
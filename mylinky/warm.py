@@ -0,0 +1,43 @@
+import time
+import logging
+import threading
+
+log = logging.getLogger("warm")
+
+class WarmCache:
+    """Values kept in memory across the warm invocations of a Lambda
+
+    A value is built again by its factory when it is older than its 'ttl'
+    (seconds), when its 'fingerprint' (what it was built from) changed, or
+    after invalidate().
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (value, fingerprint, expires)
+        self._values = {}
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key, factory, ttl=None, fingerprint=None):
+        with self._lock:
+            entry = self._values.get(key)
+        if entry is not None:
+            (value, built_from, expires) = entry
+            if built_from == fingerprint and (expires is None or self._clock() < expires):
+                self.stats["hits"] += 1
+                return value
+            log.debug("%s is outdated, building it again" % key)
+
+        self.stats["misses"] += 1
+        value = factory()
+        with self._lock:
+            self._values[key] = (value, fingerprint, self._clock() + ttl if ttl is not None else None)
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._values.clear()
+            else:
+                self._values.pop(key, None)
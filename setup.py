@@ -48,7 +48,14 @@ setup(
     long_description_content_type = "text/markdown",
 
     install_requires=required,
-    packages=find_packages(exclude=["*.tests", "*.tests.*", "tests.*"]),
+    extras_require={
+        "async": ["aiohttp"],
+        "json": ["orjson"],
+        "parquet": ["pyarrow"],
+        "pricing": ["numpy"],
+        "zstd": ["zstandard"],
+    },
+    packages=find_packages(exclude=["*.tests", "*.tests.*", "tests.*", "benchmarks"]),
 
     entry_points = {
 		"console_scripts": [